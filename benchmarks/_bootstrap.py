@@ -0,0 +1,9 @@
+""" Imported first by every benchmark, so the project is imported the way
+migrations do and the bot is not started """
+import os
+import sys
+
+os.environ.setdefault('MIGRATING_DB', '1')
+os.environ.setdefault('CURR_ENV', 'TestingConfig')
+os.environ.setdefault('PROJECT_ROOT', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.environ['PROJECT_ROOT'])
@@ -0,0 +1,145 @@
+""" Times the banned account checks of a verification against a guild with
+many banned members, the three queries verification used to run against the
+single ban fingerprint lookup in server/api/verification.py.
+
+Seeds a SQLite database from the models, with the guild user indexes in place
+for both, and checks users that match nothing, a banned user's linked
+accounts, or a banned user's IP.
+
+    python benchmarks/ban_fingerprints.py [banned users] [database path] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from datetime import datetime
+from json import JSONEncoder
+from project.server.api.verification import SOCIAL_KINDS, get_fingerprints
+from project.server.models import BanFingerprint, GuildUser, UserInfo
+from sqlalchemy import and_, create_engine, or_
+from sqlalchemy.orm import Session
+from tempfile import gettempdir
+
+import os
+import random
+import statistics
+import sys
+import time
+
+GUILD = 'guild'
+MEMBERS_PER_BAN = 2 # Members that are not banned, for every banned one
+LINKED_SHARE = 0.5 # Chance a user linked each social account
+CHUNK = 20_000
+
+def random_user(rng: random.Random, user_id: str):
+    """ A UserInfo row and the identifiers the user verifies with """
+    socials = {kind: f'{kind}{rng.getrandbits(40):x}' for kind in SOCIAL_KINDS if rng.random() < LINKED_SHARE}
+    now = datetime.now()
+    return dict(user_id=user_id, name='Someone', avatar='', guilded_data='{}', created_at=now, last_updated=now,
+        connections=JSONEncoder().encode(socials), guilds='[]', premium='0', **{kind: socials.get(kind) for kind in SOCIAL_KINDS}), \
+        f'{rng.getrandbits(128):032x}', f'browser{rng.getrandbits(48):x}'
+
+def seed(engine, rng: random.Random, banned: int):
+    users = banned * (MEMBERS_PER_BAN + 1)
+    banned_users = []
+    with engine.begin() as conn:
+        for start in range(0, users, CHUNK):
+            infos, members, fingerprints = [], [], []
+            for i in range(start, min(start + CHUNK, users)):
+                info, hashed_ip, browser_id = random_user(rng, f'user{i}')
+                is_banned = i % (MEMBERS_PER_BAN + 1) == 0
+                infos.append(info)
+                members.append(dict(internal_id=f'{GUILD}/{info["user_id"]}', guild_id=GUILD, user_id=info['user_id'], hashed_ip=hashed_ip,
+                    browser_id=browser_id, is_banned=is_banned, using_vpn=False, bypass_verification=False, permission_level=0, xp=0))
+                if is_banned:
+                    user_info = UserInfo(info['user_id'])
+                    for kind in SOCIAL_KINDS:
+                        setattr(user_info, kind, info[kind])
+                    fingerprints += [dict(internal_id=f'{GUILD}/{info["user_id"]}/{kind}', guild_id=GUILD, user_id=info['user_id'], kind=kind, value=value)
+                        for kind, value in get_fingerprints(hashed_ip, browser_id, user_info)]
+                    banned_users.append((info, hashed_ip, browser_id))
+            conn.execute(UserInfo.__table__.insert(), infos)
+            conn.execute(GuildUser.__table__.insert(), members)
+            conn.execute(BanFingerprint.__table__.insert(), fingerprints)
+        conn.exec_driver_sql('ANALYZE')
+    return banned_users
+
+def check_with_queries(session: Session, user_id: str, user_info: UserInfo, hashed_ip: str, browser_id: str):
+    """ The checks as verification ran them before the fingerprint table """
+    if any(getattr(user_info, kind) for kind in SOCIAL_KINDS):
+        banned_users = session.query(GuildUser.user_id) \
+            .filter(GuildUser.guild_id == GUILD) \
+            .filter(GuildUser.user_id != user_id) \
+            .filter(GuildUser.is_banned == True)
+        matching_socials = session.query(UserInfo)
+        for kind in SOCIAL_KINDS:
+            if getattr(user_info, kind) != None:
+                matching_socials = matching_socials.filter(getattr(UserInfo, kind) == getattr(user_info, kind))
+        if len(matching_socials.filter(UserInfo.user_id.in_(banned_users)).all()) > 0:
+            return 'Account Check'
+    for column, value in ((GuildUser.hashed_ip, hashed_ip), (GuildUser.browser_id, browser_id)):
+        if len(session.query(GuildUser).filter(column == value, GuildUser.guild_id == GUILD, GuildUser.user_id != user_id, GuildUser.is_banned == True).all()) > 0:
+            return 'IP Check'
+    return None
+
+def check_with_fingerprints(session: Session, user_id: str, user_info: UserInfo, hashed_ip: str, browser_id: str):
+    """ The checks as find_ban_match runs them, against this session """
+    fingerprints = get_fingerprints(hashed_ip, browser_id, user_info)
+    matches = len(fingerprints) > 0 and session.query(BanFingerprint.user_id, BanFingerprint.kind) \
+        .filter(BanFingerprint.guild_id == GUILD) \
+        .filter(BanFingerprint.user_id != user_id) \
+        .filter(or_(*[and_(BanFingerprint.kind == kind, BanFingerprint.value == value) for kind, value in fingerprints])) \
+        .all() or []
+    matched_kinds: dict[str, set] = {}
+    for banned_user_id, kind in matches:
+        matched_kinds.setdefault(banned_user_id, set()).add(kind)
+
+    social_kinds = set(kind for kind, _ in fingerprints if kind in SOCIAL_KINDS)
+    if len(social_kinds) > 0 and any(social_kinds <= kinds for kinds in matched_kinds.values()):
+        return 'Account Check'
+    if any('ip' in kinds or 'browser' in kinds for kinds in matched_kinds.values()):
+        return 'IP Check'
+    return None
+
+def verifications(rng: random.Random, banned_users: list, count: int):
+    """ New users, users sharing a banned user's accounts and users on a banned user's IP """
+    cases = {'no match': [], 'linked accounts': [], 'same IP': []}
+    linked = [user for user in banned_users if any(user[0][kind] for kind in SOCIAL_KINDS)]
+    for i in range(count):
+        user_id = f'verifying{i}'
+        info, hashed_ip, browser_id = random_user(rng, user_id)
+        cases['no match'].append((user_id, info, hashed_ip, browser_id))
+        banned_info = rng.choice(linked)[0]
+        cases['linked accounts'].append((user_id, dict(info, **{kind: banned_info[kind] for kind in SOCIAL_KINDS}), hashed_ip, browser_id))
+        cases['same IP'].append((user_id, info, rng.choice(banned_users)[1], browser_id))
+    return cases
+
+def time_checks(session: Session, check, cases: list):
+    times, results = [], set()
+    for user_id, info, hashed_ip, browser_id in cases:
+        user_info = UserInfo(user_id)
+        for kind in SOCIAL_KINDS:
+            setattr(user_info, kind, info[kind])
+        started = time.perf_counter()
+        results.add(check(session, user_id, user_info, hashed_ip, browser_id))
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), results
+
+if __name__ == '__main__':
+    banned = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(gettempdir(), 'serverguard_fingerprints.db')
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(18)
+    engine = create_engine(f'sqlite:///{path}')
+    for table in (UserInfo.__table__, GuildUser.__table__, BanFingerprint.__table__):
+        table.create(engine)
+
+    started = time.perf_counter()
+    banned_users = seed(engine, rng, banned)
+    print(f'Seeded a guild of {banned * (MEMBERS_PER_BAN + 1)} members, {banned} of them banned, in {time.perf_counter() - started:.1f} s')
+
+    with Session(engine) as session:
+        for name, cases in verifications(rng, banned_users, 50).items():
+            old, old_results = time_checks(session, check_with_queries, cases)
+            new, new_results = time_checks(session, check_with_fingerprints, cases)
+            print(f'{name:16} three queries {old * 1000:8.2f} ms {sorted(map(str, old_results))}   fingerprints {new * 1000:6.2f} ms {sorted(map(str, new_results))}')
+    engine.dispose()
+    os.remove(path)
@@ -0,0 +1,108 @@
+""" Times a feed check over many feeds served by a local stand-in, the way
+CheckFeeds used to fetch them against fetch_feed in server/api/feeds.py.
+
+Each feed lives on its own loopback address, a few feeds per host like real
+feed providers, and answers after a random delay. The stand-in honours
+If-None-Match and If-Modified-Since, and its feeds were last modified when it
+started. The old sequential check is timed on a sample of the feeds since it
+takes the sum of every delay.
+
+    python benchmarks/feed_check.py [feeds] [sample for the old check] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from aiohttp import web
+from datetime import datetime, timedelta
+from email.utils import formatdate, parsedate_to_datetime
+from project.server.api.feeds import FEED_CONCURRENCY, FEED_CONCURRENCY_PER_HOST, FEED_TIMEOUT, fetch_feed
+from project.server.models import FeedState
+from threading import Thread
+
+import aiohttp
+import asyncio
+import feedparser
+import random
+import sys
+import time
+
+FEEDS_PER_HOST = 4
+ENTRIES = 20
+MIN_DELAY = 0.02
+MAX_DELAY = 0.2
+
+def feed_document(feed: int):
+    items = ''.join(f'''
+    <item>
+        <title>Update {entry} of feed {feed}</title>
+        <link>https://feeds.example.com/{feed}/{entry}</link>
+        <guid>https://feeds.example.com/{feed}/{entry}</guid>
+        <pubDate>{formatdate(1700000000 + entry * 3600, usegmt=True)}</pubDate>
+        <description>{'Something happened in this feed today. ' * 8}</description>
+    </item>''' for entry in range(ENTRIES))
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0"><channel><title>Feed {feed}</title><link>https://feeds.example.com/{feed}</link>{items}
+</channel></rss>'''.encode('utf-8')
+
+def start_server(feeds: int):
+    """ Serve the stand-in feeds on every loopback address, returns their URLs """
+    rng = random.Random(13)
+    delays = [rng.uniform(MIN_DELAY, MAX_DELAY) for _ in range(feeds)]
+    documents = [feed_document(feed) for feed in range(feeds)]
+    modified_at = datetime.now().astimezone().replace(microsecond=0)
+    last_modified = formatdate(modified_at.timestamp(), usegmt=True)
+
+    async def serve_feed(request: web.Request):
+        feed = int(request.match_info['feed'])
+        await asyncio.sleep(delays[feed])
+        headers = {'ETag': f'"feed-{feed}"', 'Last-Modified': last_modified}
+        if request.headers.get('If-None-Match') == headers['ETag']:
+            return web.Response(status=304, headers=headers)
+        since = request.headers.get('If-Modified-Since')
+        if since and 'If-None-Match' not in request.headers and parsedate_to_datetime(since) >= modified_at:
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=documents[feed], content_type='application/rss+xml', headers=headers)
+
+    loop = asyncio.new_event_loop()
+    async def start():
+        app = web.Application()
+        app.add_routes([web.get('/feed/{feed}.xml', serve_feed)])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '0.0.0.0', 0, backlog=1024)
+        await site.start()
+        return runner.addresses[0][1]
+    Thread(target=loop.run_forever, daemon=True).start()
+    port = asyncio.run_coroutine_threadsafe(start(), loop).result()
+    return [f'http://127.0.{feed // FEEDS_PER_HOST // 250}.{feed // FEEDS_PER_HOST % 250 + 1}:{port}/feed/{feed}.xml' for feed in range(feeds)]
+
+def check_sequentially(urls: list):
+    """ What CheckFeeds did before, one feedparser.parse per feed with a made up modified time """
+    entries = 0
+    for url in urls:
+        result = feedparser.parse(url, modified=datetime.fromtimestamp((datetime.now() - timedelta(minutes=30)).timestamp()))
+        entries += len(result['entries'])
+    return entries
+
+async def check_concurrently(states: list):
+    async with aiohttp.ClientSession(
+        connector=aiohttp.TCPConnector(limit=FEED_CONCURRENCY, limit_per_host=FEED_CONCURRENCY_PER_HOST),
+        timeout=aiohttp.ClientTimeout(total=FEED_TIMEOUT)
+    ) as session:
+        results = await asyncio.gather(*[fetch_feed(session, state) for state in states])
+    return sum(len(result['entries']) for result in results if result is not None), sum(result is None for result in results)
+
+if __name__ == '__main__':
+    feeds = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    sample = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    urls = start_server(feeds)
+    print(f'{feeds} feeds of {ENTRIES} entries on {len(set(url.split("/")[2] for url in urls))} hosts, answering after {MIN_DELAY * 1000:g}-{MAX_DELAY * 1000:g} ms')
+
+    started = time.perf_counter()
+    entries = check_sequentially(urls[:sample])
+    took = time.perf_counter() - started
+    print(f'sequential feedparser  {took:7.2f} s for {sample} feeds, {entries} entries parsed, about {took * feeds / sample:.1f} s for all {feeds}')
+
+    states = [FeedState(url) for url in urls]
+    for name in ('concurrent, first run', 'concurrent, unchanged'):
+        started = time.perf_counter()
+        entries, skipped = asyncio.run(check_concurrently(states))
+        print(f'{name:22} {time.perf_counter() - started:7.2f} s for {feeds} feeds, {entries} entries parsed, {skipped} not modified')
@@ -0,0 +1,145 @@
+""" Seeds a SQLite database with the models' tables and times the queries the
+endpoints run most, first without the secondary indexes and then with them,
+printing SQLite's query plan for each.
+
+    python benchmarks/hot_path_queries.py [guild users] [database path] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from datetime import datetime, timedelta
+from project.server.models import Giveaway, GuildChannelConfig, GuildUser, GuildUserStatus
+from sqlalchemy import create_engine, select
+from tempfile import gettempdir
+
+import os
+import random
+import statistics
+import sys
+import time
+
+GUILDS = 20_000
+BANNED_SHARE = 0.02
+STATUSES_PER_USER = 0.2 # Warnings, mutes and bans
+CHANNEL_CONFIGS = 100_000
+GIVEAWAYS = 50_000
+CHUNK = 20_000
+
+TABLES = [GuildUser.__table__, GuildUserStatus.__table__, GuildChannelConfig.__table__, Giveaway.__table__]
+
+def guild_of(rng: random.Random):
+    # A few large guilds hold most of the members, like on the real bot
+    return f'guild{int(GUILDS * rng.random() ** 3)}'
+
+def seed(engine, rng: random.Random, users: int):
+    now = datetime.now()
+    with engine.begin() as conn:
+        members = []
+        for start in range(0, users, CHUNK):
+            rows = []
+            for i in range(start, min(start + CHUNK, users)):
+                guild_id, user_id = guild_of(rng), f'user{i}'
+                members.append((guild_id, user_id))
+                rows.append(dict(internal_id=f'{guild_id}/{user_id}', guild_id=guild_id, user_id=user_id,
+                    browser_id=f'browser{rng.getrandbits(48):x}', hashed_ip=f'{rng.getrandbits(128):032x}',
+                    is_banned=rng.random() < BANNED_SHARE, using_vpn=False, bypass_verification=False,
+                    connections='{}', permission_level=0, xp=rng.randrange(10000), join_date=now))
+            conn.execute(GuildUser.__table__.insert(), rows)
+
+        statuses = int(users * STATUSES_PER_USER)
+        for start in range(0, statuses, CHUNK):
+            rows = []
+            for i in range(start, min(start + CHUNK, statuses)):
+                guild_id, user_id = rng.choice(members)
+                type = rng.choice(['warning', 'warning', 'mute', 'ban'])
+                rows.append(dict(internal_id=f'{guild_id}/{user_id}/{type}/{i}', guild_id=guild_id, user_id=user_id, type=type,
+                    created_at=now, value={}, ends_at=type != 'warning' and now + timedelta(minutes=rng.randint(-600, 60 * 24 * 30)) or None))
+            conn.execute(GuildUserStatus.__table__.insert(), rows)
+
+        conn.execute(GuildChannelConfig.__table__.insert(), [dict(internal_id=f'config{i}', unique_id=str(i), guild_id=guild_of(rng),
+            channel_id=f'channel{i}', type=rng.random() < 0.05 and 'feed' or 'filter', value={'id': str(i)}) for i in range(CHANNEL_CONFIGS)])
+        conn.execute(Giveaway.__table__.insert(), [dict(internal_id=f'giveaway{i}', id=str(i), guild_id=guild_of(rng), channel_id='channel',
+            original_message_id='message', ended=rng.random() < 0.97, ends_at=now + timedelta(minutes=rng.randint(-60 * 24 * 30, 60 * 24 * 7)),
+            prize='prize', hosted_by='host', winner_amount=1, winners=[], entries=[]) for i in range(GIVEAWAYS)])
+    return members
+
+def queries(rng: random.Random, members: list):
+    """ The filters each endpoint runs, with fresh arguments per call """
+    def member():
+        guild_id, user_id = rng.choice(members)
+        return guild_id, user_id
+    def guild_user():
+        guild_id, user_id = member()
+        return select(GuildUser).where(GuildUser.guild_id == guild_id, GuildUser.user_id == user_id)
+    def banned_ip():
+        return select(GuildUser).where(GuildUser.guild_id == member()[0], GuildUser.is_banned == True, GuildUser.hashed_ip == f'{rng.getrandbits(128):032x}')
+    def banned_browser():
+        return select(GuildUser).where(GuildUser.guild_id == member()[0], GuildUser.is_banned == True, GuildUser.browser_id == f'browser{rng.getrandbits(48):x}')
+    def warnings():
+        guild_id, user_id = member()
+        return select(GuildUserStatus).where(GuildUserStatus.guild_id == guild_id, GuildUserStatus.user_id == user_id, GuildUserStatus.type == 'warning')
+    def status_deadlines():
+        return select(GuildUserStatus.internal_id, GuildUserStatus.ends_at).where(GuildUserStatus.ends_at <= datetime.now() + timedelta(minutes=10))
+    def feeds():
+        return select(GuildChannelConfig).where(GuildChannelConfig.type == 'feed')
+    def giveaway_deadlines():
+        return select(Giveaway.internal_id, Giveaway.ends_at).where(Giveaway.ended == False, Giveaway.ends_at <= datetime.now() + timedelta(minutes=10))
+    return {
+        'getguilduser / userinfo': guild_user,
+        'verify, banned IP': banned_ip,
+        'verify, banned browser': banned_browser,
+        'warnings': warnings,
+        'status deadlines': status_deadlines,
+        'feeds/check': feeds,
+        'giveaway deadlines': giveaway_deadlines,
+    }
+
+def query_plan(conn, statement):
+    compiled = statement.compile(conn)
+    params = compiled.construct_params()
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, tuple(params[name] for name in compiled.positiontup)).all()
+    return '; '.join(row[-1] for row in rows)
+
+def time_queries(engine, rng: random.Random, members: list, runs: int):
+    results = {}
+    with engine.connect() as conn:
+        for name, make in queries(rng, members).items():
+            times = []
+            for _ in range(runs):
+                statement = make()
+                started = time.perf_counter()
+                conn.execute(statement).all()
+                times.append(time.perf_counter() - started)
+            results[name] = (statistics.median(times), query_plan(conn, make()))
+    return results
+
+if __name__ == '__main__':
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(gettempdir(), 'serverguard_queries.db')
+    if os.path.exists(path):
+        os.remove(path)
+    rng = random.Random(12)
+    engine = create_engine(f'sqlite:///{path}')
+
+    for table in TABLES:
+        table.create(engine)
+        for index in table.indexes:
+            index.drop(engine)
+    started = time.perf_counter()
+    members = seed(engine, rng, users)
+    print(f'Seeded {users} guild users in {time.perf_counter() - started:.1f} s at {path}')
+
+    before = time_queries(engine, rng, members, 10)
+    started = time.perf_counter()
+    for table in TABLES:
+        for index in table.indexes:
+            index.create(engine)
+    print(f'Built the indexes in {time.perf_counter() - started:.1f} s')
+    with engine.connect() as conn:
+        conn.exec_driver_sql('ANALYZE')
+    after = time_queries(engine, rng, members, 200)
+
+    for name in before:
+        print(f'\n{name}: median {before[name][0] * 1000:.2f} ms -> {after[name][0] * 1000:.2f} ms')
+        print(f'  before: {before[name][1]}')
+        print(f'  after:  {after[name][1]}')
+    engine.dispose()
+    os.remove(path)
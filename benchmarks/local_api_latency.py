@@ -0,0 +1,84 @@
+""" Replays synthetic messages through a handler that asks the local API for
+the author's user info, and reports the p50/p99 latency per message.
+
+The handler is timed both ways the bot has called its own API: a blocking
+requests.get on the event loop, as the modules did before, and the pooled
+keep-alive client in helpers/localapi.py. A stand-in server on a loopback
+port answers like /userinfo after SERVER_DELAY, so only the client side
+differs between the runs.
+
+    python benchmarks/local_api_latency.py [messages] [messages per second] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from aiohttp import web
+from project import bot_config
+from project.helpers import localapi
+from project.helpers.io_loop import io_loop
+from threading import Thread
+
+import asyncio
+import random
+import requests
+import sys
+import time
+
+SERVER_DELAY = 0.002 # Roughly what the /userinfo query takes
+
+async def user_info(request: web.Request):
+    await asyncio.sleep(SERVER_DELAY)
+    return web.json_response({'id': request.match_info['user_id'], 'name': 'Someone', 'language': 'en', 'premium': '0'})
+
+def start_server():
+    """ Serve the stand-in on its own thread and loop, returns its base URL """
+    loop = asyncio.new_event_loop()
+    async def start():
+        app = web.Application()
+        app.add_routes([web.get('/userinfo/{guild_id}/{user_id}', user_info)])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        return runner.addresses[0][1]
+    Thread(target=loop.run_forever, daemon=True).start()
+    return f'http://127.0.0.1:{asyncio.run_coroutine_threadsafe(start(), loop).result()}'
+
+async def blocking_handler(base: str, guild_id: str, user_id: str):
+    return requests.get(f'{base}/userinfo/{guild_id}/{user_id}', headers={
+        'authorization': bot_config.SECRET_KEY
+    }).json()
+
+async def pooled_handler(base: str, guild_id: str, user_id: str):
+    return (await localapi.get(f'/userinfo/{guild_id}/{user_id}')).json()
+
+async def replay(handler, base: str, messages: int, rate: float):
+    """ Messages arrive every 1/rate seconds, each one's latency counts from its arrival """
+    rng = random.Random(3)
+    latencies = []
+    async def handle(arrived: float):
+        await handler(base, 'guild', str(rng.randrange(10000)))
+        latencies.append(time.perf_counter() - arrived)
+
+    tasks = []
+    started = time.perf_counter()
+    for i in range(messages):
+        arrival = started + i / rate
+        await asyncio.sleep(max(arrival - time.perf_counter(), 0))
+        tasks.append(asyncio.create_task(handle(arrival)))
+    await asyncio.gather(*tasks)
+    return sorted(latencies)
+
+def report(name: str, latencies: list):
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(int(len(latencies) * 0.99), len(latencies) - 1)]
+    print(f'{name:22} p50 {p50 * 1000:8.2f} ms   p99 {p99 * 1000:8.2f} ms')
+
+if __name__ == '__main__':
+    messages = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rate = float(sys.argv[2]) if len(sys.argv) > 2 else 200
+    base = start_server()
+    localapi.LOCAL_API_BASE = base
+    print(f'{messages} messages at {rate:g}/s, the stand-in answers after {SERVER_DELAY * 1000:g} ms')
+
+    report('blocking requests', asyncio.run(replay(blocking_handler, base, messages, rate)))
+    report('pooled localapi', asyncio.run(replay(pooled_handler, base, messages, rate)))
+    io_loop.run_sync(localapi.session.close())
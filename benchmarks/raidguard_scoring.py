@@ -0,0 +1,88 @@
+""" Times RaidGuard's cohort scoring on load_test_data() scaled to 10k joins.
+
+Copies past the original data get one character replaced, the way raiders
+vary their names, so the cohort is not just the same names repeated. The
+scorer is compared against the plain length-window pairwise loop it replaced,
+both for time and for giving the same counts.
+
+    python benchmarks/raidguard_scoring.py [joins] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from Levenshtein import distance
+from project.modules import raidguard
+from project.modules.raidguard import RaidUser, calc_raid_scores, calc_similar_counts, load_test_data, strip_numbers
+
+import numpy as np
+import random
+import string
+import sys
+import time
+import tracemalloc
+
+def scaled_test_data(size: int):
+    rng = random.Random(7)
+    base = load_test_data()
+    users = []
+    for i in range(size):
+        user = base[i % len(base)]
+        name = user.name
+        if i >= len(base) and len(name) > 0:
+            at = rng.randrange(len(name))
+            name = name[:at] + rng.choice(string.ascii_lowercase) + name[at + 1:]
+        users.append(RaidUser(str(i), name, user.avatar, user.created))
+    return users
+
+def pairwise_counts(names: list):
+    """ The length-window loop without the character count pre-filter """
+    groups: dict[str, int] = {}
+    for name in names:
+        groups[name] = groups.get(name, 0) + 1
+    unique = sorted(groups.keys(), key=len)
+    lengths = np.array([len(name) for name in unique])
+    similar = {name: count - 1 for name, count in groups.items()}
+    for i, name in enumerate(unique):
+        cutoff = len(name) // 2
+        for j in range(i + 1, np.searchsorted(lengths, len(name) * 2, side='right')):
+            other = unique[j]
+            dist = distance(name, other, score_cutoff=len(other) // 2)
+            if dist <= cutoff:
+                similar[name] += groups[other]
+            if dist <= len(other) // 2:
+                similar[other] += groups[name]
+    return similar
+
+def timed(func, *args, runs: int=3):
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - started)
+    return result, min(times)
+
+calls = 0
+def counted_distance(*args, **kwargs):
+    global calls
+    calls += 1
+    return distance(*args, **kwargs)
+
+if __name__ == '__main__':
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    users = scaled_test_data(size)
+    names = [strip_numbers(user.name) for user in users]
+    print(f'{size} joins, {len(set(names))} distinct names once numbers are stripped')
+
+    expected, pairwise_time = timed(pairwise_counts, names)
+    similar, filtered_time = timed(calc_similar_counts, names)
+    assert similar == expected, 'the pre-filter changed the counts'
+
+    raidguard.distance = counted_distance
+    tracemalloc.start()
+    calc_similar_counts(names)
+    _, peak_memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    raidguard.distance = distance
+    _, scoring_time = timed(calc_raid_scores, users)
+
+    print(f'pairwise similar counts:   {pairwise_time * 1000:8.1f} ms')
+    print(f'pre-filtered counts:       {filtered_time * 1000:8.1f} ms, {calls} distance calls, {peak_memory / 2**20:.1f} MB peak')
+    print(f'calc_raid_scores:          {scoring_time * 1000:8.1f} ms')
@@ -0,0 +1,75 @@
+""" Times drawing a level up rank card with Pillow against screenshotting the
+HTML rank card in headless Chromium, the way level ups were announced before.
+
+The Chromium side needs pyppeteer and a Chromium it can launch, without them
+only the Pillow side is timed. Both draw the same generated avatar and banner.
+
+    python benchmarks/rank_card_render.py [runs] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from PIL import Image
+from project.helpers.rank_card import AVATAR_SIZE, CARD_SIZE, cover, render_rank_card
+
+import asyncio
+import base64
+import io
+import os
+import statistics
+import sys
+import time
+
+CARD = dict(username='Someone', rank=3, level=12, experience='1.2K', exp_to_level='1.4K', exp_percent=42, dominant_color='#285aa0')
+
+def data_url(image: Image.Image):
+    output = io.BytesIO()
+    image.save(output, format='PNG')
+    return 'data:image/png;base64,' + base64.b64encode(output.getvalue()).decode('ascii')
+
+def time_pillow(runs: int, avatar: Image.Image, background: Image.Image):
+    render_rank_card(avatar=avatar, background=background, levelup=True, **CARD) # Loads the fonts
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        render_rank_card(avatar=avatar, background=background, levelup=True, **CARD)
+        times.append(time.perf_counter() - started)
+    return times
+
+async def time_chromium(runs: int, avatar: Image.Image, background: Image.Image):
+    from flask import Flask, render_template
+    from pyppeteer import launch
+
+    root = os.path.join(os.environ['PROJECT_ROOT'], 'project')
+    app = Flask(__name__, template_folder=os.path.join(root, 'templates'), static_folder=os.path.join(root, 'static'))
+    with app.test_request_context():
+        html = render_template('rank_card.html', levelup='show', profile_picture=data_url(avatar), background=data_url(background),
+            status='#747f8d', exp=CARD['experience'], **CARD)
+    with open(os.path.join(root, 'static', 'css', 'rank-card.css')) as file:
+        html = html.replace('</head>', f'<style>{file.read()}</style></head>') # The page is not served, so its stylesheet is inlined
+
+    times = []
+    for _ in range(runs):
+        # One browser per card, as every level up used to launch its own
+        started = time.perf_counter()
+        browser = await launch({'headless': True, 'args': ['--no-sandbox', '--disable-dev-shm-usage']})
+        page = await browser.newPage()
+        await page.setContent(html, {'waitUntil': 'networkidle0'})
+        await page.screenshot({'omitBackground': True, 'clip': {'width': 900, 'height': 290, 'x': 0, 'y': 0}})
+        await browser.close()
+        times.append(time.perf_counter() - started)
+    return times
+
+def report(name: str, times: list):
+    times = sorted(times)
+    print(f'{name:9} median {statistics.median(times) * 1000:8.1f} ms, p90 {times[int(len(times) * 0.9) - 1] * 1000:8.1f} ms over {len(times)} cards')
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    avatar = Image.effect_mandelbrot((512, 512), (-2, -1.5, 1, 1.5), 100).convert('RGB')
+    background = Image.linear_gradient('L').resize((1920, 1080)).convert('RGB')
+
+    # Drawn from the cached assets, which are already scaled to the card
+    report('Pillow', time_pillow(runs, cover(avatar, AVATAR_SIZE), cover(background, CARD_SIZE)))
+    try:
+        report('Chromium', asyncio.run(time_chromium(min(runs, 5), avatar, background)))
+    except Exception as e:
+        print(f'Chromium  skipped, "{e}"')
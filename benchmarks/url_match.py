@@ -0,0 +1,98 @@
+""" Times checking messages against the malicious URL database, the linear scan
+of every URL the url filter used to do against the host index in
+helpers/url_index.py, and how long building the index takes on a reload.
+
+By default the database is generated at the size of the full URLhaus dump,
+with many URLs per host like the real feed. Pass the path to a downloaded
+csv.txt or its zip to use the real entries instead.
+
+    python benchmarks/url_match.py [urls or path to csv] [messages] """
+import _bootstrap # Keep first, it sets up the environment the project is imported in
+
+from project.helpers.url_index import UrlIndex
+from zipfile import ZipFile
+
+import csv
+import io
+import random
+import statistics
+import sys
+import time
+
+URLHAUS_SIZE = 2_800_000 # Rows in the full URLhaus dump
+URLS_PER_HOST = 8
+THREATS = ['malware_download', 'malware_download', 'malware_download', 'phishing']
+WORDS = 'the bot server role channel giveaway level please join our team event link check this out today'.split()
+
+def read_csv(path: str):
+    """ Parse the dump the same way load_malicious_url_db does """
+    if path.endswith('.zip'):
+        file = io.TextIOWrapper(ZipFile(path).open('csv.txt'), 'utf-8')
+    else:
+        file = open(path, encoding='utf-8')
+    urls = {}
+    for row in csv.reader(file):
+        if len(row) < 2 or ('id' in row[0]):
+            continue
+        urls[row[2]] = row[5]
+    return urls
+
+def generate_urls(rng: random.Random, size: int):
+    urls = {}
+    hosts = size // URLS_PER_HOST
+    for i in range(size):
+        host = i % hosts
+        if host % 3:
+            domain = f'{rng.randint(1, 223)}.{rng.randint(0, 255)}.{host >> 8 & 255}.{host & 255}:{rng.randint(1024, 65535)}'
+        else:
+            domain = f'cdn{host}.example-{host % 977}.com'
+        urls[f'http://{domain}/{rng.choice(["i", "bins/mozi.m", "Mozi.a", "sh", "download/setup.exe"])}{i}'] = rng.choice(THREATS)
+    return urls
+
+def generate_messages(rng: random.Random, urls: list, count: int):
+    """ Mostly chatter, some with harmless links and a few with a malicious one """
+    messages = []
+    for i in range(count):
+        words = rng.choices(WORDS, k=rng.randint(4, 40))
+        if i % 10 == 0:
+            words.insert(rng.randrange(len(words)), rng.choice(urls))
+        elif i % 3 == 0:
+            words.insert(rng.randrange(len(words)), f'https://www.guilded.gg/r/{rng.getrandbits(32):x}')
+        messages.append(' '.join(words))
+    return messages
+
+def linear_search(urls: dict, content: str):
+    for url in urls.keys():
+        if url in content:
+            return url, urls[url]
+    return None
+
+def time_searches(search, messages: list):
+    times = []
+    found = 0
+    for content in messages:
+        started = time.perf_counter()
+        found += search(content) is not None
+        times.append(time.perf_counter() - started)
+    return times, found
+
+def report(name: str, times: list, found: int):
+    times = sorted(times)
+    print(f'{name:12} median {statistics.median(times) * 1e6:10.1f} us   p99 {times[int(len(times) * 0.99) - 1] * 1e6:10.1f} us   {found} matched')
+
+if __name__ == '__main__':
+    rng = random.Random(4)
+    source = sys.argv[1] if len(sys.argv) > 1 else str(URLHAUS_SIZE)
+    urls = generate_urls(rng, int(source)) if source.isdigit() else read_csv(source)
+    message_count = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    messages = generate_messages(rng, list(urls.keys()), message_count)
+
+    started = time.perf_counter()
+    index = UrlIndex(urls)
+    print(f'{len(urls)} URLs, index built in {time.perf_counter() - started:.2f} s')
+
+    index_times, index_found = time_searches(index.search, messages)
+    # The scan takes long enough per message that a sample shows the trend
+    linear_times, linear_found = time_searches(lambda content: linear_search(urls, content), messages[:max(message_count // 20, 10)])
+    report('linear scan', linear_times, linear_found)
+    report('host index', index_times, index_found)
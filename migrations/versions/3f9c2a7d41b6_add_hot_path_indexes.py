@@ -0,0 +1,44 @@
+"""Add indexes for the guild user, status and channel config hot paths
+
+Revision ID: 3f9c2a7d41b6
+Revises: 
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f9c2a7d41b6'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# String columns are indexed on a prefix to stay under MySQL's key length limit
+INDEXES = [
+    ('guildusers', 'ix_guildusers_guild_user', ['guild_id', 'user_id'], {'guild_id': 191, 'user_id': 191}),
+    ('guildusers', 'ix_guildusers_guild_banned_ip', ['guild_id', 'is_banned', 'hashed_ip'], {'guild_id': 191, 'hashed_ip': 191}),
+    ('guildusers', 'ix_guildusers_guild_banned_browser', ['guild_id', 'is_banned', 'browser_id'], {'guild_id': 191, 'browser_id': 191}),
+    ('guilduserstatuses', 'ix_guilduserstatuses_guild_user_type', ['guild_id', 'user_id', 'type'], {'guild_id': 191, 'user_id': 191, 'type': 191}),
+    ('guilduserstatuses', 'ix_guilduserstatuses_ends_at', ['ends_at'], {}),
+    ('guildchannelconfigs', 'ix_guildchannelconfigs_type', ['type'], {'type': 191}),
+    ('giveaways', 'ix_giveaways_ended_ends_at', ['ended', 'ends_at'], {}),
+]
+
+
+def existing_indexes(table):
+    return set(index['name'] for index in sa.inspect(op.get_bind()).get_indexes(table))
+
+
+def upgrade():
+    # Databases that already autogenerated these from the models are left alone
+    for table, name, columns, lengths in INDEXES:
+        if name not in existing_indexes(table):
+            op.create_index(name, table, columns, mysql_length=lengths or None)
+
+
+def downgrade():
+    for table, name, columns, lengths in reversed(INDEXES):
+        if name in existing_indexes(table):
+            op.drop_index(name, table_name=table)
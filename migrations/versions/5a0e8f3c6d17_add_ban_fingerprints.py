@@ -0,0 +1,62 @@
+"""Add ban fingerprints for verification checks
+
+Revision ID: 5a0e8f3c6d17
+Revises: c4d7e2a9b310
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a0e8f3c6d17'
+down_revision = 'c4d7e2a9b310'
+branch_labels = None
+depends_on = None
+
+SOCIAL_KINDS = ['roblox', 'steam', 'youtube', 'twitter']
+
+
+def upgrade():
+    bind = op.get_bind()
+    if 'banfingerprints' in sa.inspect(bind).get_table_names():
+        return
+    fingerprints = op.create_table('banfingerprints',
+        sa.Column('internal_id', sa.String(length=500), nullable=False),
+        sa.Column('guild_id', sa.String(length=500), nullable=False),
+        sa.Column('user_id', sa.String(length=500), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('value', sa.String(length=500), nullable=False),
+        sa.PrimaryKeyConstraint('internal_id')
+    )
+    op.create_index('ix_banfingerprints_guild_kind_value', 'banfingerprints', ['guild_id', 'kind', 'value'], mysql_length={'guild_id': 191, 'value': 191})
+    op.create_index('ix_banfingerprints_guild_user', 'banfingerprints', ['guild_id', 'user_id'], mysql_length={'guild_id': 191, 'user_id': 191})
+
+    # Fill it from the users that are already banned
+    rows = bind.execute(sa.text(
+        'SELECT guildusers.guild_id, guildusers.user_id, guildusers.hashed_ip, guildusers.browser_id, '
+        'userinfo.roblox, userinfo.steam, userinfo.youtube, userinfo.twitter '
+        'FROM guildusers LEFT JOIN userinfo ON userinfo.user_id = guildusers.user_id '
+        'WHERE guildusers.is_banned = :banned'
+    ), {'banned': True}).fetchall()
+    items = []
+    for guild_id, user_id, hashed_ip, browser_id, *socials in rows:
+        values = [('ip', hashed_ip), ('browser', browser_id)] + list(zip(SOCIAL_KINDS, socials))
+        for kind, value in values:
+            if value:
+                items.append({
+                    'internal_id': f'{guild_id}/{user_id}/{kind}',
+                    'guild_id': guild_id,
+                    'user_id': user_id,
+                    'kind': kind,
+                    'value': value
+                })
+    if len(items) > 0:
+        op.bulk_insert(fingerprints, items)
+
+
+def downgrade():
+    op.drop_index('ix_banfingerprints_guild_user', table_name='banfingerprints')
+    op.drop_index('ix_banfingerprints_guild_kind_value', table_name='banfingerprints')
+    op.drop_table('banfingerprints')
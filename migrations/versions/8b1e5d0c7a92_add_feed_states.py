@@ -0,0 +1,32 @@
+"""Add feed states for conditional feed fetches
+
+Revision ID: 8b1e5d0c7a92
+Revises: 3f9c2a7d41b6
+Create Date: 2026-10-18 18:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b1e5d0c7a92'
+down_revision = '3f9c2a7d41b6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'feedstates' in sa.inspect(op.get_bind()).get_table_names():
+        return
+    op.create_table('feedstates',
+        sa.Column('url', sa.String(length=500), nullable=False),
+        sa.Column('etag', sa.String(length=500), nullable=True),
+        sa.Column('last_modified', sa.String(length=500), nullable=True),
+        sa.Column('checked_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('url')
+    )
+
+
+def downgrade():
+    op.drop_table('feedstates')
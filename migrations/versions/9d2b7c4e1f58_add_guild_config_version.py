@@ -0,0 +1,27 @@
+"""Add a config version to guilds
+
+Revision ID: 9d2b7c4e1f58
+Revises: 5a0e8f3c6d17
+Create Date: 2026-10-18 20:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d2b7c4e1f58'
+down_revision = '5a0e8f3c6d17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('guilds')]
+    if 'config_version' in columns:
+        return
+    op.add_column('guilds', sa.Column('config_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade():
+    op.drop_column('guilds', 'config_version')
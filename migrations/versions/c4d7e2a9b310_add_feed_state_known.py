@@ -0,0 +1,27 @@
+"""Add the seen entry hashes to feed states
+
+Revision ID: c4d7e2a9b310
+Revises: 8b1e5d0c7a92
+Create Date: 2026-10-18 19:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4d7e2a9b310'
+down_revision = '8b1e5d0c7a92'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = [column['name'] for column in sa.inspect(op.get_bind()).get_columns('feedstates')]
+    if 'known' in columns:
+        return
+    op.add_column('feedstates', sa.Column('known', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('feedstates', 'known')
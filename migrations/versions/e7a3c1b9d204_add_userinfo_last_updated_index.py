@@ -0,0 +1,27 @@
+"""Index userinfo by when it was last updated
+
+Revision ID: e7a3c1b9d204
+Revises: 9d2b7c4e1f58
+Create Date: 2026-10-18 22:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a3c1b9d204'
+down_revision = '9d2b7c4e1f58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    indexes = [index['name'] for index in sa.inspect(op.get_bind()).get_indexes('userinfo')]
+    if 'ix_userinfo_last_updated' in indexes:
+        return
+    op.create_index('ix_userinfo_last_updated', 'userinfo', ['last_updated'])
+
+
+def downgrade():
+    op.drop_index('ix_userinfo_last_updated', table_name='userinfo')
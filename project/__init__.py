@@ -6,25 +6,30 @@ from guilded import MessageEvent, MessageUpdateEvent, MessageDeleteEvent, Messag
     ForumTopicUpdateEvent, ServerChannelCreateEvent, ServerChannelDeleteEvent, ServerChannelUpdateEvent, ForumTopicLockEvent, \
     ForumTopicUnlockEvent, ForumTopicPinEvent, ForumTopicUnpinEvent, ForumTopicReplyCreateEvent, ForumTopicReplyDeleteEvent, \
     ForumTopicReplyUpdateEvent, AnnouncementReplyCreateEvent, AnnouncementReplyUpdateEvent, AnnouncementReplyDeleteEvent, \
-    RoleCreateEvent, RoleDeleteEvent, RoleUpdateEvent, http
+    RoleCreateEvent, RoleDeleteEvent, RoleUpdateEvent
 from guilded.ext import commands
 from guilded.http import Route
 from nsfw_detector import predict as nsfw_detect
 from zipfile import ZipFile
 from project.helpers.Cache import Cache
+from project.helpers import localapi
+from project.helpers.guilded_client import get_client
+from project.helpers.url_index import UrlDatabase
+from project.helpers.deadlines import deadline_scheduler
+from project.helpers.config_bus import config_bus
+from project.helpers.xp_ledger import xp_ledger
+from project.helpers.process_stats import STATS_INTERVAL, save_bot_stats
 from project.helpers.embeds import *
 from bs4 import BeautifulSoup
 from project.helpers.translator import translate
 
-from project.modules.base import Module
+from project.modules.base import Module, MessageContext
 
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
 
-from multiprocessing import Lock
-from multiprocessing.managers import AcquirerProxy, BaseManager, DictProxy
 
 load_dotenv()
 
@@ -42,7 +47,6 @@ import sys
 import ssl
 import requests
 import csv
-import aiohttp
 import threading
 
 ssl_context = ssl.create_default_context()
@@ -56,22 +60,6 @@ ssl_context.minimum_version = ssl.TLSVersion.TLSv1
 
 __location__ = os.path.realpath(os.path.join(os.getcwd(), os.path.dirname(__file__)))
 
-managers = []
-
-def get_shared_state(host="127.0.0.1", port=35791, key=b"totally_secret"):
-    shared_dict = {}
-    shared_lock = Lock()
-    manager = BaseManager((host, port), key)
-    manager.register("get_dict", lambda: shared_dict, DictProxy)
-    manager.register("get_lock", lambda: shared_lock, AcquirerProxy)
-    managers.append(manager)
-    try:
-        manager.get_server()
-        manager.start()
-    except OSError:  # Address already in use
-        manager.connect()
-    return manager.get_dict(), manager.get_lock()
-
 def get_py_files():
     py_files = [py_file for py_file in os.listdir(os.path.join(__location__, 'modules')) if os.path.splitext(py_file)[1] == '.py']
     
@@ -93,35 +81,27 @@ app.config.from_object(configs[app_settings])
 bot_config: project.config.BaseConfig = configs[app_settings] # A custom copy of the config for the bot side of things to access
 
 class BotAPI():
-    api = None
-    def __init__(self):
-        pass
-
+    """ Hands out the process-wide Guilded client, kept as a context manager so
+    call sites read the same. There is nothing to close, the pooled sessions
+    outlive the block. """
     def __enter__(self):
-        api = http.HTTPClient()
-        api.token = app.config.get('GUILDED_BOT_TOKEN')
-        api.session = aiohttp.ClientSession()
-        self.api = api
-        return api
+        return get_client()
     
     def __exit__(self, type, value, traceback):
-        loop = asyncio.get_running_loop()
-        loop.create_task(self.api.session.close())
-        del self.api
+        pass
 
 nsfw_model = None
-nsfw_loaded = False
+nsfw_ready = threading.Event()
 def load_nsfw():
     print('Loading NSFW Model')
     global nsfw_model
     nsfw_model = nsfw_detect.load_model(app.config.get('PROJECT_ROOT') + '/project/ml_models/nsfw.h5')
-    global nsfw_loaded
-    nsfw_loaded = True
+    nsfw_ready.set()
     print('NSFW Model Has Been Loaded')
 
-async def get_nsfw_model():
-    while nsfw_loaded is False:
-        await asyncio.sleep(.1)
+def get_nsfw_model():
+    """ Blocks until the model has loaded, only call this off the event loop """
+    nsfw_ready.wait()
     return nsfw_model
 
 if not os.getenv('MIGRATING_DB', '0') == '1':
@@ -132,7 +112,7 @@ db = SQLAlchemy(app)
 migrate = Migrate(app, db)
 cors = CORS(app, send_wildcard=True, origins=["https://serverguard.xyz", "http://localhost:8001"], supports_credentials=True)
 
-guild_cache = Cache()
+guild_cache = Cache(name='guild')
 
 class BotClient(commands.Bot):
     config = app.config
@@ -168,25 +148,25 @@ class BotClient(commands.Bot):
 
 client = BotClient('/', experimental_event_style=True)
 
-malicious_urls = {}
+malicious_urls = UrlDatabase()
 guilded_paths = []
 current_status = -1
 server_count = 0
 
 def load_malicious_url_db():
-    global malicious_urls
     try:
         req = requests.get('https://urlhaus.abuse.ch/downloads/csv/')
         zip = ZipFile(io.BytesIO(req.content))
         item = zip.open('csv.txt')
         reader = csv.reader(io.TextIOWrapper(item, 'utf-8'))
-        malicious_urls.clear()
+        urls = {}
         for row in reader:
             if len(row) < 2 or ('id' in row[0]):
                 continue
             url = row[2]
             threat = row[5]
-            malicious_urls[url] = threat
+            urls[url] = threat
+        malicious_urls.replace(urls)
     except Exception as e:
         print('WARNING: urlhaus API down, malicious URLs not being reloaded.')
 
@@ -243,23 +223,15 @@ async def run_url_db_dl():
     while True:
         await asyncio.sleep(60 * 10)
         print('Running Malicious URL DB Download')
-        load_malicious_url_db()
+        await asyncio.to_thread(load_malicious_url_db) # Download and index off the event loop
 
 async def run_bot_loop():
     global server_count
     while True:
         await asyncio.sleep(60)
         print('Running Bot Loop')
-        post_thread('http://localhost:5000/moderation/expirestatuses', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
-        post_thread('http://localhost:5000/giveaways/check', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
         try:
-            server_request = requests.get('http://localhost:5000/analytics/servers/count', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            server_request = await localapi.get('/analytics/servers/count')
             if server_request.ok:
                 server_count = server_request.json().get('value', server_count)
             await alternate_status()
@@ -274,6 +246,26 @@ async def run_feed_loop():
         })
         await asyncio.sleep(60 * 30)
 
+async def run_user_info_loop():
+    while True:
+        await asyncio.sleep(60)
+        try:
+            # Refreshes the stalest users first, keeps going while there are more waiting
+            while True:
+                req = await localapi.post('/userinfo/refresh')
+                if not req.ok or not req.json().get('more', False):
+                    break
+        except Exception as e:
+            print(f'WARNING: failed to refresh user info because "{e}"')
+
+async def run_stats_loop():
+    while True:
+        try:
+            await asyncio.to_thread(save_bot_stats)
+        except Exception as e:
+            print(f'WARNING: failed to save the bot\'s stats because "{e}"')
+        await asyncio.sleep(STATS_INTERVAL)
+
 async def run_cleanup_loop():
     while True:
         print('Running Cleanup Loop')
@@ -287,9 +279,7 @@ async def run_cleanup_loop():
                 print(f'Checking "{server.id}"')
                 await asyncio.sleep(0)
                 try:
-                    guild_data_req = requests.get(f'http://localhost:5000/guilddata/{server.id}', headers={
-                        'authorization': bot_config.SECRET_KEY
-                    })
+                    guild_data_req = await localapi.get(f'/guilddata/{server.id}')
                     guild_data: dict = guild_data_req.json()
                     config = guild_data.get('config', {})
                     if len(config) == 0 or (len(config) == 1 and config.get('__cache') != None):
@@ -315,10 +305,15 @@ async def on_ready():
     if not tasks_made:
         print('Created tasks for loops')
         client.loop.create_task(run_bot_loop())
+        client.loop.create_task(deadline_scheduler.run()) # Ends mutes, bans, warnings, reminders and giveaways
+        config_bus.start() # Drops cached guild configs when the dashboard or a worker changes them
+        client.loop.create_task(xp_ledger.run()) # Awards the XP members earned and announces level ups
         client.loop.create_task(run_url_db_dl())
         client.loop.create_task(run_feed_loop())
         client.loop.create_task(run_hourly_loop())
         client.loop.create_task(run_cleanup_loop())
+        client.loop.create_task(run_user_info_loop()) # Keeps the profiles and social links of users up to date
+        client.loop.create_task(run_stats_loop()) # Lets the workers serve the bot's caches and queues on /analytics
         tasks_made = True
     print('Bot ready')
 
@@ -339,14 +334,8 @@ async def on_message(event: MessageEvent):
         channel = await message.server.getch_channel(channel_id)
         message.content = message.content.replace(f'#{channel.name}', f'<#{channel.id}>')
     
-    user_data_req = requests.get(f'http://localhost:5000/userinfo/{message.server_id}/{message.author_id}', headers={
-        'authorization': bot_config.SECRET_KEY
-    })
-
-    if user_data_req.status_code == 200:
-        message.language = user_data_req.json().get('language', 'en')
-    else:
-        message.language = 'en'
+    context = MessageContext(message.server_id, message.author_id)
+    message.language = await context.get_language()
     
     if message.content.strip() == f'<@{client.user_id}>':
         await message.reply(
@@ -364,7 +353,7 @@ async def on_message(event: MessageEvent):
     await client.process_commands(message)
     for callback in client.message_listeners:
         try:
-            await callback(message)
+            await callback(message, context)
         except Exception as e:
             print('Failed to run message listener:', e)
 
@@ -645,6 +634,7 @@ from project.server.api.images import images_blueprint
 from project.server.api.reminders import reminders_blueprint
 from project.server.api.roles import roles_blueprint
 from project.server.api.fflags import fflag_blueprint
+from project.server.api.deadlines import deadlines_blueprint
 
 app.register_blueprint(verification_blueprint)
 app.register_blueprint(moderation_blueprint)
@@ -657,6 +647,7 @@ app.register_blueprint(images_blueprint)
 app.register_blueprint(reminders_blueprint)
 app.register_blueprint(roles_blueprint)
 app.register_blueprint(fflag_blueprint)
+app.register_blueprint(deadlines_blueprint)
 
 if app_settings == 'DevelopmentConfig' and not os.getenv('MIGRATING_DB', '0') == '1':
     import threading
@@ -1,6 +1,6 @@
 import os
 from guilded.ext import commands
-from project import client, app, managers
+from project import client, app
 
 import threading
 import multiprocessing
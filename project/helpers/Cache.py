@@ -1,76 +1,263 @@
-from threading import Timer
+from collections import OrderedDict
+from threading import Condition, Lock, RLock, Thread
 
+import heapq
+import itertools
+import os
 import time
+import weakref
+
+class ExpiryScheduler:
+    """ A single background thread that expires cache entries for every cache in the process.
+
+    Deadlines are kept in a min-heap, so the thread only ever wakes up when the
+    earliest entry is actually due instead of sweeping every cache each second. """
+    def __init__(self):
+        self.__init_state()
+        os.register_at_fork(after_in_child=self.__init_state)
+
+    def __init_state(self):
+        # Called again in forked children (gunicorn workers) since the
+        # thread and lock of the parent do not survive the fork
+        self.__heap = []
+        self.__counter = itertools.count()
+        self.__condition = Condition(Lock())
+        self.__thread = None
+
+    def schedule(self, deadline: float, callback):
+        with self.__condition:
+            heapq.heappush(self.__heap, (deadline, next(self.__counter), callback))
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, name='cache-expiry', daemon=True)
+                self.__thread.start()
+            elif self.__heap[0][2] is callback:
+                # The new deadline is now the earliest, wake the thread so it can re-sleep
+                self.__condition.notify()
+
+    def pending(self):
+        return len(self.__heap)
+
+    def __run(self):
+        while True:
+            with self.__condition:
+                while len(self.__heap) == 0:
+                    self.__condition.wait()
+                deadline = self.__heap[0][0]
+                now = time.time()
+                if deadline > now:
+                    self.__condition.wait(deadline - now)
+                    continue
+                _, _, callback = heapq.heappop(self.__heap)
+            try:
+                callback()
+            except Exception as e:
+                print(f'WARNING: cache expiry callback failed: {e}')
+
+scheduler = ExpiryScheduler()
+caches = weakref.WeakSet()
+
+def reset_caches_after_fork():
+    # Registered after the scheduler's own hook, so it runs once the heap is empty again
+    for cache in list(caches):
+        cache.after_fork()
+
+os.register_at_fork(after_in_child=reset_caches_after_fork)
+
+def get_cache_stats():
+    """ Get the hit/miss/eviction counters of every live cache """
+    return [cache.stats() for cache in list(caches)]
 
 class Cache:
-    def __init__(self, expires_after = 300, original_cache=None):
+    def __init__(self, expires_after = 300, original_cache=None, max_size: int=None, name: str=None, size_of=None):
         if original_cache is None:
             original_cache = {}
         self.__cache = original_cache
         self.__expire_after = expires_after
-        self.__timer = Timer(1, self.__check)
-        
-        self.__timer.start()
-    
-    def __del__(self):
-        self.__cache = {}
-        self.__timer.cancel()
-        del self.__timer
-    
-    def __check(self):
-        for key in list(self.__cache.keys()):
-            if time.time() - self.__cache[key][0] > self.__expire_after:
-                del self.__cache[key]
-        self.__timer = Timer(1, self.__check)
-        self.__timer.start()
-    
+        self.__max_size = max_size
+        self.__size_of = size_of # Measures a value, max_size is then a budget of that measure instead of a count of entries
+        self.__sizes: dict = {} # key -> measured size, only tracked when bounded
+        self.__total_size = 0
+        self.__order = OrderedDict() # Keys in least to most recently used order, only tracked when bounded
+        self.__scheduled = set() # Keys with a deadline in the expiry scheduler
+        self.__lock = RLock()
+        self.name = name or f'cache-{id(self)}'
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        caches.add(self)
+
+    def after_fork(self):
+        """ Make the cache usable in a forked child. Its lock may have been held
+        by a thread that did not survive the fork, and none of its deadlines are
+        in the child's scheduler, so every key is scheduled again. """
+        self.__lock = RLock()
+        self.__scheduled.clear()
+        for key, item in list(self.__cache.items()):
+            self.__scheduled.add(key)
+            self.__schedule(key, item[0] + self.__expire_after)
+
+    def __schedule(self, key: str, deadline: float):
+        ref = weakref.ref(self)
+        def expire():
+            cache = ref()
+            if cache is not None:
+                cache.__expire(key)
+        scheduler.schedule(deadline, expire)
+
+    def __expire(self, key: str):
+        with self.__lock:
+            item = self.__cache.get(key)
+            if item is None:
+                self.__scheduled.discard(key)
+            elif time.time() - item[0] >= self.__expire_after:
+                self.__scheduled.discard(key)
+                self.__delete(key)
+                self.expirations += 1
+            else:
+                # Set again since this deadline was scheduled, follow it to the new one
+                self.__schedule(key, item[0] + self.__expire_after)
+
+    def __delete(self, key: str):
+        try:
+            del self.__cache[key]
+        except KeyError:
+            pass
+        self.__order.pop(key, None)
+        self.__total_size -= self.__sizes.pop(key, 0)
+
     def get(self, key: str):
-        if key in self.__cache:
-            return self.__cache[key][1]
-        return None
-    
+        with self.__lock:
+            item = self.__cache.get(key)
+            if item is not None:
+                if time.time() - item[0] > self.__expire_after:
+                    # Lazily expire entries whose deadline has passed but were not swept yet
+                    self.__delete(key)
+                    self.expirations += 1
+                else:
+                    self.hits += 1
+                    if self.__max_size is not None:
+                        self.__order.move_to_end(key)
+                    return item[1]
+            self.misses += 1
+            return None
+
     def set(self, key: str, value):
-        self.__cache[key] = [time.time(), value]
-    
+        with self.__lock:
+            stamp = time.time()
+            self.__cache[key] = [stamp, value]
+            if self.__max_size is not None:
+                self.__order[key] = None
+                self.__order.move_to_end(key)
+                size = self.__size_of(value) if self.__size_of is not None else 1
+                self.__total_size += size - self.__sizes.get(key, 0)
+                self.__sizes[key] = size
+                # The newest entry is kept even if it is larger than the whole budget
+                while self.__total_size > self.__max_size and len(self.__order) > 1:
+                    oldest, _ = self.__order.popitem(last=False)
+                    self.__delete(oldest)
+                    self.evictions += 1
+            # A key only ever has one deadline in the heap. One that is already
+            # pending is earlier than this one and moves on to it when it fires
+            if key not in self.__scheduled:
+                self.__scheduled.add(key)
+                self.__schedule(key, stamp + self.__expire_after)
+
     def remove(self, key: str):
-        if key in self.__cache:
-            del self.__cache[key]
+        with self.__lock:
+            if key in self.__cache:
+                self.__delete(key)
+
+    def stats(self):
+        stats = {
+            'name': self.name,
+            'size': len(self.__cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
+        if self.__size_of is not None:
+            stats['measured_size'] = self.__total_size
+        return stats
 
 class ArrayCache:
-    def __init__(self, expires_after = 300, original_cache=None):
+    def __init__(self, expires_after = 300, original_cache=None, max_size: int=None, name: str=None):
         if original_cache is None:
             original_cache = []
         self.__cache = original_cache
         self.__expire_after = expires_after
-        self.__timer = Timer(1, self.__check)
-        
-        self.__timer.start()
-    
-    def __del__(self):
-        self.__cache = {}
-        self.__timer.cancel()
-        del self.__timer
-    
-    def __check(self):
-        for item in self.__cache:
-            if time.time() - item[0] > self.__expire_after:
-                self.__cache.remove(item)
-        self.__timer = Timer(1, self.__check)
-        self.__timer.start()
-    
+        self.__max_size = max_size
+        self.__lock = RLock()
+        self.name = name or f'arraycache-{id(self)}'
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        caches.add(self)
+
+    def after_fork(self):
+        """ Make the cache usable in a forked child, see Cache.after_fork """
+        self.__lock = RLock()
+        for stamp, _ in list(self.__cache):
+            self.__schedule(stamp + self.__expire_after)
+
+    def __schedule(self, deadline: float):
+        ref = weakref.ref(self)
+        def expire():
+            cache = ref()
+            if cache is not None:
+                cache.__expire()
+        scheduler.schedule(deadline, expire)
+
+    def __expire(self):
+        with self.__lock:
+            # Items are appended in time order, so expired items are always at the front
+            now = time.time()
+            expired = 0
+            while expired < len(self.__cache) and now - self.__cache[expired][0] >= self.__expire_after:
+                expired += 1
+            if expired > 0:
+                del self.__cache[:expired]
+                self.expirations += expired
+
     def get(self, key: int):
-        if key < len(self.__cache):
-            return self.__cache[key][1]
-        return None
-    
+        with self.__lock:
+            self.__expire()
+            if key < len(self.__cache):
+                self.hits += 1
+                return self.__cache[key][1]
+            self.misses += 1
+            return None
+
     def list(self):
-        res = []
-        for item in self.__cache:
-            res.append(item[1])
-        return res
-    
+        with self.__lock:
+            self.__expire()
+            return [item[1] for item in self.__cache]
+
     def add(self, value):
-        self.__cache.append([time.time(), value])
-    
+        with self.__lock:
+            self.__cache.append([time.time(), value])
+            if self.__max_size is not None and len(self.__cache) > self.__max_size:
+                overflow = len(self.__cache) - self.__max_size
+                del self.__cache[:overflow]
+                self.evictions += overflow
+        self.__schedule(time.time() + self.__expire_after)
+
     def clear(self):
-        self.__cache.clear()
+        with self.__lock:
+            self.__cache.clear()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'size': len(self.__cache),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+        }
@@ -0,0 +1,128 @@
+from project.helpers.Cache import caches, scheduler
+
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+
+SHARED_CACHE_PATH = os.getenv('SHARED_CACHE_PATH', os.path.join(tempfile.gettempdir(), 'serverguard-cache.sqlite3'))
+PURGE_INTERVAL = 60
+
+KIND_PICKLED = 0
+KIND_BYTES = 1
+
+class SharedStore:
+    """ A SQLite file every gunicorn worker and the bot open, so they all see the same entries.
+
+    Expiry is part of every read, so an expired entry is never returned even
+    before the periodic purge deletes it. """
+    def __init__(self, path: str):
+        self.path = path
+        self.__local = threading.local()
+        self.__purge_pid = None
+        self.__purge_lock = threading.Lock()
+
+    def connection(self):
+        local = self.__local
+        # Connections must not be shared between threads or carried over a fork
+        if getattr(local, 'pid', None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute("""CREATE TABLE IF NOT EXISTS cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                kind INTEGER NOT NULL,
+                value BLOB,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID""")
+            connection.execute('CREATE INDEX IF NOT EXISTS cache_expires_at ON cache (expires_at)')
+            local.connection = connection
+            local.pid = os.getpid()
+        self.__schedule_purge()
+        return local.connection
+
+    def __schedule_purge(self):
+        with self.__purge_lock:
+            if self.__purge_pid == os.getpid():
+                return
+            self.__purge_pid = os.getpid()
+        scheduler.schedule(time.time() + PURGE_INTERVAL, self.purge)
+
+    def purge(self):
+        try:
+            self.connection().execute('DELETE FROM cache WHERE expires_at <= ?', (time.time(),))
+        finally:
+            scheduler.schedule(time.time() + PURGE_INTERVAL, self.purge)
+
+shared_store = SharedStore(SHARED_CACHE_PATH)
+
+class SharedCache:
+    """ A Cache whose entries are shared across processes.
+
+    Values are pickled, except bytes which are stored as they are. Like a
+    proxied dict, changing a returned value does not change the cached one,
+    set it again instead. """
+    def __init__(self, expires_after = 300, name: str=None, store: SharedStore=None):
+        if name is None:
+            raise ValueError('Shared caches need a name to share entries under')
+        self.__expire_after = expires_after
+        self.__store = store or shared_store
+        self.name = name
+
+        self.hits = 0
+        self.misses = 0
+
+        caches.add(self)
+
+    def after_fork(self):
+        """ Nothing to reset, entries live in the store and it opens a new
+        connection in every process """
+
+    def get(self, key: str):
+        row = self.__store.connection().execute(
+            'SELECT kind, value FROM cache WHERE namespace = ? AND key = ? AND expires_at > ?',
+            (self.name, str(key), time.time())
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        kind, value = row
+        if kind == KIND_BYTES:
+            return bytes(value)
+        return pickle.loads(value)
+
+    def set(self, key: str, value):
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            kind, stored = KIND_BYTES, bytes(value)
+        else:
+            kind, stored = KIND_PICKLED, pickle.dumps(value)
+        self.__store.connection().execute(
+            'INSERT OR REPLACE INTO cache (namespace, key, kind, value, expires_at) VALUES (?, ?, ?, ?, ?)',
+            (self.name, str(key), kind, stored, time.time() + self.__expire_after)
+        )
+
+    def remove(self, key: str):
+        self.__store.connection().execute(
+            'DELETE FROM cache WHERE namespace = ? AND key = ?',
+            (self.name, str(key))
+        )
+
+    def stats(self):
+        size = self.__store.connection().execute(
+            'SELECT COUNT(*) FROM cache WHERE namespace = ? AND expires_at > ?',
+            (self.name, time.time())
+        ).fetchone()[0]
+        return {
+            'name': self.name,
+            'size': size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': 0,
+            'expirations': 0,
+            'shared': True,
+        }
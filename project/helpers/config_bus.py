@@ -0,0 +1,66 @@
+import asyncio
+import os
+
+# Created on import, before gunicorn forks its workers (preload_app), so every
+# worker inherits the write end and can tell the bot about config changes
+read_fd, write_fd = os.pipe()
+os.set_blocking(read_fd, False)
+os.set_blocking(write_fd, False)
+
+class ConfigBus:
+    """ Tells the caches derived from a guild's config that it changed.
+
+    Every config write bumps the guild's config_version. publish() hands the
+    new version to the subscribers in this process and writes it to a pipe
+    the bot reads, so its caches drop the guild no matter which worker made
+    the change. Versions also let a cache skip storing data that was read
+    before the latest change it heard about. """
+    def __init__(self):
+        self.__subscribers = []
+        self.__versions: dict[str, int] = {} # guild_id -> latest version published
+        self.__buffer = b''
+
+    def subscribe(self, callback):
+        """ Call callback(guild_id) whenever the config of a guild changes """
+        self.__subscribers.append(callback)
+        return callback
+
+    def publish(self, guild_id: str, version: int):
+        self.__deliver(guild_id, version)
+        try:
+            os.write(write_fd, f'{guild_id} {version}\n'.encode('utf-8'))
+        except OSError:
+            pass # The bot is not reading right now, its caches fall back on their expiry
+
+    def is_current(self, guild_id: str, version: int):
+        """ Whether data read at version is still the latest config of the guild """
+        return (version or 0) >= self.__versions.get(guild_id, 0)
+
+    def __deliver(self, guild_id: str, version: int):
+        if version <= self.__versions.get(guild_id, -1):
+            return # Already handled, the bot reads its own publishes back from the pipe
+        self.__versions[guild_id] = version
+        for callback in self.__subscribers:
+            try:
+                callback(guild_id)
+            except Exception as e:
+                print(f'WARNING: config subscriber failed for {guild_id}: {e}')
+
+    def __read(self):
+        try:
+            self.__buffer += os.read(read_fd, 65536)
+        except BlockingIOError:
+            return
+        *lines, self.__buffer = self.__buffer.split(b'\n')
+        for line in lines:
+            try:
+                guild_id, version = line.decode('utf-8').split(' ')
+                self.__deliver(guild_id, int(version))
+            except ValueError:
+                print(f'WARNING: malformed config notification {line}')
+
+    def start(self):
+        """ Start delivering the changes made by other processes, called once from the bot's loop """
+        asyncio.get_running_loop().add_reader(read_fd, self.__read)
+
+config_bus = ConfigBus()
@@ -0,0 +1,110 @@
+from datetime import datetime
+from project.helpers import localapi
+
+import asyncio
+import heapq
+import os
+import time
+
+DEADLINE_HORIZON = 60 * 10 # Deadlines further away than this are left for a later refresh
+DEADLINE_REFRESH = 60 * 5
+
+# Created on import, before gunicorn forks its workers (preload_app), so every
+# worker inherits the write end and can hand new deadlines to the bot directly
+read_fd, write_fd = os.pipe()
+os.set_blocking(read_fd, False)
+os.set_blocking(write_fd, False)
+
+def notify(kind: str, id: str, ends_at: datetime):
+    """ Tell the bot about a new or moved deadline, kind is either 'status' or 'giveaway' """
+    if ends_at is None:
+        return
+    timestamp = ends_at.timestamp()
+    if timestamp - time.time() > DEADLINE_HORIZON:
+        return
+    try:
+        os.write(write_fd, f'{kind} {id} {timestamp}\n'.encode('utf-8'))
+    except OSError:
+        pass # The bot is not reading right now, its next refresh will load the deadline
+
+class DeadlineScheduler:
+    """ Fires status and giveaway deadlines at their ends_at.
+
+    Only deadlines inside DEADLINE_HORIZON are kept in the heap. They are
+    loaded with an indexed range query on start and every DEADLINE_REFRESH,
+    and deadlines created in between arrive through notify(). """
+    def __init__(self):
+        self.__heap = []
+        self.__deadlines = {} # (kind, id) -> timestamp, so moved deadlines can be told apart from stale heap entries
+        self.__wake: asyncio.Event = None
+        self.__buffer = b''
+
+    def add(self, kind: str, id: str, timestamp: float):
+        if self.__deadlines.get((kind, id)) == timestamp:
+            return
+        self.__deadlines[(kind, id)] = timestamp
+        heapq.heappush(self.__heap, (timestamp, kind, id))
+        if self.__wake is not None:
+            self.__wake.set()
+
+    def __read_notifications(self):
+        try:
+            self.__buffer += os.read(read_fd, 65536)
+        except BlockingIOError:
+            return
+        *lines, self.__buffer = self.__buffer.split(b'\n')
+        for line in lines:
+            try:
+                kind, id, timestamp = line.decode('utf-8').split(' ')
+                self.add(kind, id, float(timestamp))
+            except ValueError:
+                print(f'WARNING: malformed deadline notification {line}')
+
+    async def refresh(self):
+        deadlines_req = await localapi.get(f'/deadlines?until={time.time() + DEADLINE_HORIZON}')
+        if deadlines_req.ok:
+            for item in deadlines_req.json()['result']:
+                self.add(item['type'], item['id'], item['ends_at'])
+
+    def __pop_due(self):
+        due = {}
+        now = time.time()
+        while len(self.__heap) > 0 and self.__heap[0][0] <= now:
+            timestamp, kind, id = heapq.heappop(self.__heap)
+            if self.__deadlines.get((kind, id)) != timestamp:
+                continue # The deadline was moved after this entry was pushed
+            del self.__deadlines[(kind, id)]
+            due.setdefault(kind, []).append(id)
+        return due
+
+    async def run(self):
+        self.__wake = asyncio.Event()
+        asyncio.get_running_loop().add_reader(read_fd, self.__read_notifications)
+
+        next_refresh = 0
+        while True:
+            if time.time() >= next_refresh:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f'WARNING: failed to load deadlines because "{e}"')
+                next_refresh = time.time() + DEADLINE_REFRESH
+
+            due = self.__pop_due()
+            if len(due) > 0:
+                try:
+                    # Anything that fails here is still due in the DB and is picked up by the next refresh
+                    await localapi.post('/deadlines/expire', json=due)
+                except Exception as e:
+                    print(f'WARNING: failed to expire deadlines because "{e}"')
+
+            timeout = next_refresh - time.time()
+            if len(self.__heap) > 0:
+                timeout = min(timeout, self.__heap[0][0] - time.time())
+            self.__wake.clear()
+            try:
+                await asyncio.wait_for(self.__wake.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+
+deadline_scheduler = DeadlineScheduler()
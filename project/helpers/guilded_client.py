@@ -0,0 +1,160 @@
+from guilded import http
+from project.helpers.io_loop import io_loop
+from threading import Lock
+from types import SimpleNamespace
+from yarl import URL
+
+import aiohttp
+import asyncio
+import time
+
+GUILDED_HOST_SUFFIX = 'guilded.gg'
+MAX_BUCKETS = 500
+
+class RequestBuckets:
+    """ Rate limit and timing bookkeeping for every request the process makes
+    to Guilded, shared by every thread of the process.
+
+    A 429 blocks its bucket until its Retry-After has passed, and requests to
+    a blocked bucket wait for it instead of being sent just to be limited again. """
+    def __init__(self):
+        self.__lock = Lock()
+        self.__blocked_until: dict[str, float] = {}
+        self.__stats: dict[str, dict] = {}
+
+    @staticmethod
+    def bucket(method: str, url: URL):
+        if url.host is None or not url.host.endswith(GUILDED_HOST_SUFFIX):
+            return None # The session also downloads images from anywhere, those are not tracked
+        # Guilded paths alternate between a collection and an id, /servers/{id}/members/{id}/roles/{id}
+        segments = url.path.strip('/').split('/')
+        if len(segments) > 0 and segments[0] == 'api':
+            segments = segments[2:] # Drop the /api/v1 prefix
+        path = '/'.join(i % 2 == 1 and ':id' or segment for i, segment in enumerate(segments))
+        return f'{method} {url.host}/{path}'
+
+    def wait_time(self, bucket: str):
+        with self.__lock:
+            return self.__blocked_until.get(bucket, 0) - time.time()
+
+    def block(self, bucket: str, retry_after: float):
+        with self.__lock:
+            if bucket not in self.__blocked_until and len(self.__blocked_until) >= MAX_BUCKETS:
+                now = time.time()
+                for other in [other for other, until in self.__blocked_until.items() if until <= now]:
+                    del self.__blocked_until[other]
+            self.__blocked_until[bucket] = max(self.__blocked_until.get(bucket, 0), time.time() + retry_after)
+
+    def record(self, bucket: str, elapsed: float, status: int=None):
+        with self.__lock:
+            stats = self.__stats.get(bucket)
+            if stats is None:
+                if len(self.__stats) >= MAX_BUCKETS:
+                    bucket = 'other' # Ids that don't look like ids could make endless buckets
+                    stats = self.__stats.get(bucket)
+            if stats is None:
+                stats = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'total_seconds': 0.0, 'max_seconds': 0.0}
+                self.__stats[bucket] = stats
+            stats['requests'] += 1
+            stats['total_seconds'] += elapsed
+            stats['max_seconds'] = max(stats['max_seconds'], elapsed)
+            if status is None or status >= 500:
+                stats['errors'] += 1
+            elif status == 429:
+                stats['rate_limited'] += 1
+
+    def stats(self):
+        now = time.time()
+        with self.__lock:
+            return [{
+                'bucket': bucket,
+                'requests': stats['requests'],
+                'errors': stats['errors'],
+                'rate_limited': stats['rate_limited'],
+                'blocked_seconds': round(max(self.__blocked_until.get(bucket, 0) - now, 0), 3),
+                'average_seconds': round(stats['total_seconds'] / stats['requests'], 4),
+                'max_seconds': round(stats['max_seconds'], 4),
+            } for bucket, stats in self.__stats.items()]
+
+buckets = RequestBuckets()
+
+async def on_request_start(session, context: SimpleNamespace, params: aiohttp.TraceRequestStartParams):
+    context.bucket = RequestBuckets.bucket(params.method, params.url)
+    if context.bucket is None:
+        return
+    wait = buckets.wait_time(context.bucket)
+    if wait > 0:
+        await asyncio.sleep(wait)
+    context.started = time.monotonic()
+
+async def on_request_end(session, context: SimpleNamespace, params: aiohttp.TraceRequestEndParams):
+    if context.bucket is None:
+        return
+    status = params.response.status
+    buckets.record(context.bucket, time.monotonic() - context.started, status)
+    if status == 429:
+        try:
+            retry_after = float(params.response.headers.get('Retry-After', 1))
+        except ValueError:
+            retry_after = 1
+        buckets.block(context.bucket, retry_after)
+
+async def on_request_exception(session, context: SimpleNamespace, params: aiohttp.TraceRequestExceptionParams):
+    if getattr(context, 'bucket', None) is not None and hasattr(context, 'started'):
+        buckets.record(context.bucket, time.monotonic() - context.started)
+
+trace_config = aiohttp.TraceConfig()
+trace_config.on_request_start.append(on_request_start)
+trace_config.on_request_end.append(on_request_end)
+trace_config.on_request_exception.append(on_request_exception)
+
+session: aiohttp.ClientSession = None
+session_loop: asyncio.AbstractEventLoop = None
+
+def get_session():
+    """ Get the keep-alive session of the IO loop, which every request to Guilded and
+    every download goes through. Only call it on the IO loop, see io_loop.on_io_loop """
+    global session, session_loop
+    loop = asyncio.get_running_loop()
+    if loop is not io_loop.get_loop():
+        raise RuntimeError('get_session must be used on the IO loop, wrap the caller with on_io_loop')
+    # A session made before a fork belongs to the parent's loop
+    if session is None or session.closed or session_loop is not loop:
+        session_loop = loop
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=64, limit_per_host=32, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30),
+            trace_configs=[trace_config]
+        )
+    return session
+
+class GuildedHTTPClient(http.HTTPClient):
+    """ An HTTPClient that can be shared by every thread and event loop, each
+    request runs on the IO loop so it goes through the one pooled session. """
+    @property
+    def session(self):
+        return get_session()
+
+    @session.setter
+    def session(self, value):
+        pass # The session belongs to the IO loop, get_session hands it out
+
+    async def request(self, route: http.Route, **kwargs):
+        return await io_loop.run(super().request(route, **kwargs))
+
+client: GuildedHTTPClient = None
+client_lock = Lock()
+
+def get_client():
+    """ Get the process-wide Guilded API client """
+    global client
+    with client_lock:
+        if client is None:
+            from project import bot_config
+
+            client = GuildedHTTPClient()
+            client.token = bot_config.GUILDED_BOT_TOKEN
+    return client
+
+def get_request_stats():
+    return buckets.stats()
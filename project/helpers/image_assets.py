@@ -0,0 +1,107 @@
+ASSET_EXPIRY = 60 * 60
+ASSET_CACHE_BYTES = 64 * 1024 * 1024 # Pixel memory the decoded assets of a process may take
+
+from PIL import Image
+from project.helpers.Cache import Cache
+from project.helpers.SharedCache import SharedCache
+from project.helpers.guilded_client import get_session
+from project.helpers.io_loop import on_io_loop
+from project.helpers.rank_card import cover
+from threading import Lock
+
+import asyncio
+import io
+import numpy as np
+
+class ImageAsset:
+    """ A downloaded image, already scaled and cropped to the size it is drawn at """
+    __slots__ = ('url', 'image', 'dominant_color')
+
+    def __init__(self, url: str, content: bytes, size: tuple[int, int]):
+        self.url = url
+        image = Image.open(io.BytesIO(content))
+        # JPEGs can be decoded at a fraction of their size, as long as it still covers size
+        scale = max(size[0] / image.width, size[1] / image.height)
+        image.draft('RGB', (int(image.width * scale) + 1, int(image.height * scale) + 1))
+        image = image.convert('RGBA')
+        self.dominant_color = get_dominant_color(image)
+        self.image = cover(image, size)
+
+    @property
+    def nbytes(self):
+        return self.image.width * self.image.height * len(self.image.getbands())
+
+def get_dominant_color(image: Image.Image):
+    """ Get the dominant color of the image.
+
+    Colours are binned by their top 4 bits per channel on a 64x64 copy, the
+    result is the average of the pixels in the fullest bin. """
+    image = image.convert('RGBA')
+    image.thumbnail((64, 64))
+    pixels = np.asarray(image).reshape(-1, 4)
+    opaque = pixels[pixels[:, 3] > 127]
+    if len(opaque) > 0:
+        pixels = opaque # Transparent areas don't show, so they should not pick the colour
+    rgb = pixels[:, :3].astype(np.int32)
+    bins = (rgb[:, 0] >> 4) << 8 | (rgb[:, 1] >> 4) << 4 | (rgb[:, 2] >> 4)
+    peak = rgb[bins == np.argmax(np.bincount(bins, minlength=4096))].mean(axis=0)
+    return ''.join(f'{int(c):02x}' for c in peak)
+
+asset_cache = Cache(ASSET_EXPIRY, max_size=ASSET_CACHE_BYTES, name='image_assets', size_of=lambda asset: asset.nbytes) # (url, size) -> ImageAsset
+content_cache = SharedCache(ASSET_EXPIRY, name='image_asset_content') # url -> downloaded bytes, shared by every worker
+
+stats_lock = Lock()
+asset_stats = {
+    'requests': 0,
+    'memory_hits': 0,
+    'shared_hits': 0,
+    'downloads': 0,
+}
+
+def count(key: str):
+    with stats_lock:
+        asset_stats[key] += 1
+
+@on_io_loop
+async def download(url: str):
+    async with get_session().get(url, headers={
+        'User-Agent': 'Guilded Server Guard/1.0 (Image Assets)'
+    }) as response:
+        response.raise_for_status()
+        return await response.read()
+
+async def get_image_asset(url: str, size: tuple[int, int], fallback: str=None):
+    """ Get the image at url scaled to size, only downloading and processing it if no cache has it.
+
+    If it can't be downloaded or is not an image, the image at fallback is used instead """
+    count('requests')
+    key = (url, size)
+    asset: ImageAsset = asset_cache.get(key)
+    if asset is not None:
+        count('memory_hits')
+        return asset
+
+    try:
+        content = content_cache.get(url)
+        if content is not None:
+            count('shared_hits')
+        else:
+            content = await download(url)
+            count('downloads')
+            content_cache.set(url, content)
+        asset = await asyncio.to_thread(ImageAsset, url, content, size)
+    except Exception as e:
+        if fallback is None or fallback == url:
+            raise
+        print(f'WARNING: could not load the image "{url}", using "{fallback}" instead "{e}"')
+        content_cache.remove(url)
+        asset = await get_image_asset(fallback, size)
+    asset_cache.set(key, asset) # A broken image keeps its fallback until it expires instead of being downloaded again
+    return asset
+
+def get_asset_stats():
+    with stats_lock:
+        stats = dict(asset_stats)
+    hits = stats['memory_hits'] + stats['shared_hits']
+    stats['hit_rate'] = round(hits / stats['requests'], 4) if stats['requests'] > 0 else None
+    return stats
@@ -0,0 +1,169 @@
+from abc import ABC, abstractmethod
+from io import BytesIO
+from PIL import Image
+from queue import Queue, Empty
+from threading import Lock, Thread
+
+import asyncio
+import numpy as np
+import time
+
+class BatchWorker(ABC):
+    """ Runs a model on a background thread in small batches.
+
+    Requests that arrive within max_latency seconds of each other are handed
+    to run_batch together, and each caller's future is resolved with its own
+    result from the event loop it is waiting on. """
+    name = 'batch-worker'
+
+    def __init__(self, max_batch_size: int=32, max_latency: float=0.005):
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.__queue = Queue()
+        self.__lock = Lock()
+        self.__thread = None
+
+        self.batches = 0
+        self.items = 0
+        self.largest_batch = 0
+        self.busy_time = 0.0
+
+    async def submit(self, item):
+        with self.__lock:
+            if self.__thread is None:
+                self.__thread = Thread(target=self.__run, name=self.name, daemon=True)
+                self.__thread.start()
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.__queue.put((item, future, loop))
+        return await future
+
+    @abstractmethod
+    def run_batch(self, items: list):
+        """ Get one result per item, a result that is an Exception is raised to that caller only """
+
+    def __run(self):
+        while True:
+            batch = [self.__queue.get()]
+            deadline = time.monotonic() + self.max_latency
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.__queue.get(timeout=remaining))
+                except Empty:
+                    break
+
+            started = time.monotonic()
+            try:
+                results = self.run_batch([item for item, _, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future, loop), result in zip(batch, results):
+                loop.call_soon_threadsafe(self.__resolve, future, result)
+
+            self.batches += 1
+            self.items += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            self.busy_time += time.monotonic() - started
+
+    @staticmethod
+    def __resolve(future: asyncio.Future, result):
+        if future.done():
+            return # The caller gave up waiting
+        if isinstance(result, Exception):
+            future.set_exception(result)
+        else:
+            future.set_result(result)
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'batches': self.batches,
+            'items': self.items,
+            'pending': self.__queue.qsize(),
+            'largest_batch': self.largest_batch,
+            'average_batch': self.batches and self.items / self.batches or 0,
+            'busy_seconds': round(self.busy_time, 3),
+        }
+
+class BatchPredictor(BatchWorker):
+    """ Runs the text classifiers in batches, filters sharing a vectorizer reuse
+    the same sparse matrix. """
+    name = 'filter-inference'
+
+    def __init__(self, filters: dict, max_batch_size: int=32, max_latency: float=0.005):
+        super().__init__(max_batch_size, max_latency)
+        self.filters = filters
+
+    async def predict(self, text: str, names: list):
+        """ Get the positive class probability of text for every filter in names """
+        for name in names:
+            if not self.filters.get(name):
+                raise Exception('Filter not found')
+        if len(names) == 0:
+            return {}
+        return await self.submit((text, tuple(names)))
+
+    def run_batch(self, batch: list):
+        results = [{} for _ in batch]
+        matrices = {} # id(vectorizer) -> (rows of the batch it covers, matrix)
+
+        for name, f in self.filters.items():
+            rows = [i for i, item in enumerate(batch) if name in item[1]]
+            if len(rows) == 0:
+                continue
+            vectorizer = f['vectorizer']
+            key = id(vectorizer)
+            if key not in matrices:
+                # Vectorize every text that needs this vectorizer once, for all filters sharing it
+                vec_rows = [i for i, item in enumerate(batch) if any(
+                    self.filters[n]['vectorizer'] is vectorizer for n in item[1]
+                )]
+                matrices[key] = (vec_rows, vectorizer.transform([batch[i][0] for i in vec_rows]))
+            vec_rows, matrix = matrices[key]
+            positions = {row: position for position, row in enumerate(vec_rows)}
+            probs = f['model'].predict_proba(matrix[[positions[i] for i in rows]])
+            for i, prob in zip(rows, probs):
+                results[i][name] = prob[1]
+        return results
+
+class ImageClassifier(BatchWorker):
+    """ Runs the NSFW image model in batches, images are decoded and resized in
+    memory instead of going through temporary files. """
+    name = 'nsfw-inference'
+    categories = ['drawings', 'hentai', 'neutral', 'porn', 'sexy']
+
+    def __init__(self, get_model, image_dim: int=224, max_batch_size: int=8, max_latency: float=0.02):
+        super().__init__(max_batch_size, max_latency)
+        self.get_model = get_model # Called from the worker thread, may block until the model is loaded
+        self.image_dim = image_dim
+
+    async def classify(self, image: bytes):
+        """ Get the probability of every category for the image """
+        return await self.submit(image)
+
+    def decode(self, image: bytes):
+        with Image.open(BytesIO(image)) as img:
+            # Same nearest neighbour resize the keras image loader uses
+            img = img.convert('RGB').resize((self.image_dim, self.image_dim), Image.NEAREST)
+            return np.asarray(img, dtype=np.float32) / 255
+
+    def run_batch(self, images: list):
+        results = [None] * len(images)
+        decoded = []
+        rows = []
+        for i, image in enumerate(images):
+            try:
+                decoded.append(self.decode(image))
+                rows.append(i)
+            except Exception as e:
+                results[i] = e
+
+        if len(decoded) > 0:
+            preds = self.get_model().predict(np.stack(decoded))
+            for i, single_preds in zip(rows, preds):
+                results[i] = {category: float(pred) for category, pred in zip(self.categories, single_preds)}
+        return results
@@ -0,0 +1,44 @@
+from project.helpers.per_process import PerProcess
+from threading import Thread
+
+import asyncio
+import functools
+
+class IOLoop:
+    """ An event loop on its own thread that lives as long as the process.
+
+    Flask runs every async view on a new event loop, so anything bound to a
+    loop, like an aiohttp session and its keep-alive connections, would only
+    last one request. Coroutines handed to run() execute on this loop instead,
+    so pooled sessions, queues and timers survive between requests. """
+    def __init__(self, name: str):
+        self.name = name
+        self.__loop = PerProcess(self.__start)
+
+    def __start(self):
+        loop = asyncio.new_event_loop()
+        Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+        return loop
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        return self.__loop.get()
+
+    async def run(self, coro):
+        """ Await coro on this loop from any other loop """
+        loop = self.get_loop()
+        if asyncio.get_running_loop() is loop:
+            return await coro
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+    def run_sync(self, coro, timeout: float=None):
+        """ Run coro on this loop from a thread that has no loop running """
+        return asyncio.run_coroutine_threadsafe(coro, self.get_loop()).result(timeout)
+
+io_loop = IOLoop('io-loop')
+
+def on_io_loop(func):
+    """ Make a coroutine function always run on the process's IO loop, wherever it is awaited from """
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await io_loop.run(func(*args, **kwargs))
+    return wrapper
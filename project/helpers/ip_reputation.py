@@ -0,0 +1,90 @@
+from project.helpers.per_process import PerProcess
+from project.helpers.SharedCache import SharedCache
+from threading import Thread
+
+import ipaddress
+import requests
+import time
+
+RETRY_INTERVAL = 60
+
+class IpSet:
+    """ A set of IP addresses and networks.
+
+    Single addresses are kept as integers and networks as their masked
+    prefix per prefix length, so a lookup is one set check per distinct
+    prefix length instead of a scan over every network. """
+    def __init__(self, entries: list=None):
+        self.__addresses = set()
+        self.__networks: dict[tuple[int, int], set] = {} # (version, prefix length) -> masked prefixes
+
+        for entry in entries or ():
+            try:
+                network = ipaddress.ip_network(entry.strip(), strict=False)
+            except ValueError:
+                continue
+            if network.prefixlen == network.max_prefixlen:
+                self.__addresses.add((network.version, int(network.network_address)))
+            else:
+                prefix = int(network.network_address) >> (network.max_prefixlen - network.prefixlen)
+                self.__networks.setdefault((network.version, network.prefixlen), set()).add(prefix)
+
+    def __len__(self):
+        return len(self.__addresses) + sum(len(prefixes) for prefixes in self.__networks.values())
+
+    def __contains__(self, ip: str):
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            return False
+        value = int(address)
+        if (address.version, value) in self.__addresses:
+            return True
+        for (version, prefixlen), prefixes in self.__networks.items():
+            if version == address.version and value >> (address.max_prefixlen - prefixlen) in prefixes:
+                return True
+        return False
+
+class IpList:
+    """ An IpSet loaded from a URL and refreshed in the background.
+
+    Every process refreshes on its own thread, but the downloaded list is
+    shared so the URL is only fetched once per interval. Lookups never wait
+    on the network, a refresh builds a new IpSet and swaps it in whole. """
+    def __init__(self, name: str, url: str, refresh_interval: int):
+        self.url = url
+        self.refresh_interval = refresh_interval
+        self.ips = IpSet()
+        self.__shared = SharedCache(refresh_interval, name=name)
+        self.__thread = PerProcess(self.__start)
+
+    def __contains__(self, ip: str):
+        self.start()
+        return ip in self.ips
+
+    def start(self):
+        self.__thread.get()
+
+    def __start(self):
+        thread = Thread(target=self.__run, name=f'ip-list-{self.__shared.name}', daemon=True)
+        thread.start()
+        return thread
+
+    def refresh(self):
+        content = self.__shared.get('list')
+        if content is None:
+            response = requests.get(self.url, timeout=30)
+            response.raise_for_status()
+            content = response.content
+            self.__shared.set('list', content)
+        self.ips = IpSet(content.decode('utf-8', errors='ignore').splitlines())
+
+    def __run(self):
+        while True:
+            try:
+                self.refresh()
+                delay = self.refresh_interval
+            except Exception as e:
+                print(f'WARNING: failed to refresh {self.url} because "{e}"')
+                delay = min(self.refresh_interval, RETRY_INTERVAL)
+            time.sleep(delay)
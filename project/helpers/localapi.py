@@ -0,0 +1,65 @@
+from json import loads
+from project.helpers.io_loop import on_io_loop
+
+import asyncio
+import aiohttp
+
+LOCAL_API_BASE = 'http://localhost:5000'
+
+class LocalResponse:
+    """ A minimal stand-in for a requests response so call sites read the same """
+    def __init__(self, status_code: int, body: bytes):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = body
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return loads(self.content)
+
+session: aiohttp.ClientSession = None
+session_loop: asyncio.AbstractEventLoop = None
+
+def get_session():
+    """ Get the keep-alive session of the IO loop, creating it if needed """
+    global session, session_loop
+    loop = asyncio.get_running_loop()
+    if session is None or session.closed or session_loop is not loop:
+        session_loop = loop
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+            timeout=aiohttp.ClientTimeout(total=30)
+        )
+    return session
+
+@on_io_loop
+async def request(method: str, path: str, json=None, data: bytes=None, headers: dict=None):
+    """ Call the bot's own Flask API without blocking the event loop """
+    from project import bot_config
+
+    req_headers = {
+        'authorization': bot_config.SECRET_KEY
+    }
+    if headers is not None:
+        req_headers.update(headers)
+
+    async with get_session().request(method, LOCAL_API_BASE + path, json=json, data=data, headers=req_headers) as response:
+        return LocalResponse(response.status, await response.read())
+
+async def get(path: str, **kwargs):
+    return await request('GET', path, **kwargs)
+
+async def post(path: str, **kwargs):
+    return await request('POST', path, **kwargs)
+
+async def put(path: str, **kwargs):
+    return await request('PUT', path, **kwargs)
+
+async def patch(path: str, **kwargs):
+    return await request('PATCH', path, **kwargs)
+
+async def delete(path: str, **kwargs):
+    return await request('DELETE', path, **kwargs)
@@ -0,0 +1,38 @@
+from threading import Lock
+
+import os
+import weakref
+
+class PerProcess:
+    """ Runs setup once in each process, the first time get() is called.
+
+    Threads do not survive a fork, so anything that starts one, like a
+    background refresh or an event loop, has to start it again in every
+    gunicorn worker. The state is reset in forked children the way the cache
+    expiry scheduler resets its own, which also replaces a lock the parent
+    may have held while it forked. """
+    def __init__(self, setup):
+        self.__setup = setup
+        self.__reset()
+
+        ref = weakref.ref(self)
+        def after_fork():
+            instance = ref()
+            if instance is not None:
+                instance.__reset()
+        os.register_at_fork(after_in_child=after_fork)
+
+    def __reset(self):
+        self.__lock = Lock()
+        self.__done = False
+        self.__value = None
+
+    def get(self):
+        """ The value setup returned in this process """
+        if self.__done:
+            return self.__value
+        with self.__lock:
+            if not self.__done:
+                self.__value = self.__setup()
+                self.__done = True
+            return self.__value
@@ -0,0 +1,47 @@
+STATS_INTERVAL = 30
+
+from project.helpers.SharedCache import SharedCache
+
+import os
+import time
+
+# The bot runs in gunicorn's master process, so the caches, webhook queues and
+# Guilded client it fills are not the ones of the worker answering /analytics.
+# It saves a snapshot of them here every STATS_INTERVAL for the workers to serve
+bot_snapshots = SharedCache(STATS_INTERVAL * 4, name='process_stats')
+
+def stats_sections():
+    """ The stats getters of this process, keyed like the /analytics routes """
+    from project.helpers.Cache import get_cache_stats
+    from project.helpers.guilded_client import get_request_stats
+    from project.helpers.image_assets import get_asset_stats
+    from project.helpers.webhooks import get_webhook_stats
+
+    return {
+        'caches': get_cache_stats,
+        'webhooks': get_webhook_stats,
+        'guilded': get_request_stats,
+        'assets': get_asset_stats,
+    }
+
+def save_bot_stats():
+    bot_snapshots.set('bot', {
+        'pid': os.getpid(),
+        'saved_at': time.time(),
+        'stats': {section: get() for section, get in stats_sections().items()},
+    })
+
+def get_process_stats(section: str):
+    """ One stats section of this worker and of the bot's latest snapshot """
+    snapshot = bot_snapshots.get('bot')
+    return {
+        'worker': {
+            'pid': os.getpid(),
+            section: stats_sections()[section](),
+        },
+        'bot': snapshot and {
+            'pid': snapshot['pid'],
+            'saved_at': snapshot['saved_at'],
+            section: snapshot['stats'][section],
+        },
+    }
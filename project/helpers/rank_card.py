@@ -0,0 +1,116 @@
+FONT_FILES = {
+    'regular': 'SourceSans3-Regular.ttf',
+    'bold': 'SourceSans3-Bold.ttf',
+    'bold_italic': 'SourceSans3-BoldIt.ttf',
+}
+
+CARD_SIZE = (900, 290)
+AVATAR_SIZE = (156, 156)
+
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from threading import Lock
+
+import io
+import os
+
+FONT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'fonts')
+
+fonts_lock = Lock()
+fonts: dict[tuple[str, int], ImageFont.FreeTypeFont] = {}
+
+def get_font(style: str, size: int):
+    """ Get Source Sans 3, the rank card's web font, from project/static/fonts """
+    with fonts_lock:
+        font = fonts.get((style, size))
+        if font is not None:
+            return font
+        try:
+            font = ImageFont.truetype(os.path.join(FONT_DIR, FONT_FILES[style]), size)
+        except OSError as e:
+            print(f'WARNING: could not load the {style} rank card font, using the default "{e}"')
+            try:
+                font = ImageFont.load_default(size)
+            except TypeError:
+                font = ImageFont.load_default() # Pillow older than 10.1 has no sized default font
+        fonts[(style, size)] = font
+        return font
+
+def cover(image: Image.Image, size: tuple[int, int]):
+    """ Scale and crop the image to fill size, like background-size: cover """
+    if image.size == size:
+        return image
+    scale = max(size[0] / image.width, size[1] / image.height)
+    scaled = image.resize((max(round(image.width * scale), size[0]), max(round(image.height * scale), size[1])), Image.LANCZOS)
+    left, top = (scaled.width - size[0]) // 2, (scaled.height - size[1]) // 2
+    return scaled.crop((left, top, left + size[0], top + size[1]))
+
+def rounded_mask(size: tuple[int, int], radius: int):
+    mask = Image.new('L', size, 0)
+    ImageDraw.Draw(mask).rounded_rectangle((0, 0, size[0] - 1, size[1] - 1), radius, fill=255)
+    return mask
+
+def draw_panel(card: Image.Image, box: tuple[int, int, int, int]):
+    """ A translucent dark label over a blurred copy of what is behind it """
+    size = (box[2] - box[0], box[3] - box[1])
+    panel = card.crop(box).filter(ImageFilter.GaussianBlur(24))
+    panel = Image.alpha_composite(panel, Image.new('RGBA', size, (0, 0, 0, 89)))
+    card.paste(panel, box[:2], rounded_mask(size, 6))
+
+def render_rank_card(username: str, avatar: Image.Image, background: Image.Image, rank: int, level: int, experience: str, exp_to_level: str, exp_percent: int, dominant_color: str, levelup: bool=False):
+    """ Draw the rank card as a PNG, laid out like templates/rank_card.html """
+    card = Image.new('RGBA', CARD_SIZE, (0, 0, 0, 0))
+    card.paste(cover(background.convert('RGBA'), CARD_SIZE), (0, 0))
+
+    regular, bold = get_font('regular', 32), get_font('bold', 32)
+    small = get_font('regular', 22)
+    measure = ImageDraw.Draw(card)
+
+    name_width = measure.textlength(username, font=regular)
+    draw_panel(card, (174, 25, 174 + int(name_width) + 18, 71))
+
+    ranking = [('RANK ', small, '#FFFFFF'), (f'#{rank} ', bold, '#F5C400'), ('LEVEL ', small, '#FFFFFF'), (f'{level}', bold, '#F5C400')]
+    ranking_width = int(sum(measure.textlength(text, font=font) for text, font, _ in ranking)) + 18
+    draw_panel(card, (CARD_SIZE[0] - 5 - ranking_width, 5, CARD_SIZE[0] - 5, 51))
+    draw_panel(card, (369, 185, 895, 285))
+
+    # Profile picture with its border
+    border = Image.new('RGBA', (162, 162), (54, 54, 54, 255))
+    card.paste(border, (8, 8), rounded_mask((162, 162), 81))
+    card.paste(cover(avatar.convert('RGBA'), AVATAR_SIZE), (11, 11), rounded_mask(AVATAR_SIZE, 78))
+
+    # Experience bar
+    bar = ImageDraw.Draw(card)
+    bar.rounded_rectangle((375, 238, 888, 278), 4, fill='#363636')
+    bar.rectangle((378, 241, 885, 275), fill='#1F1F1F')
+    fill_width = int(508 * max(min(exp_percent, 100), 0) / 100)
+    if fill_width > 0:
+        bar.rounded_rectangle((378, 241, 378 + fill_width - 1, 275), 1, fill=dominant_color)
+
+    # Text goes on its own layer so it can cast the template's text-shadow
+    text = Image.new('RGBA', CARD_SIZE, (0, 0, 0, 0))
+    draw = ImageDraw.Draw(text)
+    draw.text((183, 48), username, font=regular, fill='#FFFFFF', anchor='lm')
+
+    x = CARD_SIZE[0] - 5 - ranking_width + 9
+    for value, font, colour in ranking:
+        draw.text((x, 40), value, font=font, fill=colour, anchor='ls')
+        x += draw.textlength(value, font=font)
+
+    if levelup:
+        draw.text((378, 163), 'Level Up!', font=get_font('bold_italic', 26), fill='#F5C400', anchor='lm')
+
+    draw.text((378, 212), experience, font=regular, fill='#FFFFFF', anchor='lm')
+    draw.text((378 + draw.textlength(experience + ' ', font=regular), 212), f'/ {exp_to_level} Experience', font=regular, fill='#D5D5D5', anchor='lm')
+
+    shadow = Image.new('RGBA', CARD_SIZE, (0, 0, 0, 0))
+    shadow.putalpha(text.getchannel('A').point(lambda alpha: alpha // 4).filter(ImageFilter.GaussianBlur(3)))
+    card.alpha_composite(shadow.crop((0, 0, CARD_SIZE[0], CARD_SIZE[1] - 2)), (0, 2))
+    card.alpha_composite(text)
+
+    # The template's 4px rounded corners
+    corners = Image.new('RGBA', CARD_SIZE, (0, 0, 0, 0))
+    corners.paste(card, (0, 0), rounded_mask(CARD_SIZE, 4))
+
+    output = io.BytesIO()
+    corners.save(output, format='PNG', optimize=False)
+    return output.getvalue()
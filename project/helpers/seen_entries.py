@@ -0,0 +1,46 @@
+from hashlib import blake2b
+
+import struct
+
+HASH_SIZE = 8
+
+def hash_entry(entry_id: str):
+    return struct.unpack('<Q', blake2b(entry_id.encode('utf-8'), digest_size=HASH_SIZE).digest())[0]
+
+class SeenEntries:
+    """ A fixed size set of 64-bit entry id hashes, the oldest hash is
+    evicted once it is full.
+
+    Stored as the packed hashes in insertion order, so it takes 8 bytes per
+    entry no matter how long the ids are. """
+    def __init__(self, capacity: int, hashes: list=None):
+        self.capacity = capacity
+        self.__hashes = dict.fromkeys(hashes or ()) # Dicts keep insertion order, which is the eviction order
+        self.__evict()
+
+    @classmethod
+    def from_bytes(cls, capacity: int, data: bytes):
+        data = data or b''
+        return cls(capacity, [value for (value,) in struct.iter_unpack('<Q', data[:len(data) - len(data) % HASH_SIZE])])
+
+    def to_bytes(self):
+        return struct.pack(f'<{len(self.__hashes)}Q', *self.__hashes)
+
+    def __len__(self):
+        return len(self.__hashes)
+
+    def __contains__(self, entry_id: str):
+        return hash_entry(entry_id) in self.__hashes
+
+    def add(self, entry_id: str):
+        """ Add an entry id, returns whether it was not seen before """
+        value = hash_entry(entry_id)
+        if value in self.__hashes:
+            return False
+        self.__hashes[value] = None
+        self.__evict()
+        return True
+
+    def __evict(self):
+        while len(self.__hashes) > self.capacity:
+            del self.__hashes[next(iter(self.__hashes))]
@@ -1,72 +1,162 @@
 LOCALIZATION_BASE = 'https://localization.serverguard.xyz/'
+RELOAD_INTERVAL = 30
+READY_TIMEOUT = 10 # Longest a translation waits for the first load before using the key
 
 import asyncio
 import requests
 import re
+import time
 
-from threading import Timer
+from project.helpers.per_process import PerProcess
+from threading import Event, Lock, Thread
 
-languages: dict = {}
-loadedLanguages: dict = {}
-loaded = False
+PLACEHOLDER_REGEX = re.compile(r'{\s*([^{}\s]+)\s*}')
+
+class Template:
+    """ A translation string split once into literal text and placeholders """
+    __slots__ = ('parts',)
+
+    def __init__(self, text: str):
+        self.parts = [] # (literal, placeholder name, placeholder as written)
+        position = 0
+        for match in PLACEHOLDER_REGEX.finditer(text):
+            self.parts.append((text[position:match.start()], match.group(1), match.group(0)))
+            position = match.end()
+        self.parts.append((text[position:], None, ''))
+
+    def render(self, values: dict=None):
+        if len(self.parts) == 1:
+            return self.parts[0][0]
+        values = values or {}
+        # Placeholders without a value are left as written
+        return ''.join(
+            literal + (str(values[name]) if name in values else written if name is not None else '')
+            for literal, name, written in self.parts
+        )
+
+class LocaleStore:
+    """ Downloads the bot's locales and keeps them as compiled templates.
+
+    Reloads use conditional requests, so a locale that did not change is
+    neither downloaded nor parsed again. Every reload swaps in a whole new
+    table, so a translation never sees a half loaded set of locales. """
+    def __init__(self):
+        self.languages: dict = {}
+        self.__available: dict = {} # Every language in languages.json, including ones whose file is missing
+        self.locales: dict[str, dict[str, Template]] = {}
+        self.ready = Event() # Set once the first load was tried, whether it worked or not
+        self.__waiters: list[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = []
+        self.__validators: dict[str, tuple] = {} # url -> (ETag, Last-Modified) of the copy that is loaded
+        self.__session: requests.Session = None
+        self.__lock = Lock()
+        self.__thread = PerProcess(self.__start)
+
+    def start(self):
+        self.__thread.get()
+
+    def __start(self):
+        self.__session = requests.Session() # Pooled connections must not be shared with the parent
+        thread = Thread(target=self.__run, name='translator', daemon=True)
+        thread.start()
+        return thread
+
+    async def wait_ready(self):
+        """ Wait for the first load, returns whether it was tried within READY_TIMEOUT """
+        self.start()
+        if self.ready.is_set():
+            return True
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.__lock:
+            if self.ready.is_set():
+                return True
+            self.__waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), READY_TIMEOUT)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self.__lock:
+                if waiter in self.__waiters:
+                    self.__waiters.remove(waiter)
+
+    def __set_ready(self):
+        with self.__lock:
+            self.ready.set()
+            waiters, self.__waiters = self.__waiters, []
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass # The loop was closed while it waited
+
+    def __fetch(self, url: str):
+        """ Get the JSON at url, or None if it did not change since it was last loaded """
+        headers = {}
+        etag, last_modified = self.__validators.get(url, (None, None))
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        req = self.__session.get(url, headers=headers, timeout=30)
+        if req.status_code == 304:
+            return None
+        req.raise_for_status()
+        data = req.json()
+        self.__validators[url] = (req.headers.get('ETag'), req.headers.get('Last-Modified'))
+        return data
+
+    def load(self):
+        available = self.__fetch(LOCALIZATION_BASE + 'languages.json')
+        if available is not None:
+            self.__available = available
+        realLangs = dict(self.__available)
+
+        locales = {}
+        for locale in [key for key in realLangs.keys()]:
+            url = LOCALIZATION_BASE + f'/bot/{locale}.json'
+            cached = self.locales.get(locale)
+            if cached is None:
+                self.__validators.pop(url, None) # Nothing to fall back on, so it must be downloaded in full
+            try:
+                strings = self.__fetch(url)
+            except Exception as e:
+                print(f'WARNING: bot/{locale}.json could not be loaded, will remove from list, "{str(e)}"')
+                self.__validators.pop(url, None)
+                del realLangs[locale]
+                continue
+            if strings is None:
+                locales[locale] = cached
+            else:
+                locales[locale] = {key: Template(value) for key, value in strings.items() if isinstance(value, str)}
+
+        # Only replace the language table once we know this is finalized to prevent unexpected scenarios
+        self.languages, self.locales = realLangs, locales
+
+    def __run(self):
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                print(f'WARNING: failed to load the translations, "{str(e)}"')
+            self.__set_ready()
+            time.sleep(RELOAD_INTERVAL)
+
+store = LocaleStore()
+store.start()
 
 async def translate(locale: str, key: str, values: dict=None):
-    global loaded
-    while not loaded:
-        await asyncio.sleep(.1)
-    global languages
-    global loadedLanguages
-    lang = loadedLanguages.get(locale, loadedLanguages.get('en', {}))
-    translation = lang.get(key, loadedLanguages.get('en', {}).get(key))
-    if translation:
-        res = translation
-        if values:
-            for index in values.keys():
-                item = values[index]
-                res = re.sub(rf'{{\s*{index}\s*}}', item, res)
-        return res
+    await store.wait_ready()
+    locales = store.locales
+    if len(locales) == 0:
+        return key # Nothing could be loaded (yet), the key still tells what the message is about
+    lang = locales.get(locale, locales.get('en', {}))
+    translation = lang.get(key, locales.get('en', {}).get(key))
+    if translation is not None:
+        return translation.render(values)
     else:
         raise Exception(f'The key "{key}" does not exist in locale "{locale}" or the "en" locale')
 
 async def getLanguages():
-    global loaded
-    while not loaded:
-        await asyncio.sleep(.1)
-    global languages
-    return languages
-
-def loadLanguages():
-    global loaded
-    global languages
-    global loadedLanguages
-    lang_req = requests.get(LOCALIZATION_BASE + 'languages.json')
-
-    if lang_req.status_code == 200:
-        try:
-            realLangs = lang_req.json()
-        except Exception as e:
-            print(f'WARNING: languages.json file contains invalid JSON, "{str(e)}"')
-    
-    for locale in [key for key in realLangs.keys()]:
-        req = requests.get(LOCALIZATION_BASE + f'/bot/{locale}.json')
-        if req.status_code == 200:
-            try:
-                loadedLanguages[locale] = req.json()
-            except Exception as e:
-                print(f'WARNING: bot/{locale}.json file contains invalid JSON, "{str(e)}"')
-        else:
-            print(f'WARNING: bot/{locale}.json file missing, will remove from list')
-            del realLangs[locale]
-    languages = realLangs # Only replace the language table once we know this is finalized to prevent unexpected scenarios
-    loaded = True
-
-def reloadLangs():
-    global timer
-    loadLanguages()
-    timer = Timer(30, reloadLangs)
-    timer.start()
-
-loadLanguages()
-
-timer = Timer(30, reloadLangs)
-timer.start()
\ No newline at end of file
+    await store.wait_ready()
+    return store.languages
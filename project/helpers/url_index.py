@@ -0,0 +1,53 @@
+from urllib.parse import urlsplit
+
+import re
+
+URL_HOST_REGEX = re.compile(r'[a-zA-Z][a-zA-Z0-9+.-]*://([^/\s:?#]+)')
+
+def get_host(url: str):
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except ValueError:
+        return ''
+
+class UrlIndex:
+    """ Malicious URLs grouped by host.
+
+    A message can only contain one of the URLs if it also contains its host, so
+    lookups only compare against the URLs of the hosts actually linked in the
+    message instead of scanning the whole database. """
+    def __init__(self, urls: dict=None):
+        self.__hosts: dict[str, list[tuple[str, str]]] = {}
+        self.__size = 0
+
+        for url, threat in (urls or {}).items():
+            self.__hosts.setdefault(get_host(url), []).append((url, threat))
+            self.__size += 1
+
+    def __len__(self):
+        return self.__size
+
+    def search(self, content: str):
+        """ Get the first (url, threat) found in content, or None """
+        hosts = set(host.lower() for host in URL_HOST_REGEX.findall(content))
+        hosts.add('') # Entries whose host could not be parsed are always checked
+        for host in hosts:
+            for url, threat in self.__hosts.get(host, ()):
+                if url in content:
+                    return url, threat
+        return None
+
+class UrlDatabase:
+    """ Holds the current UrlIndex, reloads build a new index and swap it in
+    whole so lookups never see a partially loaded database. """
+    def __init__(self):
+        self.index = UrlIndex()
+
+    def __len__(self):
+        return len(self.index)
+
+    def replace(self, urls: dict):
+        self.index = UrlIndex(urls)
+
+    def search(self, content: str):
+        return self.index.search(content)
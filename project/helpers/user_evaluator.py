@@ -3,42 +3,63 @@ from dateutil import parser
 from json import JSONDecoder
 from project import bot_config
 from project.helpers.images import *
+from project.helpers.Cache import Cache
+from project.helpers.guilded_client import get_client, get_session
+from project.helpers.io_loop import on_io_loop
 from guilded import Embed
 from humanfriendly import format_timespan
-import requests, guilded
+import aiohttp, asyncio, guilded
 
 decoder = JSONDecoder()
 
 ACCOUNT_AGE_THRESHOLD = 60 * 60 * 24 * 7
+PROVIDER_TIMEOUT = 5
+
+# Kept as constants so the lookups can be pointed at stand-in servers
+ROBLOX_API = 'https://users.roblox.com'
+STEAM_API = 'http://api.steampowered.com'
+YOUTUBE_API = 'https://www.googleapis.com'
+TWITTER_API = 'https://api.twitter.com'
+
+score_cache = Cache(60 * 60 * 6, name='social_scores') # (provider, service id) -> score, accounts change slowly
+
+def get_using_vpn(guild_id: str, user_id: str):
+    """ Read the member's stored VPN flag straight from the database. Runs in its own
+    app context, as evaluations happen both on the bot and inside Flask requests """
+    from project import app
+    from project.server.models import GuildUser
+
+    with app.app_context():
+        db_user: GuildUser = GuildUser.query.filter_by(guild_id = guild_id, user_id = user_id).first()
+        return db_user is not None and db_user.using_vpn or False
 
 async def evaluate_user(guild_id: str, user_id: str, connections: str):
     socials: dict = decoder.decode(connections)
-    user_req = requests.get(f'https://www.guilded.gg/api/v1/servers/{guild_id}/members/{user_id}', headers={
-        'Authorization': f'Bearer {bot_config.GUILDED_BOT_TOKEN}'
-    })
 
-    if not user_req.status_code == 200:
-        raise Exception
-    
-    user = user_req.json().get('member')
-
-    db_user_req = requests.get(f'http://localhost:5000/getguilduser/{guild_id}/{user_id}', headers={
-        'authorization': bot_config.SECRET_KEY
-    })
-    if db_user_req.status_code == 200:
-        db_user = db_user_req.json()
-    else:
-        db_user = None
+    # The member, their stored profile and every linked account are looked up at the same time
+    member, using_vpn, roblox, steam, youtube, twitter = await asyncio.gather(
+        get_client().get_member(guild_id, user_id),
+        asyncio.to_thread(get_using_vpn, guild_id, user_id),
+        eval_roblox(socials.get('roblox', {}).get('service_id') or socials.get('roblox', {}).get('serviceId')),
+        eval_steam(socials.get('steam', {}).get('service_id') or socials.get('steam', {}).get('serviceId')),
+        eval_youtube(socials.get('youtube', {}).get('handle')),
+        eval_twitter(socials.get('twitter', {}).get('handle')),
+        return_exceptions=True
+    )
+    if isinstance(member, Exception):
+        raise member
+    user = member.get('member')
+
+    if isinstance(using_vpn, Exception):
+        using_vpn = False
 
     scores = {
-        'roblox': eval_roblox(socials.get('roblox', {}).get('service_id') or socials.get('roblox', {}).get('serviceId')),
-        'steam': eval_steam(socials.get('steam', {}).get('service_id') or socials.get('steam', {}).get('serviceId')),
-        'youtube': eval_youtube(socials.get('youtube', {}).get('handle')),
-        'twitter': eval_twitter(socials.get('twitter', {}).get('handle'))
+        'roblox': roblox,
+        'steam': steam,
+        'youtube': youtube,
+        'twitter': twitter
     }
 
-    using_vpn = db_user != None and db_user.get('using_vpn') or False
-
     created_at = parser.parse(user.get('user').get('createdAt')).replace(tzinfo=None)
     age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
     age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 100)
@@ -71,6 +92,20 @@ async def evaluate_user(guild_id: str, user_id: str, connections: str):
         'Score': round((total_score / total_evaled) * 100)
     }
 
+class Evaluation:
+    """ Evaluates a user at most once for a verification attempt, however
+    many log embeds end up needing it """
+    def __init__(self, guild_id: str, user_id: str, connections: str):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.connections = connections
+        self.__result = None
+
+    async def get(self):
+        if self.__result is None:
+            self.__result = await evaluate_user(self.guild_id, self.user_id, self.connections)
+        return self.__result
+
 def generate_embed(evaluation: dict, passed_check: bool=None, fail_reason: str=""):
     em: Embed = Embed(
         title=f'{evaluation["Name"]}\'s Evaluation',
@@ -99,82 +134,86 @@ def generate_embed(evaluation: dict, passed_check: bool=None, fail_reason: str="
 
     return em
 
-def eval_roblox(id: str):
+@on_io_loop
+async def fetch_json(url: str, headers: dict=None):
+    """ Get the JSON body of url, or None if there is nothing there. Any other
+    failure, like a 429 or an outage, raises so it is not taken as an answer """
+    async with get_session().get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=PROVIDER_TIMEOUT)) as response:
+        if response.status in (400, 404):
+            return None
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+async def cached_score(provider: str, id: str, evaluate):
     if id == None:
         return None
+    key = f'{provider}/{id}'
+    cached = score_cache.get(key)
+    if cached is not None:
+        return cached[0] # Wrapped so an account without a score is still a hit
     try:
-        result = requests.get(f'https://users.roblox.com/v1/users/{id}')
+        score = await evaluate(id)
+    except Exception:
+        return None # Not cached, a timeout, rate limit or outage is retried on the next evaluation
+    score_cache.set(key, (score,)) # None here means the provider has no such account
+    return score
 
-        if result.status_code == 200:
-            contents = result.json()
-            if contents['isBanned'] == True:
-                return 95
+async def eval_roblox(id: str):
+    return await cached_score('roblox', id, score_roblox)
 
-            created_at = parser.parse(contents['created']).replace(tzinfo=None)
-            age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
-            age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 100)
+async def eval_steam(id: int):
+    return await cached_score('steam', id, score_steam)
 
-            return max(age_score - (contents['hasVerifiedBadge'] and 15 or 0), 0)
-        else:
-            return None
-    except:
-        return None
+async def eval_youtube(id: str):
+    return await cached_score('youtube', id, score_youtube)
 
-def eval_steam(id: int):
-    if id == None:
+async def eval_twitter(id: str):
+    return await cached_score('twitter', id, score_twitter)
+
+async def score_roblox(id: str):
+    contents = await fetch_json(f'{ROBLOX_API}/v1/users/{id}')
+    if contents is None:
         return None
-    try:
-        result = requests.get(f'http://api.steampowered.com/IPlayerService/GetSteamLevel/v1/?key={bot_config.STEAM_KEY}&steamid={id}')
+    if contents['isBanned'] == True:
+        return 95
 
-        if result.status_code == 200:
-            contents = result.json()
+    created_at = parser.parse(contents['created']).replace(tzinfo=None)
+    age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
+    age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 100)
 
-            return min((max(10 - contents['response'].get('player_level', 0), 0) / 10) * 100, 100)
-        else:
-            return None
-    except:
-        return None
+    return max(age_score - (contents['hasVerifiedBadge'] and 15 or 0), 0)
 
-def eval_youtube(id: str):
-    if id == None:
+async def score_steam(id: int):
+    contents = await fetch_json(f'{STEAM_API}/IPlayerService/GetSteamLevel/v1/?key={bot_config.STEAM_KEY}&steamid={id}')
+    if contents is None:
         return None
-    try:
-        result = requests.get(f'https://www.googleapis.com/youtube/v3/channels?part=snippet&id={id}&key={bot_config.YOUTUBE_KEY}')
 
-        if result.status_code == 200:
-            contents = result.json()
+    return min((max(10 - contents['response'].get('player_level', 0), 0) / 10) * 100, 100)
 
-            created_at = parser.parse(contents['items'][0]['snippet']['publishedAt']).replace(tzinfo=None)
-            age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
-            age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 100)
-
-            return max(age_score, 0)
-        else:
-            return None
-    except:
+async def score_youtube(id: str):
+    contents = await fetch_json(f'{YOUTUBE_API}/youtube/v3/channels?part=snippet&id={id}&key={bot_config.YOUTUBE_KEY}')
+    if contents is None or len(contents.get('items') or []) == 0:
         return None
 
-def eval_twitter(id: str):
-    if id == None:
-        return None
-    try:
-        result = requests.get(f'https://api.twitter.com/2/users/by/username/{id}?user.fields=created_at,verified,public_metrics', headers={
-            'Authorization': f'Bearer {bot_config.TWITTER_BEARER}'
-        })
+    created_at = parser.parse(contents['items'][0]['snippet']['publishedAt']).replace(tzinfo=None)
+    age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
+    age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 100)
+
+    return max(age_score, 0)
 
-        if result.status_code == 200:
-            contents = result.json()
+async def score_twitter(id: str):
+    contents = await fetch_json(f'{TWITTER_API}/2/users/by/username/{id}?user.fields=created_at,verified,public_metrics', headers={
+        'Authorization': f'Bearer {bot_config.TWITTER_BEARER}'
+    })
+    if contents is None or 'data' not in contents:
+        return None # Unknown handles still answer with a 200, with only errors
 
-            if contents['data']['verified']:
-                return 0
+    if contents['data']['verified']:
+        return 0
 
-            created_at = parser.parse(contents['data']['created_at']).replace(tzinfo=None)
-            age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
-            age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 70)
-            tweets_score = round(1 - (contents['data']['public_metrics']['tweet_count']/15) * 30)
+    created_at = parser.parse(contents['data']['created_at']).replace(tzinfo=None)
+    age = (datetime.now().replace(tzinfo=None) - created_at).total_seconds()
+    age_score = round((1 - (abs(min(age, ACCOUNT_AGE_THRESHOLD)) / ACCOUNT_AGE_THRESHOLD)) * 70)
+    tweets_score = round(1 - (contents['data']['public_metrics']['tweet_count']/15) * 30)
 
-            return max(age_score + tweets_score, 0)
-        else:
-            return None
-    except:
-        return None
+    return max(age_score + tweets_score, 0)
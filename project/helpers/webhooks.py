@@ -1,13 +1,247 @@
-from json import JSONDecoder, JSONEncoder
-from project import BotAPI, db
+from collections import deque
+from project import db
+from project.helpers.Cache import Cache
+from project.helpers.guilded_client import get_client
+from project.helpers.io_loop import on_io_loop
 from project.server.models import Guild
-from guilded import Webhook, NotFound
+from guilded import Webhook, NotFound, HTTPException
+
+import asyncio
+import concurrent.futures
+import time
+
+WEBHOOK_BATCH_SIZE = 10 # Most embeds Guilded accepts in one message
+WEBHOOK_SEND_INTERVAL = 0.25 # Least time between two sends to the same channel
+WEBHOOK_CONCURRENCY = 8 # Most sends in flight at once per dispatcher
+WEBHOOK_RETRIES = 3
+
+webhook_cache = Cache(60 * 60, name='webhooks') # channel_id -> webhook data
+# channel_id -> webhook data being looked up or created, shared by callers on any loop
+webhook_lookups: dict[str, concurrent.futures.Future] = {}
+
+class QueuedMessage:
+    def __init__(self, webhook: dict, args: tuple, kwargs: dict, future: asyncio.Future):
+        self.webhook = webhook
+        self.args = args
+        self.kwargs = kwargs
+        self.future = future
+        self.queued_at = time.monotonic()
+
+        embeds = kwargs.get('embeds')
+        if embeds is None and kwargs.get('embed') is not None:
+            embeds = [kwargs['embed']]
+        self.embeds = embeds or []
+        # Only plain embed messages can be merged into one send
+        self.batchable = len(args) == 0 and all(key in ('embed', 'embeds', 'username', 'avatar_url') for key in kwargs)
+
+    def can_merge(self, other: 'QueuedMessage', embeds: int):
+        return self.batchable and other.batchable \
+            and self.webhook['id'] == other.webhook['id'] \
+            and self.kwargs.get('username') == other.kwargs.get('username') \
+            and self.kwargs.get('avatar_url') == other.kwargs.get('avatar_url') \
+            and embeds + len(other.embeds) <= WEBHOOK_BATCH_SIZE
+
+class WebhookDispatcher:
+    """ Sends the process's webhook messages from the IO loop through the shared Guilded client.
+
+    Every channel has its own queue that is drained by a single task, so
+    sends to a channel are spaced out and retried when rate limited, and
+    queued embed messages are merged into sends of up to 10 embeds. It never
+    touches the database, post_webhook looks the webhooks up for it. """
+    def __init__(self):
+        self.api = get_client()
+        self.__queues: dict[str, deque[QueuedMessage]] = {}
+        self.__workers: dict[str, asyncio.Task] = {}
+        self.__webhooks: dict[str, Webhook] = {} # webhook id -> Webhook
+        self.__semaphore = asyncio.Semaphore(WEBHOOK_CONCURRENCY)
+
+        self.messages = 0
+        self.sends = 0
+        self.failures = 0
+        self.rate_limited = 0
+        self.send_time = 0.0
+        self.max_send_time = 0.0
+        self.wait_time = 0.0
+
+    async def send(self, webhook: dict, channel_id: str, *args, **kwargs):
+        future = asyncio.get_running_loop().create_future()
+        self.__queues.setdefault(channel_id, deque()).append(QueuedMessage(webhook, args, kwargs, future))
+        self.messages += 1
+        if channel_id not in self.__workers:
+            self.__workers[channel_id] = asyncio.create_task(self.__run(channel_id))
+        return await future
+
+    async def flush(self):
+        """ Wait until every queued message was sent """
+        while len(self.__workers) > 0:
+            await asyncio.gather(*self.__workers.values(), return_exceptions=True)
+
+    async def __run(self, channel_id: str):
+        queue = self.__queues[channel_id]
+        try:
+            while len(queue) > 0:
+                batch = [queue.popleft()]
+                embeds = len(batch[0].embeds)
+                while len(queue) > 0 and batch[0].can_merge(queue[0], embeds):
+                    embeds += len(queue[0].embeds)
+                    batch.append(queue.popleft())
+
+                started = time.monotonic()
+                try:
+                    result = await self.__send(channel_id, batch)
+                except Exception as e:
+                    self.failures += 1
+                    for message in batch:
+                        if not message.future.done():
+                            message.future.set_exception(e)
+                else:
+                    for message in batch:
+                        if not message.future.done():
+                            message.future.set_result(result)
+                for message in batch:
+                    self.wait_time += started - message.queued_at
+
+                if len(queue) > 0:
+                    await asyncio.sleep(WEBHOOK_SEND_INTERVAL)
+        finally:
+            del self.__workers[channel_id]
+            del self.__queues[channel_id]
+
+    async def __send(self, channel_id: str, batch: list[QueuedMessage]):
+        first = batch[0]
+        if len(batch) > 1:
+            args = ()
+            kwargs = {key: value for key, value in first.kwargs.items() if key not in ('embed', 'embeds')}
+            kwargs['embeds'] = [embed for message in batch for embed in message.embeds]
+        else:
+            args, kwargs = first.args, first.kwargs
+
+        webhook = self.__webhooks.get(first.webhook['id'])
+        if webhook is None:
+            webhook = Webhook(state=self.api, data=first.webhook, session=self.api.session)
+            self.__webhooks[webhook.id] = webhook
+
+        attempt = 0
+        while True:
+            started = time.monotonic()
+            try:
+                async with self.__semaphore:
+                    return await webhook.send(*args, **kwargs)
+            except NotFound:
+                # The webhook was deleted, post_webhook replaces it and queues the message again
+                self.__webhooks.pop(webhook.id, None)
+                raise
+            except HTTPException as e:
+                if e.status != 429 or attempt >= WEBHOOK_RETRIES:
+                    raise
+                self.rate_limited += 1
+                retry_after = e.response is not None and e.response.headers.get('Retry-After')
+                await asyncio.sleep(float(retry_after or 2 ** attempt))
+            finally:
+                elapsed = time.monotonic() - started
+                self.sends += 1
+                self.send_time += elapsed
+                self.max_send_time = max(self.max_send_time, elapsed)
+            attempt += 1
+
+    def stats(self):
+        return {
+            'queued': sum(len(queue) for queue in self.__queues.values()),
+            'channels': len(self.__queues),
+            'messages': self.messages,
+            'sends': self.sends,
+            'failures': self.failures,
+            'rate_limited': self.rate_limited,
+            'average_send_seconds': self.sends and round(self.send_time / self.sends, 4) or 0,
+            'max_send_seconds': round(self.max_send_time, 4),
+            'average_wait_seconds': self.messages and round(self.wait_time / self.messages, 4) or 0,
+        }
+
+dispatcher: WebhookDispatcher = None
+dispatcher_loop: asyncio.AbstractEventLoop = None
+
+def get_dispatcher():
+    """ Get the dispatcher of the IO loop, creating it if needed """
+    global dispatcher, dispatcher_loop
+    loop = asyncio.get_running_loop()
+    # A dispatcher made before a fork belongs to the parent's loop
+    if dispatcher is None or dispatcher_loop is not loop:
+        dispatcher_loop = loop
+        dispatcher = WebhookDispatcher()
+    return dispatcher
+
+def get_webhook_stats():
+    return dispatcher is not None and [dispatcher.stats()] or []
+
+@on_io_loop
+async def dispatch(webhook: dict, channel_id: str, args: tuple, kwargs: dict):
+    return await get_dispatcher().send(webhook, channel_id, *args, **kwargs)
+
+async def get_webhook(guild_id: str, channel_id: str):
+    """ Get the data of the channel's webhook, creating the webhook if there is none.
+
+    Returns the data and, if a webhook was created, the Guild whose config
+    now stores it. It is not committed, that is up to the caller. """
+    data = webhook_cache.get(channel_id)
+    if data is not None:
+        return data, None
+
+    # Concurrent sends to a new channel wait for the first one's webhook instead of each creating one
+    lookup = webhook_lookups.get(channel_id)
+    if lookup is not None:
+        return await asyncio.wrap_future(lookup), None
+    lookup = webhook_lookups[channel_id] = concurrent.futures.Future()
+
+    try:
+        guild: Guild = Guild.query.filter_by(guild_id = guild_id).first()
+        changed = None
+        if guild == None:
+            data = None
+        else:
+            if guild.config.get('__webhooks') == None:
+                guild.config['__webhooks'] = {}
+            webhooks = guild.config['__webhooks']
+            data = webhooks.get(channel_id)
+            if data == None:
+                data = (await get_client().create_webhook(
+                    server_id=guild_id,
+                    name='Server Guard Webhook',
+                    channel_id=channel_id
+                ))['webhook']
+                webhooks[channel_id] = data
+                changed = guild
+            webhook_cache.set(channel_id, data)
+        lookup.set_result(data)
+        return data, changed
+    except BaseException as e:
+        lookup.set_exception(e)
+        raise
+    finally:
+        del webhook_lookups[channel_id]
+
+def forget_webhook(guild_id: str, channel_id: str, webhook_id: str):
+    """ Drop a webhook that was deleted, returns the Guild whose config changed for the caller to commit """
+    webhook_cache.remove(channel_id)
+    guild: Guild = Guild.query.filter_by(guild_id = guild_id).first()
+    if guild == None:
+        return None
+    webhooks = guild.config.get('__webhooks', {})
+    # Another worker may already have replaced it with a working one
+    if webhooks.get(channel_id, {}).get('id') == webhook_id:
+        del webhooks[channel_id]
+        return guild
+    return None
 
 async def post_webhook(guild_id: str, channel_id: str, *args, **kwargs):
     """|coro|
 
     Sends a message or create a list item using this webhook.
 
+    Messages go through the channel's queue on the dispatcher of the IO loop,
+    plain embed messages queued together are sent as one message. Creating or
+    replacing the channel's webhook adds its guild to ``db.session``, the
+    caller commits it.
+
     .. warning::
 
         If this webhook is in a :class:`ListChannel`, this method will
@@ -71,35 +305,17 @@ async def post_webhook(guild_id: str, channel_id: str, *args, **kwargs):
         associated with this webhook.
     """
 
-    with BotAPI() as bot_api:
-        guild: Guild = Guild.query.filter_by(guild_id = guild_id).first()
-
-        if guild != None:
-            webhooks = guild.config.get('__webhooks')
-            if webhooks == None:
-                webhooks = {}
-                guild.config['__webhooks'] = webhooks
-            webhook_data = webhooks.get(channel_id)
-            if webhook_data == None:
-                data: dict = (await bot_api.create_webhook(
-                    server_id=guild_id,
-                    name='Server Guard Webhook',
-                    channel_id=channel_id
-                ))['webhook']
-                webhook = Webhook(state=bot_api, data=data, session=bot_api.session)
-                webhook_data = data
-                webhooks[channel_id] = data
-                db.session.add(guild)
-                db.session.commit()
-            else:
-                webhook = Webhook(state=bot_api, data=webhook_data, session=bot_api.session)
-            try:
-                return await webhook.send(*args, **kwargs)
-            except NotFound:
-                # Fallback to deleting the webhook data and retrying this function in order to recreate the webhook
-                del webhooks[channel_id]
-                db.session.add(guild)
-                db.session.commit()
-                return await post_webhook(guild_id, channel_id, *args, **kwargs)
-            except Exception:
-                raise Exception
\ No newline at end of file
+    for _ in range(2):
+        webhook, changed = await get_webhook(guild_id, channel_id)
+        if changed is not None:
+            db.session.add(changed)
+        if webhook is None:
+            return None
+        try:
+            return await dispatch(webhook, channel_id, args, kwargs)
+        except NotFound:
+            # Deleted in Guilded, forget it so the next attempt makes a new one
+            changed = forget_webhook(guild_id, channel_id, webhook['id'])
+            if changed is not None:
+                db.session.add(changed)
+    raise Exception(f'Could not send to the webhook of channel {channel_id}')
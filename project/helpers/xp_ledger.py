@@ -0,0 +1,103 @@
+from guilded import http, HTTPException
+from project.helpers.Cache import Cache
+from project.helpers import localapi
+from project.helpers.guilded_client import get_client
+
+import asyncio
+import time
+
+FLUSH_INTERVAL = 30
+SYNC_INTERVAL = 60 * 15
+FLUSH_CONCURRENCY = 8
+
+class XpLedger:
+    """ Collects the XP users earn and hands it to Guilded and the database in batches.
+
+    Messages only add to a per-(guild, user) delta, a timer awards every
+    delta at once and stores the totals Guilded returns with one request to
+    the API. The totals are kept, so level ups are found by comparing them
+    instead of asking Guilded and the database on every message. Members who
+    are not earning anything are still synced every SYNC_INTERVAL, as XP can
+    also be given by Guilded or other bots. """
+    def __init__(self):
+        self.__pending: dict[tuple[str, str], list] = {} # (guild_id, user_id) -> [amount, latest message]
+        self.__totals = Cache(60 * 60 * 6, max_size=100000, name='xp_totals') # 'guild_id/user_id' -> [total xp, synced at]
+        self.__listeners = []
+
+    def on_level_up(self, callback):
+        """ Call callback(guild_id, user_id, level, message) when a flush finds a level up """
+        self.__listeners.append(callback)
+        return callback
+
+    def add(self, guild_id: str, user_id: str, amount: int, message=None):
+        """ Queue amount XP for a member, adding 0 only asks for a sync if one is due """
+        key = (guild_id, user_id)
+        if amount == 0 and key not in self.__pending:
+            known = self.__totals.get(f'{guild_id}/{user_id}')
+            if known is not None and time.time() - known[1] < SYNC_INTERVAL:
+                return
+        entry = self.__pending.setdefault(key, [0, None])
+        entry[0] += amount
+        entry[1] = message or entry[1]
+
+    async def __award(self, semaphore: asyncio.Semaphore, guild_id: str, user_id: str, amount: int):
+        # Guilded can't report a member's XP, but returns the total after awarding, even 0
+        async with semaphore:
+            data = await get_client().request(http.Route('POST', f'/servers/{guild_id}/members/{user_id}/xp'), json={
+                'amount': amount
+            })
+        return data['total']
+
+    async def flush(self):
+        from project.server.api.guilds import getLevel
+
+        pending, self.__pending = self.__pending, {}
+        if len(pending) == 0:
+            return
+
+        semaphore = asyncio.Semaphore(FLUSH_CONCURRENCY)
+        keys = list(pending.keys())
+        results = await asyncio.gather(*[self.__award(semaphore, guild_id, user_id, pending[(guild_id, user_id)][0]) for guild_id, user_id in keys], return_exceptions=True)
+
+        now = time.time()
+        totals = {}
+        for key, result in zip(keys, results):
+            amount, message = pending[key]
+            if isinstance(result, Exception):
+                if amount != 0 and not (isinstance(result, HTTPException) and result.status < 500):
+                    self.add(key[0], key[1], amount, message) # Try again on the next flush
+                print(f'Failed to award {amount} xp to {key[1]} in {key[0]}: {result}')
+                continue
+            totals[key] = result
+
+        if len(totals) == 0:
+            return
+        req = await localapi.patch('/guildusers/xp', json={
+            'users': [{'guild_id': guild_id, 'user_id': user_id, 'xp': xp} for (guild_id, user_id), xp in totals.items()]
+        })
+        previous: dict = req.ok and req.json().get('previous', {}) or {}
+
+        for (guild_id, user_id), xp in totals.items():
+            id = f'{guild_id}/{user_id}'
+            known = self.__totals.get(id)
+            self.__totals.set(id, [xp, now])
+            before = known[0] if known is not None else previous.get(id)
+            if before is None:
+                continue # New to the database, there is nothing to compare with
+            level = getLevel(xp)
+            if level > getLevel(before):
+                for callback in self.__listeners:
+                    try:
+                        await callback(guild_id, user_id, level, pending[(guild_id, user_id)][1])
+                    except Exception as e:
+                        print(f'Failed to handle level up of {user_id} in {guild_id}: {e}')
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(FLUSH_INTERVAL)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f'Failed to flush xp: {e}')
+
+xp_ledger = XpLedger()
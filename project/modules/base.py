@@ -1,19 +1,52 @@
-import os
 from guilded import Server, Member, User, http
 from guilded.ext import commands
 from guilded.ext.commands import Context, CommandError
 from project.helpers.Cache import Cache
 from project.helpers.embeds import *
+from project.helpers import localapi
+from project.helpers.config_bus import config_bus
+from project.helpers.guilded_client import get_client
 
-import requests
+import asyncio
 import re
 
-guild_data_cache = Cache(60)
+guild_data_cache = Cache(60 * 60, name='guild_data') # Dropped as soon as the config changes, see config_bus
+config_bus.subscribe(guild_data_cache.remove)
 
 MEMBER_REGEX = r'<@(.+)>'
 ROLE_REGEX = r'<@&(.+)>'
 CHANNEL_REGEX = r'<#(.+)>'
 
+class MessageContext:
+    """ Lookups shared by every message listener handling the same message.
+
+    Each lookup is only made once per message, listeners that ask for a key
+    while it is still being fetched wait on the same request instead of
+    starting their own. """
+    def __init__(self, server_id: str, author_id: str):
+        self.server_id = server_id
+        self.author_id = author_id
+        self.__lookups: dict[tuple, asyncio.Task] = {}
+
+    def memoize(self, key: tuple, loader):
+        """ Get the pending or finished lookup for key, calling loader to start it if needed """
+        task = self.__lookups.get(key)
+        if task is None:
+            task = asyncio.ensure_future(loader())
+            self.__lookups[key] = task
+        return task
+
+    async def get_user_info(self):
+        async def load():
+            user_data_req = await localapi.get(f'/userinfo/{self.server_id}/{self.author_id}')
+            if user_data_req.status_code == 200:
+                return user_data_req.json()
+            return {}
+        return await self.memoize(('userinfo',), load)
+
+    async def get_language(self):
+        return (await self.get_user_info()).get('language', 'en')
+
 class Module:
     bot: commands.Bot
     name = None
@@ -22,31 +55,26 @@ class Module:
     def __init__(self, bot: commands.Bot):
         self.bot = bot
 
-        self.bot_api = http.HTTPClient()
-        self.bot_api.token = os.getenv('BOT_KEY')
+        self.bot_api = get_client()
     
     async def _update_guild_data(self, guild_id: str):
-        from project import bot_config
         server = await self.bot.getch_server(guild_id)
         if server.member_count == 0:
             # Only call fill members if the member count is 0
             await server.fill_members()
 
-        guild_data_req = requests.patch(f'http://localhost:5000/guilddata/{guild_id}', headers={
-            'authorization': bot_config.SECRET_KEY
-        }, json={
+        guild_data_req = await localapi.patch(f'/guilddata/{guild_id}', json={
             'name': server.name,
             'bio': server.about,
             'avatar': server.avatar is not None and server.avatar.aws_url or IMAGE_DEFAULT_AVATAR,
             'members': server.member_count
         })
     
-    async def get_user_permission_level(self, guild_id: str, user_id: str):
-        from project import bot_config
+    async def get_user_permission_level(self, guild_id: str, user_id: str, context: MessageContext=None):
+        if context is not None:
+            return await context.memoize(('permission_level', guild_id, user_id), lambda: self.get_user_permission_level(guild_id, user_id))
 
-        user_data_req = requests.get(f'http://localhost:5000/getguilduser/{guild_id}/{user_id}', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
+        user_data_req = await localapi.get(f'/getguilduser/{guild_id}/{user_id}')
 
         update_data = False
         if user_data_req.status_code == 200:
@@ -66,9 +94,7 @@ class Module:
                 permission_level = 3
             else:
                 _lvl = 0
-                role_config_req = requests.get(f'http://localhost:5000/guilddata/{guild_id}/cfg/roles', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                role_config_req = await localapi.get(f'/guilddata/{guild_id}/cfg/roles')
                 role_config_json: dict = role_config_req.json()
                 if role_config_req.status_code == 200:
                     role_set: list[dict] = role_config_json['result']
@@ -82,26 +108,25 @@ class Module:
                         except Exception as e:
                             pass
                 permission_level = _lvl
-            user_data_set_req = requests.patch(f'http://localhost:5000/getguilduser/{guild_id}/{user_id}', json={
+            user_data_set_req = await localapi.patch(f'/getguilduser/{guild_id}/{user_id}', json={
                 'permission_level': permission_level
-                }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
         return permission_level
 
 
-    def get_guild_data(self, guild_id: str):
-        from project import bot_config
+    async def get_guild_data(self, guild_id: str, context: MessageContext=None):
+        if context is not None:
+            return await context.memoize(('guilddata', guild_id), lambda: self.get_guild_data(guild_id))
+
         cached = guild_data_cache.get(guild_id)
 
         if cached:
             return cached
         else:
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{guild_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{guild_id}')
             cached: dict = guild_data_req.json()
-            guild_data_cache.set(guild_id, cached)
+            if config_bus.is_current(guild_id, cached.get('config_version')):
+                guild_data_cache.set(guild_id, cached)
             return cached
 
     async def get_ctx_members(self, ctx: commands.Context):
@@ -196,10 +221,7 @@ class Module:
             if role.permissions.manage_server_xp: return True
 
     async def get_user_premium_status(self, user_id):
-        from project import bot_config
-        user_data_req = requests.get(f'http://localhost:5000/userinfo/aE9Zg6Kj/{user_id}', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
+        user_data_req = await localapi.get(f'/userinfo/aE9Zg6Kj/{user_id}')
 
         return int(user_data_req.json().get('premium'))
 
@@ -223,18 +245,18 @@ class Module:
     async def get_member_from_user(self, guild: Server, user: User):
         return await guild.getch_member(user.id)
     
-    async def is_trusted(self, user: Member):
+    async def is_trusted(self, user: Member, context: MessageContext=None):
+        if context is not None:
+            return await context.memoize(('trusted', user.server.id, user.id), lambda: self.is_trusted(user))
+
         # TODO: Move this into the db so that it does not use unnecessary API calls
-        from project import bot_config
         guild = await self.bot.getch_server(user.server.id)
         if user.id == guild.owner.id:
             return True # We know the owner of the guild is trusted, bypass any unnecessary calls and checks
         if await self.user_can_manage_server(user):
             return True
         
-        role_config_req = requests.get(f'http://localhost:5000/guilddata/{user.guild.id}/cfg/trusted_roles', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
+        role_config_req = await localapi.get(f'/guilddata/{user.guild.id}/cfg/trusted_roles')
         role_config_json: dict = role_config_req.json()
         if role_config_req.status_code == 200:
             role_set: list[dict] = role_config_json['result']
@@ -248,13 +270,13 @@ class Module:
 
         return False
 
-    async def is_moderator(self, user: Member):
-        permission_level = await self.get_user_permission_level(user.server.id, user.id)
+    async def is_moderator(self, user: Member, context: MessageContext=None):
+        permission_level = await self.get_user_permission_level(user.server.id, user.id, context)
 
         return permission_level > 0
     
-    async def is_admin(self, user: Member):
-        permission_level = await self.get_user_permission_level(user.server.id, user.id)
+    async def is_admin(self, user: Member, context: MessageContext=None):
+        permission_level = await self.get_user_permission_level(user.server.id, user.id, context)
 
         return permission_level > 1
     
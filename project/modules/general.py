@@ -1,11 +1,12 @@
 from json import JSONEncoder
 from pydoc import describe
-from project.modules.base import Module
+from project.modules.base import Module, MessageContext
 from project.modules.moderation import reset_filter_cache
 from project.helpers.embeds import *
 from project.helpers.Cache import Cache
-from project.server.api.guilds import getLevel
-from project import BotAPI, bot_config
+from project.helpers import localapi
+from project.helpers.xp_ledger import xp_ledger
+from project import BotAPI
 from guilded.ext import commands
 from guilded.ext.commands.help import HelpCommand, Paginator
 from guilded import Embed, BulkMemberRolesUpdateEvent, MessageReactionAddEvent, BotAddEvent, BotRemoveEvent, ChatMessage, Emote, \
@@ -14,13 +15,11 @@ from guilded import Embed, BulkMemberRolesUpdateEvent, MessageReactionAddEvent,
 from datetime import datetime
 from humanfriendly import format_timespan, parse_timespan
 from project.helpers.translator import getLanguages, translate
-from pyppeteer import launch
 
 import guilded.http as http
 
 import os
 import re
-import requests
 import itertools
 
 LOGIN_CHANNEL_ID = '1f6fae7f-6cdf-403d-80b9-623a76f8b621'
@@ -31,9 +30,10 @@ member = commands.MemberConverter()
 channel = commands.ChatChannelConverter()
 role = commands.RoleConverter()
 
-xp_cache = Cache(60)
-login_cache = Cache(60)
-xp_update_cache = Cache(30)
+xp_cache = Cache(60, name='xp')
+login_cache = Cache(60, name='login')
+xp_roles_cache = Cache(60 * 10, name='xp_roles')
+active_cache = Cache(60 * 60, name='guild_active')
 
 class CustomHelpCommand(HelpCommand):
     def __init__(self, **options):
@@ -249,9 +249,7 @@ class GeneralModule(Module):
     async def scan_auto_roles(self, member: Member, user_join: bool=False):
         bot = self.bot
 
-        autoroles_req = requests.get(f'http://localhost:5000/autoroles/{member.server_id}', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
+        autoroles_req = await localapi.get(f'/autoroles/{member.server_id}')
         if autoroles_req.ok:
             to_add, to_remove = [], []
             print(f'Role ids for member {member.id} on server {member.server_id}:\n{member._role_ids}\n')
@@ -340,28 +338,18 @@ class GeneralModule(Module):
                 uptime = abs(datetime.now().timestamp() - start_time)
 
                 # Make sure we have data for the current hour
-                requests.post(f'http://localhost:5000/analytics/servers', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                await localapi.post(f'/analytics/servers')
 
-                result_server_count = requests.get(f'http://localhost:5000/analytics/servers', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
-                result_largest_servers = requests.get(f'http://localhost:5000/analytics/servers/largest', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
-                result_unindexed_servers = requests.get(f'http://localhost:5000/analytics/servers/unindexed', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                result_server_count = await localapi.get(f'/analytics/servers')
+                result_largest_servers = await localapi.get(f'/analytics/servers/largest')
+                result_unindexed_servers = await localapi.get(f'/analytics/servers/unindexed')
 
                 for id in result_unindexed_servers.json():
                     try:
                         await self._update_guild_data(id)
                     except:
-                        result = requests.patch(f'http://localhost:5000/guilddata/{id}', json={
+                        result = await localapi.patch(f'/guilddata/{id}', json={
                             'active': False
-                        }, headers={
-                            'authorization': bot_config.SECRET_KEY
                         })
 
                 await ctx.reply(embed=Embed(
@@ -390,19 +378,15 @@ class GeneralModule(Module):
             """Set the language the bot will respond in"""
             validLangs = await getLanguages()
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             for key in validLangs.keys():
                 name = validLangs[key]
                 if lang.lower() == name.lower():
-                    user_data_req = requests.patch(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', json={
+                    user_data_req = await localapi.patch(f'/userinfo/{ctx.server.id}/{ctx.author.id}', json={
                         'language': key
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                     await ctx.reply(embed=EMBED_SUCCESS(await translate(key, 'command.language.success')))
                     return
@@ -416,9 +400,7 @@ class GeneralModule(Module):
         @bot.command()
         async def serverinfo(_, ctx: commands.Context):
             """Get information about the server you are in"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
             server = ctx.server
@@ -443,9 +425,7 @@ class GeneralModule(Module):
         @bot.command()
         async def support(_, ctx: commands.Context):
             """Get a link to the support server"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -459,9 +439,7 @@ class GeneralModule(Module):
         @bot.command()
         async def invite(_, ctx: commands.Context):
             """Get an invite link for the bot"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -484,16 +462,12 @@ class GeneralModule(Module):
             """Set how many messages a user can say in a short timespan before the bot removes them, setting to 0 disables"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/automod_spam', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/automod_spam', json={
                 'value': amount
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -507,33 +481,25 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             account = ' '.join(_account)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             ref = await self.convert_member(ctx, account)
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/admin_contact', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/admin_contact', json={
                     'value': ref.profile_url
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
             elif re.match(r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)", account):
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/admin_contact', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/admin_contact', json={
                     'value': f'mailto:{account}'
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
             else:
                 link_match = re.search(r'\[(.*?)\]\((.*?)\)', account)
                 if link_match:
-                    result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/admin_contact', json={
+                    result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/admin_contact', json={
                         'value': link_match.groups()[1]
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                 else:
                     await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(curLang, "command.admin_contact.error")))
@@ -549,16 +515,12 @@ class GeneralModule(Module):
             """Turn on or off the tor exit node blocklist for verification"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/block_tor', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/block_tor', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -571,16 +533,12 @@ class GeneralModule(Module):
             """Turn on or off the discord/guilded invite link filter"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/invite_link_filter', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/invite_link_filter', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -593,16 +551,12 @@ class GeneralModule(Module):
             """Turn on or off the duplicate text filter"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/automod_duplicate', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/automod_duplicate', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -615,16 +569,12 @@ class GeneralModule(Module):
             """Turn on or off the malicious URL filter"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/url_filter', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/url_filter', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -639,17 +589,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/mute_role', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/mute_role', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -664,17 +610,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/verification_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/verification_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -682,10 +624,8 @@ class GeneralModule(Module):
                 else:
                     await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(curLang, "command.error")))
             elif target.isspace() or target == '':
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/verification_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/verification_channel', json={
                     'value': ''
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -706,17 +646,13 @@ class GeneralModule(Module):
                 return
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/nsfw_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/nsfw_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -731,16 +667,12 @@ class GeneralModule(Module):
             """Disable the NSFW filter"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/nsfw_logs_channel', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/nsfw_logs_channel', json={
                 'value': ''
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -755,17 +687,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/message_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/message_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -782,17 +710,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/traffic_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/traffic_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -809,17 +733,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/verify_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/verify_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -836,17 +756,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/action_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/action_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -863,17 +779,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_channel(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/automod_logs_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/automod_logs_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -890,17 +802,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/verified_role', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/verified_role', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -918,17 +826,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/unverified_role', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/unverified_role', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -948,16 +852,12 @@ class GeneralModule(Module):
             """Add a word to the filter list"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.post(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/filters', json={
+            result = await localapi.post(f'/guilddata/{ctx.server.id}/cfg/filters', json={
                 'value': word.lower()
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -971,16 +871,12 @@ class GeneralModule(Module):
             """Remove a word from the filter list"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.delete(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/filters', json={
+            result = await localapi.delete(f'/guilddata/{ctx.server.id}/cfg/filters', json={
                 'value': word.lower()
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 204:
@@ -995,16 +891,12 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             sensitivity = min(sensitivity, 100)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/toxicity', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/toxicity', json={
                 'value': sensitivity
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -1018,16 +910,12 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             sensitivity = min(sensitivity, 100)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/hatespeech', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/hatespeech', json={
                 'value': sensitivity
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -1047,20 +935,16 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.post(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/roles', json={
+                result = await localapi.post(f'/guilddata/{ctx.server.id}/cfg/roles', json={
                     'value': {
                         'id': ref.id,
                         'level': 0
                     }
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -1079,20 +963,16 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.delete(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/roles', json={
+                result = await localapi.delete(f'/guilddata/{ctx.server.id}/cfg/roles', json={
                     'value': {
                         'id': ref.id,
                         'level': 0
                     }
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 204:
@@ -1116,20 +996,16 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.post(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/roles', json={
+                result = await localapi.post(f'/guilddata/{ctx.server.id}/cfg/roles', json={
                     'value': {
                         'id': ref.id,
                         'level': 1
                     }
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -1148,20 +1024,16 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.delete(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/roles', json={
+                result = await localapi.delete(f'/guilddata/{ctx.server.id}/cfg/roles', json={
                     'value': {
                         'id': ref.id,
                         'level': 1
                     }
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 204:
@@ -1185,17 +1057,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.post(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/trusted_roles', json={
+                result = await localapi.post(f'/guilddata/{ctx.server.id}/cfg/trusted_roles', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -1214,17 +1082,13 @@ class GeneralModule(Module):
             await self.validate_permission_level(2, ctx)
             ref = await self.convert_role(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             if ref is not None:
-                result = requests.delete(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/trusted_roles', json={
+                result = await localapi.delete(f'/guilddata/{ctx.server.id}/cfg/trusted_roles', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 204:
@@ -1241,16 +1105,12 @@ class GeneralModule(Module):
             """Turn on or off image link blocking for untrusted users"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/untrusted_block_images', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/untrusted_block_images', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -1268,16 +1128,12 @@ class GeneralModule(Module):
             """Enable/disable the welcomer"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/use_welcome', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/use_welcome', json={
                 'value': on == 'yes' and 1 or 0
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -1292,9 +1148,7 @@ class GeneralModule(Module):
             {server_name} - The name of the server"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -1302,10 +1156,8 @@ class GeneralModule(Module):
             if message.isspace():
                 message = 'Hello {mention} and welcome to {server_name}!\n\nRemember to read the rules before interacting in this server!' # fallback
 
-            result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/welcome_message', json={
+            result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/welcome_message', json={
                 'value': message
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             if result.status_code == 200 or result.status_code == 201:
@@ -1318,19 +1170,15 @@ class GeneralModule(Module):
             """Set the welcomer's image"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
             url = re.search("(?P<url>https?://[^\s\]\[]+)", image).group("url")
 
             if url:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/welcome_image', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/welcome_image', json={
                     'value': url
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -1345,9 +1193,7 @@ class GeneralModule(Module):
             """Set the welcomer's channel"""
             await self.validate_permission_level(2, ctx)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -1356,10 +1202,8 @@ class GeneralModule(Module):
             ref = await self.convert_channel(ctx, target)
 
             if ref is not None:
-                result = requests.patch(f'http://localhost:5000/guilddata/{ctx.server.id}/cfg/welcome_channel', json={
+                result = await localapi.patch(f'/guilddata/{ctx.server.id}/cfg/welcome_channel', json={
                     'value': ref.id
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
 
                 if result.status_code == 200 or result.status_code == 201:
@@ -1379,9 +1223,7 @@ class GeneralModule(Module):
         @reminder.command(name='add')
         async def remindme(ctx: commands.Context, timespan: str, *_reason):
             """Remind yourself to do something"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
             reason = ' '.join(_reason)
@@ -1391,12 +1233,10 @@ class GeneralModule(Module):
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(curLang, "command.error")))
                 timespan = None
             if timespan is not None:
-                result = requests.post(f'http://localhost:5000/reminders/{ctx.server.id}/{ctx.author.id}', json={
+                result = await localapi.post(f'/reminders/{ctx.server.id}/{ctx.author.id}', json={
                     'channel': ctx.channel.id,
                     'description': reason,
                     'ends': timespan is not None and datetime.now().timestamp() + timespan or None
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
                 if result.ok:
                     em = Embed(
@@ -1411,14 +1251,10 @@ class GeneralModule(Module):
         @reminder.command(name='list')
         async def remindme_list(ctx: commands.Context):
             """List your reminders"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
-            result = requests.get(f'http://localhost:5000/reminders/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.get(f'/reminders/{ctx.server.id}/{ctx.author.id}')
             if result.ok:
                 warns = result.json()
                 em = Embed(
@@ -1433,14 +1269,10 @@ class GeneralModule(Module):
         @reminder.command(name='delete')
         async def remindme_delete(ctx: commands.Context, id: str):
             """Delete a reminder"""
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
-            result = requests.delete(f'http://localhost:5000/reminders/{ctx.server.id}/{ctx.author.id}/{id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.delete(f'/reminders/{ctx.server.id}/{ctx.author.id}/{id}')
             if result.ok:
                 await ctx.reply(embed=EMBED_SUCCESS(await translate(curLang, 'command.reminders.delete.success')))
             else:
@@ -1451,18 +1283,14 @@ class GeneralModule(Module):
             """Configure the xp giver"""
             pass
 
-        def change_xp_gain(guild, role_id, value):
-            orig_result = requests.get(f'http://localhost:5000/guilddata/{guild}/cfg/xp_gain', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+        async def change_xp_gain(guild, role_id, value):
+            orig_result = await localapi.get(f'/guilddata/{guild}/cfg/xp_gain')
 
             orig = (orig_result.status_code == 200 and orig_result.json().get('result')) or {}
             orig[role_id] = value
             
-            result = requests.patch(f'http://localhost:5000/guilddata/{guild}/cfg/xp_gain', json={
+            result = await localapi.patch(f'/guilddata/{guild}/cfg/xp_gain', json={
                 'value': orig
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
             return result
 
@@ -1470,11 +1298,9 @@ class GeneralModule(Module):
         async def xp_all(ctx: commands.Context, value):
             """Set the XP gain for all users"""
             if int(value) is not None:
-                result = change_xp_gain(ctx.server.id, -1, int(value))
+                result = await change_xp_gain(ctx.server.id, -1, int(value))
 
-                user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
                 user_info = user_data_req.json()
                 curLang = user_info.get('language', 'en')
 
@@ -1490,16 +1316,14 @@ class GeneralModule(Module):
             """Set the XP gain for a specified role, setting to 0 disables"""
             role_object = await self.convert_role(ctx, role)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
             if role_object is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(curLang, "command.error.role")))
                 return
             if int(value) is not None:
-                result = change_xp_gain(ctx.server.id, role_object.get('id'), int(value))
+                result = await change_xp_gain(ctx.server.id, role_object.get('id'), int(value))
 
                 if result.status_code >= 200 and result.status_code < 300:
                     await ctx.reply(embed=EMBED_SUCCESS(await translate(curLang, "command.xp.role.success", {"role_id": role_object.get("id")})), silent=True)
@@ -1509,8 +1333,10 @@ class GeneralModule(Module):
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(curLang, "command.error.number")))
 
         async def on_bulk_member_roles_update(event: BulkMemberRolesUpdateEvent):
+            for member in event.after:
+                xp_roles_cache.remove(f'{event.server_id}/{member.id}')
             # xp_remove_old
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             xp_remove_old = config.get('xp_remove_old', 0) == 1
             if event.server_id == 'aE9Zg6Kj':
@@ -1525,10 +1351,8 @@ class GeneralModule(Module):
                         lvl = 1
                     else:
                         lvl = 0
-                    requests.patch(f'http://localhost:5000/userinfo/aE9Zg6Kj/{member.id}', json={
+                    await localapi.patch(f'/userinfo/aE9Zg6Kj/{member.id}', json={
                         'premium': lvl
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
             for member in event.after:
                 if xp_remove_old:
@@ -1549,9 +1373,7 @@ class GeneralModule(Module):
                                             } for role in level_roles_req],
                                     }
                                 ]
-                                requests.put(f'http://localhost:5000/data/cache/{event.server_id}/level_roles', headers={
-                                    'authorization': bot_config.SECRET_KEY
-                                }, json=level_roles)
+                                await localapi.put(f'/data/cache/{event.server_id}/level_roles', json=level_roles)
                                 level_roles = {
                                     '0': level_roles[0],
                                 }
@@ -1577,9 +1399,7 @@ class GeneralModule(Module):
                     permission_level = 3
                 else:
                     _lvl = 0
-                    role_config_req = requests.get(f'http://localhost:5000/guilddata/{event.server_id}/cfg/roles', headers={
-                        'authorization': bot_config.SECRET_KEY
-                    })
+                    role_config_req = await localapi.get(f'/guilddata/{event.server_id}/cfg/roles')
                     role_config_json: dict = role_config_req.json()
                     if role_config_req.status_code == 200:
                         role_set: list[dict] = role_config_json['result']
@@ -1593,10 +1413,8 @@ class GeneralModule(Module):
                             except Exception as e:
                                 pass
                     permission_level = _lvl
-                user_data_set_req = requests.patch(f'http://localhost:5000/getguilduser/{event.server_id}/{member.id}', json={
+                user_data_set_req = await localapi.patch(f'/getguilduser/{event.server_id}/{member.id}', json={
                     'permission_level': permission_level
-                    }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
         bot.member_role_update_listeners.append(on_bulk_member_roles_update)
 
@@ -1627,7 +1445,27 @@ class GeneralModule(Module):
             }
         ]
 
-        async def on_message(message: ChatMessage):
+        @xp_ledger.on_level_up
+        async def on_level_up(guild_id: str, user_id: str, level: int, message: ChatMessage):
+            if message == None:
+                return # Found by a sync, there is no message to reply to
+            guild_data: dict = await self.get_guild_data(guild_id)
+            config = guild_data.get('config', {})
+            if config.get('xp_announce_lu', 0) != 1:
+                return
+            print('OUTPUTTING LEVEL UP ANNOUNCEMENT')
+            card = await localapi.get(f'/rankcard/{guild_id}/{user_id}/image?levelup=show')
+            if not card.ok:
+                print(f'Failed to draw the rank card of {user_id} in {guild_id}: {card.text}')
+                return
+            image = card.content
+            served = await localapi.post('/serve', data=image, headers={
+                'Content-Type': 'image/png'
+            })
+            print(f'File served with id {served.json()["id"]}')
+            await message.reply(embed=Embed().set_image(url=f'https://api.serverguard.xyz/serve/{served.json()["id"]}'))
+
+        async def on_message(message: ChatMessage, context: MessageContext):
             id = f'{message.guild.id}/{message.author.id}'
             if message.author.bot:
                 return
@@ -1652,9 +1490,7 @@ class GeneralModule(Module):
                         'jump': channel.jump_url,
                     })
             if len(channel_payload) > 0:
-                requests.put(f'http://localhost:5000/data/cache/{message.guild.id}/channels', headers={
-                    'authorization': bot_config.SECRET_KEY
-                }, json=channel_payload)
+                await localapi.put(f'/data/cache/{message.guild.id}/channels', json=channel_payload)
             if message.server_id == SUPPORT_SERVER_ID and not (message.channel_id == LOGIN_CHANNEL_ID or message.channel_id == TEST_LOGIN_CHANNEL_ID):
                 content = message.content.lower().strip()
                 for item in automated_responses:
@@ -1677,9 +1513,7 @@ class GeneralModule(Module):
             if message.channel_id == LOGIN_CHANNEL_ID or message.channel_id == TEST_LOGIN_CHANNEL_ID:
                 # Do login stuff
                 await message.delete() # Delete it first so there is minimal time-frame for others to see the code
-                status_result = requests.get(f'http://localhost:5000/auth/status/{message.content}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                status_result = await localapi.get(f'/auth/status/{message.content}')
                 if status_result.status_code == 200:
                     login_cache.set(message.author_id, message.content)
                     data: dict = status_result.json()
@@ -1700,105 +1534,29 @@ class GeneralModule(Module):
                         colour=Colour.gilded()
                     )
                     await message.reply(embed=em, private=True, delete_after=10)
-            guild_data: dict = self.get_guild_data(message.server_id)
+            guild_data: dict = await self.get_guild_data(message.server_id, context)
             config = guild_data.get('config', {})
             xp_gain = config.get('xp_gain', {})
 
-            try:
-                if xp_update_cache.get(id) == None:
-                    xp_update_cache.set(id, True)
-                    current_xp: int = await message.author.award_xp(0) # Guilded doesn't support fetching XP, but returns the total amount after awarding
-                    # so we award 0 XP to get the current XP, it's a hack but it works I guess
-                    db_xp_user_req = requests.get(f'http://localhost:5000/getguilduser/{message.server_id}/{message.author.id}/xp', headers={
-                        'authorization': bot_config.SECRET_KEY
-                    })
-                    requests.patch(f'http://localhost:5000/getguilduser/{message.server_id}/{message.author.id}/xp', json={
-                        'xp': current_xp
-                        }, headers={
-                        'authorization': bot_config.SECRET_KEY
-                    })
-                    if db_xp_user_req.ok:
-                        db_xp_user = db_xp_user_req.json()
-                        level_now, level_before = getLevel(current_xp), getLevel(db_xp_user.get('xp', 0))
-                        if config.get('xp_announce_lu', 0) == 1 and level_now > level_before:
-                            print('OUTPUTTING LEVEL UP ANNOUNCEMENT')
-                            browser = await launch({
-                                'handleSIGINT': False,
-                                'handleSIGTERM': False,
-                                'handleSIGHUP': False,
-                                'headless': True,
-                                'args': [
-                                    '--no-sandbox',
-                                    '--disable-extensions',
-                                    '--disable-breakpad',
-                                    '--disable-background-networking',
-                                    '--disable-background-timer-throttling',
-                                    '--disable-backgrounding-occluded-windows',
-                                    '--disable-component-update',
-                                    '--disable-default-apps',
-                                    '--disable-dev-shm-usage',
-                                    '--disable-domain-reliability',
-                                    '--disable-features=AudioServiceOutOfProcess',
-                                    '--disable-hang-monitor',
-                                    '--disable-ipc-flooding-protection',
-                                    '--disable-notifications',
-                                    '--disable-offer-store-unmasked-wallet-cards',
-                                    '--disable-popup-blocking',
-                                    '--disable-print-preview',
-                                    '--disable-prompt-on-repost',
-                                    '--disable-renderer-backgrounding',
-                                    '--disable-setuid-sandbox',
-                                    '--disable-speech-api',
-                                    '--disable-sync',
-                                    '--hide-scrollbars',
-                                    '--ignore-gpu-blacklist',
-                                    '--metrics-recording-only',
-                                    '--mute-audio',
-                                    '--no-default-browser-check',
-                                    '--no-first-run',
-                                    '--no-pings',
-                                    '--no-zygote',
-                                    '--password-store=basic',
-                                    '--use-gl=swiftshader',
-                                    '--use-mock-keychain',
-                                ],
-                            })
-                            page = await browser.newPage()
-                            await page.goto(f'http://localhost:5000/rankcard/{message.server_id}/{message.author.id}?levelup=show', {'waitUntil': 'networkidle0'})
-                            image = await page.screenshot({
-                                'omitBackground': True,
-                                'clip': {
-                                    'width': 900,
-                                    'height': 290,
-                                    'x': 0,
-                                    'y': 0,
-                                }
-                            })
-                            await browser.close()
-                            id = requests.post(f'http://localhost:5000/serve', json={
-                                'file': image.hex()
-                            }, headers={
-                                'authorization': bot_config.SECRET_KEY
-                            })
-                            print(f'File served with id {id.json()["id"]}')
-                            await message.reply(embed=Embed().set_image(url=f'https://api.serverguard.xyz/serve/{id.json()["id"]}'))
-            except Exception as e:
-                print(f"Failed to update internal user xp: {e}")
+            xp_ledger.add(message.server_id, message.author.id, 0, message) # Keeps their XP in the DB in sync with Guilded
 
             if xp_cache.get(id):
                 return # They cannot gain xp at this point in time
 
-            requests.patch(f'http://localhost:5000/guilddata/{message.server_id}', json={
-                'active': True
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
-            }) # Since the bot received a message from the server, make sure its active state is accurate in the DB
-            # As in some cases, a server might be added while the bot is restarting.
+            if active_cache.get(message.server_id) == None:
+                active_cache.set(message.server_id, True)
+                await localapi.patch(f'/guilddata/{message.server_id}', json={
+                    'active': True
+                }) # Since the bot received a message from the server, make sure its active state is accurate in the DB
+                # As in some cases, a server might be added while the bot is restarting.
 
             if len(xp_gain) > 0 and any([item > 0 for item in list(xp_gain.values())]):
                 # Only go further if there are any gains that a user can possibly obtain
-                member = await message.guild.getch_member(message.author.id)
-                role_ids = await member.fetch_role_ids()
+                role_ids = xp_roles_cache.get(id)
+                if role_ids == None:
+                    member = await message.guild.getch_member(message.author.id)
+                    role_ids = await member.fetch_role_ids()
+                    xp_roles_cache.set(id, role_ids)
                 gain = 0
                 for role_id in xp_gain.keys():
                     role_id = int(role_id)
@@ -1807,9 +1565,9 @@ class GeneralModule(Module):
                         gain += value
                 if gain > 0:
                     xp_cache.set(id, True)
-                    await member.award_xp(gain)
-            if message.content.lower().startswith(bot.command_prefix) and await self.is_moderator(await message.server.getch_member(message.author_id)):
-                guild_data: dict = self.get_guild_data(message.server_id)
+                    xp_ledger.add(message.server_id, message.author.id, gain, message) # Awarded on the ledger's next flush
+            if message.content.lower().startswith(bot.command_prefix) and await self.is_moderator(await message.server.getch_member(message.author_id), context):
+                guild_data: dict = await self.get_guild_data(message.server_id, context)
                 config: dict = guild_data.get('config', {})
 
                 if config.get('silence_commands', False):
@@ -1839,9 +1597,7 @@ class GeneralModule(Module):
                     message = await event.channel.fetch_message(event.message_id)
                     await message.delete()
 
-                    result = requests.post(f'http://localhost:5000/auth/status/{code}/{event.user_id}', headers={
-                        'authorization': bot_config.SECRET_KEY
-                    })
+                    result = await localapi.post(f'/auth/status/{code}/{event.user_id}')
                     if result.status_code == 200:
                         em = Embed(
                             title='Success',
@@ -1866,9 +1622,7 @@ class GeneralModule(Module):
                 'type': channel.type.name,
                 'jump': channel.jump_url,
             }]
-            requests.put(f'http://localhost:5000/data/cache/{event.server_id}/channels', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=channel_payload)
+            await localapi.put(f'/data/cache/{event.server_id}/channels', json=channel_payload)
         bot.channel_create_listeners.append(on_server_channel_create)
         
         async def on_server_channel_delete(event: ServerChannelDeleteEvent):
@@ -1876,9 +1630,7 @@ class GeneralModule(Module):
             channel_payload = [{
                 'id': channel.id,
             }]
-            requests.delete(f'http://localhost:5000/data/cache/{event.server_id}/channels', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=channel_payload)
+            await localapi.delete(f'/data/cache/{event.server_id}/channels', json=channel_payload)
         bot.channel_delete_listeners.append(on_server_channel_delete)
 
         async def on_member_removed(event: MemberRemoveEvent):
@@ -1886,9 +1638,7 @@ class GeneralModule(Module):
             if user.bot:
                 return
             server = event.server
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{event.server_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{event.server_id}')
             guild_data: dict = guild_data_req.json()
             config: dict =  guild_data.get('config', {})
             leave_message: str = config.get('leave_message', 'Goodbye, {mention}, we hope to see you again!')
@@ -1896,9 +1646,7 @@ class GeneralModule(Module):
             welcome_channel_id = config.get('welcome_channel', server.default_channel_id)
             leave_enabled = config.get('use_leave', 0)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{server.id}/{user.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{server.id}/{user.id}')
             user_info: dict = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -1942,9 +1690,7 @@ class GeneralModule(Module):
                 'icon': role.icon != None and role.icon.aws_url or '',
                 'permissions': role.permissions.values
             }]
-            requests.put(f'http://localhost:5000/data/cache/{event.server_id}/roles', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=role_payload)
+            await localapi.put(f'/data/cache/{event.server_id}/roles', json=role_payload)
         bot.role_create_listeners.append(on_role_create)
 
         async def on_role_update(event: RoleUpdateEvent):
@@ -1959,26 +1705,21 @@ class GeneralModule(Module):
                 'icon': role.icon != None and role.icon.aws_url or '',
                 'permissions': role.permissions.values
             }]
-            requests.put(f'http://localhost:5000/data/cache/{event.server_id}/roles', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=role_payload)
+            await localapi.put(f'/data/cache/{event.server_id}/roles', json=role_payload)
         bot.role_update_listeners.append(on_role_update)
 
         async def on_role_delete(event: RoleDeleteEvent):
             role_payload = [{
                 'id': event.role.id,
             }]
-            requests.delete(f'http://localhost:5000/data/cache/{event.server_id}/roles', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=role_payload)
+            await localapi.delete(f'/data/cache/{event.server_id}/roles', json=role_payload)
         bot.role_delete_listeners.append(on_role_delete)
 
         @bot.event
         async def on_bot_remove(event: BotRemoveEvent):
-            requests.patch(f'http://localhost:5000/guilddata/{event.server_id}', json={
+            active_cache.remove(event.server_id)
+            await localapi.patch(f'/guilddata/{event.server_id}', json={
                 'active': False
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
         
         @bot.event
@@ -1996,16 +1737,12 @@ class GeneralModule(Module):
             .add_field(name='Links', value='[Support Server](https://www.guilded.gg/server-guard) • [Website](https://serverguard.xyz) • [Invite](https://www.guilded.gg/b/c10ac149-0462-4282-a632-d7a8808c6c6e)', inline=False)
             await default.send(embed=em)
 
-            requests.patch(f'http://localhost:5000/guilddata/{event.server_id}', json={
+            await localapi.patch(f'/guilddata/{event.server_id}', json={
                 'active': True
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
-            requests.patch(f'http://localhost:5000/getguilduser/{event.server_id}/{event.server.owner_id}', json={
+            await localapi.patch(f'/getguilduser/{event.server_id}/{event.server.owner_id}', json={
                 'permission_level': 4
-                }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
             role_payload = []
@@ -2023,9 +1760,7 @@ class GeneralModule(Module):
                     'permissions': role.permissions.values
                 })
 
-            requests.put(f'http://localhost:5000/data/cache/{event.server_id}/roles', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json=role_payload)
+            await localapi.put(f'/data/cache/{event.server_id}/roles', json=role_payload)
 
             bot_api = bot.http
             channels_req = await bot_api.request(http.Route('GET', f'/teams/{event.server_id}/channels', override_base=http.Route.USER_BASE))
@@ -2040,6 +1775,4 @@ class GeneralModule(Module):
                         'type': channel['contentType'],
                         'jump': f'https://www.guilded.gg/{event.server.slug}/groups/{channel["groupId"]}/channels/{channel["id"]}',
                     })
-                requests.put(f'http://localhost:5000/data/cache/{event.server_id}/channels', headers={
-                    'authorization': bot_config.SECRET_KEY
-                }, json=channel_payload)
+                await localapi.put(f'/data/cache/{event.server_id}/channels', json=channel_payload)
@@ -1,7 +1,7 @@
 from datetime import timedelta
 from project.modules.base import Module
 from project.helpers.embeds import *
-from project import bot_config
+from project.helpers import localapi
 from project.helpers.translator import translate
 from project.modules.general import General
 from humanfriendly import parse_timespan, format_timespan
@@ -10,8 +10,6 @@ from guilded import MessageReactionAddEvent, MessageReactionRemoveEvent
 from guilded.utils import hyperlink
 from guilded.ext import commands
 
-import requests
-
 class GiveawaysModule(Module):
     name = 'Giveaways'
 
@@ -46,9 +44,7 @@ class GiveawaysModule(Module):
             except:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.missingwinners')), private=True)
                 return
-            result = requests.post(f'http://localhost:5000/giveaways/{ctx.server.id}/{ctx.channel.id}/host', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json={
+            result = await localapi.post(f'/giveaways/{ctx.server.id}/{ctx.channel.id}/host', json={
                 'winners': int(winners),
                 'ends_at': (datetime.now() + timedelta(seconds=timespan)).timestamp(),
                 'prize': prize,
@@ -66,9 +62,7 @@ class GiveawaysModule(Module):
             """Lists all active giveaways"""
             await self.validate_permission_level(1, ctx)
 
-            result = requests.get(f'http://localhost:5000/giveaways/{ctx.server.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.get(f'/giveaways/{ctx.server.id}')
 
             if result.ok:
                 em = Embed(
@@ -100,9 +94,7 @@ class GiveawaysModule(Module):
             elif giveaway_id is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.noid')), private=True)
                 return
-            result = requests.patch(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json={
+            result = await localapi.patch(f'/giveaways/{ctx.server.id}/{giveaway_id}', json={
                 'extend': timespan
             })
 
@@ -120,9 +112,7 @@ class GiveawaysModule(Module):
             if giveaway_id is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.noid')), private=True)
                 return
-            result = requests.patch(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json={
+            result = await localapi.patch(f'/giveaways/{ctx.server.id}/{giveaway_id}', json={
                 'prize': prize
             })
 
@@ -144,9 +134,7 @@ class GiveawaysModule(Module):
             except:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.missingwinners')), private=True)
                 return
-            result = requests.patch(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            }, json={
+            result = await localapi.patch(f'/giveaways/{ctx.server.id}/{giveaway_id}', json={
                 'winners': max(int(winners), 1)
             })
 
@@ -163,9 +151,7 @@ class GiveawaysModule(Module):
             if giveaway_id is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.noid')), private=True)
                 return
-            result = requests.delete(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.delete(f'/giveaways/{ctx.server.id}/{giveaway_id}')
 
             if result.ok:
                 await ctx.reply(embed=EMBED_SUCCESS(), private=True)
@@ -180,9 +166,7 @@ class GiveawaysModule(Module):
             if giveaway_id is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.noid')), private=True)
                 return
-            result = requests.post(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}/end', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.post(f'/giveaways/{ctx.server.id}/{giveaway_id}/end')
 
             if result.ok:
                 await ctx.reply(embed=EMBED_SUCCESS(), private=True)
@@ -197,9 +181,7 @@ class GiveawaysModule(Module):
             if giveaway_id is None:
                 await ctx.reply(embed=EMBED_COMMAND_ERROR(await translate(ctx.message.language, 'giveaway.noid')), private=True)
                 return
-            result = requests.post(f'http://localhost:5000/giveaways/{ctx.server.id}/{giveaway_id}/reroll', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.post(f'/giveaways/{ctx.server.id}/{giveaway_id}/reroll')
 
             if result.ok:
                 await ctx.reply(embed=EMBED_SUCCESS(), private=True)
@@ -211,9 +193,7 @@ class GiveawaysModule(Module):
                 return
             message = await event.channel.fetch_message(event.message_id)
             if event.emote.id == 90001815 and message.author_id == bot.user_id:
-                result = requests.put(f'http://localhost:5000/giveaways/{event.server_id}/entry/{event.message_id}/{event.user_id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                result = await localapi.put(f'/giveaways/{event.server_id}/entry/{event.message_id}/{event.user_id}')
         bot.reaction_add_listeners.append(on_message_reaction_add)
 
         async def on_message_reaction_remove(event: MessageReactionRemoveEvent):
@@ -221,7 +201,5 @@ class GiveawaysModule(Module):
                 return
             message = await event.channel.fetch_message(event.message_id)
             if event.emote.id == 90001815 and message.author_id == bot.user_id:
-                result = requests.delete(f'http://localhost:5000/giveaways/{event.server_id}/entry/{event.message_id}/{event.user_id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                result = await localapi.delete(f'/giveaways/{event.server_id}/entry/{event.message_id}/{event.user_id}')
         bot.reaction_remove_listeners.append(on_message_reaction_remove)
\ No newline at end of file
@@ -3,24 +3,25 @@ import re
 from project.helpers.embeds import *
 from project.helpers.images import *
 from project.helpers.Cache import Cache
+from project.helpers.inference import BatchPredictor
 from project.helpers.translator import translate
-from project.modules.base import Module
+from project.helpers import localapi
+from project.helpers.config_bus import config_bus
+from project.modules.base import Module, MessageContext
 from project import bot_config, BotAPI, malicious_urls, guilded_paths
 from guilded.ext import commands
 from guilded import Embed, Colour, Forbidden, BulkMemberRolesUpdateEvent, MemberJoinEvent, MemberRemoveEvent, BanCreateEvent, \
     BanDeleteEvent, MessageUpdateEvent, MessageDeleteEvent, ForumTopicCreateEvent, ForumTopicDeleteEvent, ForumTopicUpdateEvent, \
     ChatMessage, ForumTopic, WebhookCreateEvent, WebhookUpdateEvent, ServerChannelCreateEvent, ServerChannelDeleteEvent, \
     ServerChannelUpdateEvent, ForumTopicReplyCreateEvent, ForumTopicReplyDeleteEvent, ForumTopicReplyUpdateEvent, \
-    AnnouncementReplyCreateEvent, AnnouncementReplyUpdateEvent, AnnouncementReplyDeleteEvent, User, http
+    AnnouncementReplyCreateEvent, AnnouncementReplyUpdateEvent, AnnouncementReplyDeleteEvent, User
 from humanfriendly import parse_timespan, format_timespan
 from better_profanity import Profanity
-from unidecode import unidecode
 from bs4 import BeautifulSoup
 
 import os
 import requests
 import joblib
-import numpy as np
 
 user_converter = commands.UserConverter()
 
@@ -46,22 +47,21 @@ filters = {
     }
 }
 
-filter_cache = Cache()
-spam_cache = Cache(3)
+predictor = BatchPredictor(
+    filters,
+    max_batch_size=int(os.getenv('FILTER_BATCH_SIZE', '32')),
+    max_latency=float(os.getenv('FILTER_BATCH_LATENCY_MS', '5')) / 1000
+)
 
-def _get_prob(prob):
-    return prob[1]
+filter_cache = Cache(60 * 60, max_size=5000, name='filter')
+config_bus.subscribe(filter_cache.remove)
+spam_cache = Cache(3, name='spam')
 
-def apply_filter(filter: str, texts: list):
-    new_texts = []
-    for text in texts:
-        new_texts.append(unidecode(text))
-    if not filters.get(filter):
-        raise Exception('Filter not found')
-    f = filters[filter]
-    return np.apply_along_axis(
-        _get_prob, 1, f['model'].predict_proba(f['vectorizer'].transform(texts))
-    )
+async def apply_filters(config: dict, text: str):
+    """ Get the probability of text for every filter enabled in config, 0 for the disabled ones """
+    enabled = [name for name in filters.keys() if config.get(name, 0) > 0]
+    probs = await predictor.predict(text, enabled)
+    return {name: probs.get(name, 0) for name in filters.keys()}
 
 def reset_filter_cache(guild_id):
     filter_cache.remove(guild_id)
@@ -95,23 +95,21 @@ class Moderation(commands.Cog):
 class ModerationModule(Module):
     name = 'Moderation'
 
-    def get_filter(self, guild_id):
+    async def get_filter(self, guild_id):
         cached = filter_cache.get(guild_id)
         if cached:
             return cached
-        guild_data: dict = self.get_guild_data(guild_id)
+        guild_data: dict = await self.get_guild_data(guild_id)
         list = guild_data.get('config', {}).get('filters', [])
 
         cached = Profanity(list)
-        filter_cache.set(guild_id, cached)
+        if config_bus.is_current(guild_id, guild_data.get('config_version')):
+            filter_cache.set(guild_id, cached)
         return cached
 
     def initialize(self):
         bot = self.bot
 
-        self.bot_api = http.HTTPClient()
-        self.bot_api.token = os.getenv('BOT_KEY')
-
         cog = Moderation()
 
         @bot.command()
@@ -120,9 +118,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target, True)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -138,19 +134,15 @@ class ModerationModule(Module):
             if isinstance(user, User):
                 # User not in server, schedule an automated ban once they join
                 if timespan is not None:
-                    requests.post(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/ban', json={
+                    await localapi.post(f'/moderation/{ctx.server.id}/{user.id}/ban', json={
                         'issuer': ctx.author.id,
                         'reason': f'(User Prebanned By <@{ctx.author.id}>)\n{reason}',
                         'ends_at': datetime.now().timestamp() + timespan
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                 else:
-                    requests.post(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/ban', json={
+                    await localapi.post(f'/moderation/{ctx.server.id}/{user.id}/ban', json={
                         'issuer': ctx.author.id,
                         'reason': f'(User Prebanned By <@{ctx.author.id}>)\n{reason}'
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                 em = Embed(
                     title = await translate(curLang, 'command.ban.title'),
@@ -172,9 +164,7 @@ class ModerationModule(Module):
                 await ctx.reply('This user is a moderator, I can\'t do that!')
                 return
             
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{ctx.server.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{ctx.server.id}')
             guild_data: dict = guild_data_req.json()
             config = guild_data.get('config', {})
             logs_channel = config.get('action_logs_channel', config.get('logs_channel'))
@@ -182,12 +172,10 @@ class ModerationModule(Module):
             if user is not None:
                 await user.ban(reason=reason)
                 if timespan is not None:
-                    requests.post(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/ban', json={
+                    await localapi.post(f'/moderation/{ctx.server.id}/{user.id}/ban', json={
                         'issuer': ctx.author.id,
                         'reason': reason,
                         'ends_at': datetime.now().timestamp() + timespan
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                 em = Embed(
                     title = await translate(curLang, 'command.ban.title'),
@@ -212,9 +200,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target, True)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -223,9 +209,7 @@ class ModerationModule(Module):
                 return
 
             await ctx.server.unban(user)
-            requests.delete(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/ban', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            await localapi.delete(f'/moderation/{ctx.server.id}/{user.id}/ban')
             await ctx.reply(embed=EMBED_SUCCESS(await translate(curLang, 'command.unban.success', {'name': user.name})))
 
         unban.cog = cog
@@ -237,9 +221,7 @@ class ModerationModule(Module):
             with BotAPI() as bot_api:
                 user = await self.convert_member(ctx, target)
 
-                user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
                 user_info = user_data_req.json()
                 curLang = user_info.get('language', 'en')
 
@@ -251,9 +233,7 @@ class ModerationModule(Module):
                     await ctx.reply('This user is a moderator, I can\'t do that!')
                     return
 
-                guild_data_req = requests.get(f'http://localhost:5000/guilddata/{ctx.server.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                guild_data_req = await localapi.get(f'/guilddata/{ctx.server.id}')
                 guild_data: dict = guild_data_req.json()
                 config = guild_data.get('config', {})
                 logs_channel = config.get('action_logs_channel', config.get('logs_channel'))
@@ -270,12 +250,10 @@ class ModerationModule(Module):
                 if user is not None:
                     if config.get('mute_role'):
                         await bot_api.assign_role_to_member(ctx.server.id, user.id, config['mute_role'])
-                    requests.post(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/mute', json={
+                    await localapi.post(f'/moderation/{ctx.server.id}/{user.id}/mute', json={
                         'issuer': ctx.author.id,
                         'reason': reason,
                         'ends_at': timespan is not None and datetime.now().timestamp() + timespan or None
-                    }, headers={
-                        'authorization': bot_config.SECRET_KEY
                     })
                     em = Embed(
                         title = await translate(curLang, 'command.mute.title'),
@@ -301,9 +279,7 @@ class ModerationModule(Module):
             with BotAPI() as bot_api:
                 user = await self.convert_member(ctx, target)
 
-                user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
                 user_info = user_data_req.json()
                 curLang = user_info.get('language', 'en')
 
@@ -311,16 +287,12 @@ class ModerationModule(Module):
                     await ctx.reply(private=True, embed=EMBED_COMMAND_ERROR(await translate(curLang, 'command.error.user')))
                     return
 
-                guild_data_req = requests.get(f'http://localhost:5000/guilddata/{ctx.server.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                guild_data_req = await localapi.get(f'/guilddata/{ctx.server.id}')
                 guild_data: dict = guild_data_req.json()
 
                 if guild_data.get('config', {}).get('mute_role'):
                     await bot_api.remove_role_from_member(ctx.server.id, user.id, guild_data['config']['mute_role'])
-                requests.delete(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/mute', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                await localapi.delete(f'/moderation/{ctx.server.id}/{user.id}/mute')
                 await ctx.reply(embed=EMBED_SUCCESS(await translate(curLang, 'command.unmute.success', {'mention': user.mention})))
         
         unmute.cog = cog
@@ -357,9 +329,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -367,9 +337,7 @@ class ModerationModule(Module):
                 await ctx.reply(private=True, embed=EMBED_COMMAND_ERROR('Please specify a valid user!'))
                 return
 
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{ctx.server.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{ctx.server.id}')
             guild_data: dict = guild_data_req.json()
             config = guild_data.get('config', {})
             logs_channel = config.get('action_logs_channel', config.get('logs_channel'))
@@ -384,12 +352,10 @@ class ModerationModule(Module):
                     timespan = None
             
             if user is not None:
-                result = requests.post(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/warnings', json={
+                result = await localapi.post(f'/moderation/{ctx.server.id}/{user.id}/warnings', json={
                     'issuer': ctx.author.id,
                     'reason': reason,
                     'ends_at': timespan is not None and datetime.now().timestamp() + timespan or None
-                }, headers={
-                    'authorization': bot_config.SECRET_KEY
                 })
                 em = Embed(
                     title = await translate(curLang, 'command.warn.title'),
@@ -414,9 +380,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -424,9 +388,7 @@ class ModerationModule(Module):
                 await ctx.reply(private=True, embed=EMBED_COMMAND_ERROR(await translate(curLang, 'command.error.user')))
                 return
 
-            result = requests.get(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/warnings', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            result = await localapi.get(f'/moderation/{ctx.server.id}/{user.id}/warnings')
             if result.status_code == 200:
                 warns = result.json()
                 em = Embed(
@@ -446,9 +408,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -457,9 +417,7 @@ class ModerationModule(Module):
                 return
 
             if id:
-                result = requests.delete(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/warnings/{id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                result = await localapi.delete(f'/moderation/{ctx.server.id}/{user.id}/warnings/{id}')
                 em = Embed(
                     title = f'Deleted warning {id} for {user.name}',
                     description = await translate(curLang, 'command.delwarn.success', {'id': id, 'username': user.name}),
@@ -467,9 +425,7 @@ class ModerationModule(Module):
                 )
                 await ctx.reply(embed=result.status_code == 404 and EMBED_COMMAND_ERROR(await translate(curLang, 'command.delwarn.error', {'id': id, 'username': user.name})) or em)
             else:
-                result = requests.delete(f'http://localhost:5000/moderation/{ctx.server.id}/{user.id}/warnings', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                result = await localapi.delete(f'/moderation/{ctx.server.id}/{user.id}/warnings')
                 await ctx.reply(embed=EMBED_SUCCESS(await translate(curLang, 'command.delwarn.success.all', {'username': user.name})))
         
         delwarn.cog = cog
@@ -480,9 +436,7 @@ class ModerationModule(Module):
             await self.validate_permission_level(1, ctx)
             user = await self.convert_member(ctx, target)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -513,9 +467,7 @@ class ModerationModule(Module):
         async def reset_xp(_, ctx: commands.Context, *_target):
             """[Manage XP] Reset the XP of all mentioned users"""
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -543,19 +495,13 @@ class ModerationModule(Module):
             await self._update_guild_data(event.server_id)
 
             with BotAPI() as bot_api:
-                guild_data_req = requests.get(f'http://localhost:5000/guilddata/{event.server_id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                guild_data_req = await localapi.get(f'/guilddata/{event.server_id}')
                 guild_data: dict = guild_data_req.json()
                 config = guild_data.get('config', {})
 
-                mute_req = requests.get(f'http://localhost:5000/moderation/{event.server_id}/{member.id}/mute', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                mute_req = await localapi.get(f'/moderation/{event.server_id}/{member.id}/mute')
 
-                ban_req = requests.get(f'http://localhost:5000/moderation/{event.server.id}/{member.id}/ban', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                ban_req = await localapi.get(f'/moderation/{event.server.id}/{member.id}/ban')
 
                 if mute_req.status_code == 200:
                     if config.get('mute_role'):
@@ -580,11 +526,12 @@ class ModerationModule(Module):
                     em.add_field(name='User ID', value=member.id)
                     em.add_field(name='Account created', value=member.created_at.strftime("%b %d %Y at %H:%M %p %Z") + (diff <= 60 * 60 * 24 * 3 and '\n:warning: Recent' or ''))
                     em.add_field(name='Account joined', value=member.joined_at.strftime("%b %d %Y at %H:%M %p %Z"))
+                    name_probs = await apply_filters(config, member.name)
                     if config.get('toxicity', 0) > 0:
-                        toxicity_proba_name = round(apply_filter('toxicity', [member.name])[0] * 100)
+                        toxicity_proba_name = round(name_probs['toxicity'] * 100)
                         em.add_field(name='Profile Toxicity', value=f'{toxicity_proba_name}%')
                     if config.get('hatespeech', 0) > 0:
-                        hatespeech_proba_name = round(apply_filter('hatespeech', [member.name])[0] * 100)
+                        hatespeech_proba_name = round(name_probs['hatespeech'] * 100)
                         em.add_field(name='Profile Hate-Speech', value=f'{hatespeech_proba_name}%')
                     channel = await bot.getch_channel(traffic_log_channel)
                     await channel.send(embed=em)
@@ -597,7 +544,7 @@ class ModerationModule(Module):
                 return
             member = await bot.getch_user(event.user_id)
 
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             traffic_log_channel = config.get('traffic_logs_channel')
 
@@ -623,7 +570,7 @@ class ModerationModule(Module):
             ban_info = event.ban
             member = await bot.getch_user(ban_info.user.id)
 
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             traffic_log_channel = guild_data.get('config', {}).get('traffic_logs_channel')
 
             if traffic_log_channel is not None and traffic_log_channel != '':
@@ -650,7 +597,7 @@ class ModerationModule(Module):
             ban_info = event.ban
             member = await bot.getch_user(ban_info.user.id)
 
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             traffic_log_channel = guild_data.get('config', {}).get('traffic_logs_channel')
 
             if traffic_log_channel is not None and traffic_log_channel != '':
@@ -673,20 +620,18 @@ class ModerationModule(Module):
         
         bot.ban_delete_listeners.append(on_ban_delete)
 
-        async def handle_text_message(message):
+        async def handle_text_message(message, context: MessageContext=None):
+            if context is None:
+                context = MessageContext(message.server_id, message.author.id)
             await self._update_guild_data(message.server_id)
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{message.server_id}/{message.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
-            user_info = user_data_req.json()
-            curLang = user_info.get('language', 'en')
+            curLang = await context.get_language()
 
-            guild_data: dict = self.get_guild_data(message.server_id)
+            guild_data: dict = await self.get_guild_data(message.server_id, context)
             config = guild_data.get('config', {})
             custom_filter = config.get('filters')
             logs_channel_id = config.get('automod_logs_channel')
-            trusted = await self.is_trusted(message.author)
+            trusted = await self.is_trusted(message.author, context)
             if logs_channel_id:
                 logs_channel = await bot.getch_channel(logs_channel_id)
             else:
@@ -706,26 +651,27 @@ class ModerationModule(Module):
                     return True
 
             if config.get('url_filter', 0) == 1:
-                for url in malicious_urls.keys():
-                    if url in message.content:
-                        if isinstance(message, ChatMessage):
-                            await message.reply(embed=EMBED_FILTERED(message.author, await translate(curLang, 'filter.malicious_url')), private=True)
-                        try:
-                            await message.delete()
-                        except Forbidden:
-                            await message.reply(embed=EMBED_DENIED(
-                                title='Permissions Error',
-                                description='Server Guard encountered a permissions error while trying to delete the messages.'
-                            ), private=True)
-                        if logs_channel is not None:
-                            await logs_channel.send(embed=EMBED_TIMESTAMP_NOW(
-                                title='Malicious URL Detected',
-                                description=message.content,
-                                url=message.share_url,
-                                colour = Colour.red(),
-                            ).add_field(name='Threat Category', inline=False)\
-                            .add_field(name='User', value=f'[{message.author.name}]({message.author.profile_url})'))
-                        return True
+                match = malicious_urls.search(message.content)
+                if match is not None:
+                    url, threat = match
+                    if isinstance(message, ChatMessage):
+                        await message.reply(embed=EMBED_FILTERED(message.author, await translate(curLang, 'filter.malicious_url')), private=True)
+                    try:
+                        await message.delete()
+                    except Forbidden:
+                        await message.reply(embed=EMBED_DENIED(
+                            title='Permissions Error',
+                            description='Server Guard encountered a permissions error while trying to delete the messages.'
+                        ), private=True)
+                    if logs_channel is not None:
+                        await logs_channel.send(embed=EMBED_TIMESTAMP_NOW(
+                            title='Malicious URL Detected',
+                            description=message.content,
+                            url=message.share_url,
+                            colour = Colour.red(),
+                        ).add_field(name='Threat Category', value=threat, inline=False)\
+                        .add_field(name='User', value=f'[{message.author.name}]({message.author.profile_url})'))
+                    return True
             
             if config.get('filter_api_keys', 0) == 1:
                 for pattern in API_KEY_REGEXES:
@@ -781,14 +727,9 @@ class ModerationModule(Module):
                     message.automoderated = True
                     return True
             
-            if config.get('toxicity', 0) > 0:
-                toxicity_proba = apply_filter('toxicity', [message.content])[0] * 100
-            else:
-                toxicity_proba = 0
-            if config.get('hatespeech', 0) > 0:
-                hatespeech_proba = apply_filter('hatespeech', [message.content])[0] * 100
-            else:
-                hatespeech_proba = 0
+            probs = await apply_filters(config, message.content)
+            toxicity_proba = probs['toxicity'] * 100
+            hatespeech_proba = probs['hatespeech'] * 100
             
             hit_filter = False
             if config.get('toxicity', 0) > 0 and toxicity_proba >= config.get('toxicity', 0):
@@ -826,7 +767,7 @@ class ModerationModule(Module):
                 message.automoderated = True
                 return True
             if custom_filter is not None and len(custom_filter) > 0:
-                filter = self.get_filter(message.server_id)
+                filter = await self.get_filter(message.server_id)
                 if filter.contains_profanity(message.content):
                     if isinstance(message, ChatMessage):
                         await message.reply(embed=EMBED_FILTERED(message.author, await translate(curLang, 'filter.blacklist')),private=True)
@@ -923,7 +864,7 @@ class ModerationModule(Module):
                 if await handle_text_message(event.after):
                     return
 
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -957,7 +898,7 @@ class ModerationModule(Module):
             except:
                 # Just continue in this case
                 pass
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -984,16 +925,16 @@ class ModerationModule(Module):
         
         bot.message_delete_listeners.append(on_message_delete)
 
-        async def on_message(message: ChatMessage):
+        async def on_message(message: ChatMessage, context: MessageContext):
             if message.author.bot:
                 return
             member = await message.guild.getch_member(message.author.id)
             message.automoderated = False
-            if (await self.is_moderator(member)) or await self.user_can_manage_server(member):
+            if (await self.is_moderator(member, context)) or await self.user_can_manage_server(member):
                 return
-            if await handle_text_message(message):
+            if await handle_text_message(message, context):
                 return
-            guild_data: dict = self.get_guild_data(message.server_id)
+            guild_data: dict = await self.get_guild_data(message.server_id, context)
             config = guild_data.get('config', {})
             
             if config.get('automod_spam', 0) > 0:
@@ -1037,7 +978,7 @@ class ModerationModule(Module):
                 return
             if await handle_text_message(event.topic):
                 return
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -1060,7 +1001,7 @@ class ModerationModule(Module):
         async def on_forum_topic_delete(event: ForumTopicDeleteEvent):
             if event.topic.author.bot:
                 return
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -1099,7 +1040,7 @@ class ModerationModule(Module):
                 return
             if await handle_text_message(event.reply):
                 return
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -1122,7 +1063,7 @@ class ModerationModule(Module):
         async def on_forum_topic_reply_delete(event: ForumTopicReplyDeleteEvent):
             if event.reply.author.bot:
                 return
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -1158,7 +1099,7 @@ class ModerationModule(Module):
                 return
             if await handle_text_message(event.reply):
                 return
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
             if message_log_channel is not None and message_log_channel != '':
@@ -1182,7 +1123,7 @@ class ModerationModule(Module):
             if event.reply.author.bot:
                 return
             if event.reply is not None:
-                guild_data: dict = self.get_guild_data(event.server_id)
+                guild_data: dict = await self.get_guild_data(event.server_id)
                 message_log_channel = guild_data.get('config', {}).get('message_logs_channel')
 
                 if message_log_channel is not None and message_log_channel != '':
@@ -1200,7 +1141,7 @@ class ModerationModule(Module):
         bot.announcement_reply_delete_listeners.append(on_announcement_reply_delete)
 
         async def on_bulk_member_roles_update(event: BulkMemberRolesUpdateEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             user_log_channel = config.get('user_logs_channel')
 
@@ -1239,7 +1180,7 @@ class ModerationModule(Module):
         bot.member_role_update_listeners.append(on_bulk_member_roles_update)
 
         async def on_server_channel_create(event: ServerChannelCreateEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             mgmt_log_channel = config.get('management_logs_channel')
 
@@ -1255,7 +1196,7 @@ class ModerationModule(Module):
         bot.channel_create_listeners.append(on_server_channel_create)
         
         async def on_server_channel_update(event: ServerChannelUpdateEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             mgmt_log_channel = config.get('management_logs_channel')
 
@@ -1271,7 +1212,7 @@ class ModerationModule(Module):
         bot.channel_update_listeners.append(on_server_channel_update)
         
         async def on_server_channel_delete(event: ServerChannelDeleteEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             mgmt_log_channel = config.get('management_logs_channel')
 
@@ -1289,7 +1230,7 @@ class ModerationModule(Module):
         # TODO: Translate these events into callback handlers in init
         @bot.event
         async def on_webhook_create(event: WebhookCreateEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             mgmt_log_channel = config.get('management_logs_channel')
 
@@ -1307,7 +1248,7 @@ class ModerationModule(Module):
 
         @bot.event
         async def on_webhook_update(event: WebhookUpdateEvent):
-            guild_data: dict = self.get_guild_data(event.server_id)
+            guild_data: dict = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             mgmt_log_channel = config.get('management_logs_channel')
 
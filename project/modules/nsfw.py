@@ -1,31 +1,49 @@
 from datetime import datetime
-from project.modules.base import Module
+from project.modules.base import Module, MessageContext
 from project.helpers.Cache import Cache
-from project import bot_config, get_nsfw_model, nsfw_detect
-from guilded import Embed, ChatMessage, Colour, MemberJoinEvent, http
-from os import remove
+from project.helpers.inference import ImageClassifier
+from project.helpers.config_bus import config_bus
+from project.helpers.guilded_client import get_session
+from project.helpers.io_loop import on_io_loop
+from project import get_nsfw_model
+from guilded import Embed, ChatMessage, Colour, MemberJoinEvent
 
-import random
-import requests
+import hashlib
 import os
-import string
 
-settings_cache = Cache(60)
+settings_cache = Cache(60 * 60, name='nsfw_settings')
+config_bus.subscribe(settings_cache.remove)
+# Results are kept by image URL so repeat avatars are not downloaded again, and by
+# content hash so the same image reposted under a new URL is not scored again
+url_results_cache = Cache(60 * 60 * 24, max_size=20000, name='nsfw_url_results')
+hash_results_cache = Cache(60 * 60 * 24, max_size=20000, name='nsfw_hash_results')
+
+classifier = ImageClassifier(
+    get_nsfw_model,
+    max_batch_size=int(os.getenv('NSFW_BATCH_SIZE', '8')),
+    max_latency=float(os.getenv('NSFW_BATCH_LATENCY_MS', '20')) / 1000
+)
+
+@on_io_loop
+async def download_image(url: str):
+    async with get_session().get(url) as response:
+        response.raise_for_status() # An error page is not the image, and must not be classified as one
+        return await response.read()
 
 class NSFWModule(Module):
     name = 'NSFW'
 
-    def get_logs_channel(self, guild):
+    async def get_logs_channel(self, guild):
         cached = settings_cache.get(guild)
 
         if cached:
             return cached
         else:
-            res = requests.get(f'http://localhost:5000/guilddata/{guild}/cfg/nsfw_logs_channel', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
-            cached = res.json().get('result')
-            settings_cache.set(guild, cached)
+            # Read through the guild data so the setting comes with the config version it belongs to
+            guild_data: dict = await self.get_guild_data(guild)
+            cached = guild_data.get('config', {}).get('nsfw_logs_channel')
+            if config_bus.is_current(guild, guild_data.get('config_version')):
+                settings_cache.set(guild, cached)
             return cached
     
     def reset_cache(self, guild):
@@ -45,24 +63,24 @@ class NSFWModule(Module):
         return classification, certainty
 
     async def scan_image(self, url):
-        path = f'/tmp/guilded-{"".join(random.choices(string.ascii_letters, k=15))}-{datetime.now().timestamp()}'
-        with open(path, mode='wb+') as file:
-            img = requests.get(url).content
-            file.write(img)
-            results = nsfw_detect.classify(await get_nsfw_model(), path).get(path)
-            remove(path)
-            return self.check_model_results(results)
+        results = url_results_cache.get(url)
+        if results is None:
+            img = await download_image(url)
+            digest = hashlib.sha256(img).hexdigest()
+            results = hash_results_cache.get(digest)
+            if results is None:
+                results = await classifier.classify(img)
+                hash_results_cache.set(digest, results)
+            url_results_cache.set(url, results)
+        return self.check_model_results(results)
 
     def initialize(self):
         bot = self.bot
 
-        self.bot_api = http.HTTPClient()
-        self.bot_api.token = os.getenv('BOT_KEY')
-
         async def on_member_join(event: MemberJoinEvent):
             member = event.member
             if member.avatar is not None:
-                logs_channel_id = self.get_logs_channel(event.server_id)
+                logs_channel_id = await self.get_logs_channel(event.server_id)
                 premium_status = await self.get_user_premium_status(event.server.owner_id)
                 if logs_channel_id and logs_channel_id != '' and premium_status is not 0:
                     classification, certainty = await self.scan_image(member.avatar.aws_url)
@@ -91,8 +109,8 @@ class NSFWModule(Module):
                         .set_footer(f'Certainty: {certainty}%')
                         channel = await bot.getch_channel(logs_channel_id)
 
-        async def on_message(message: ChatMessage):
-            logs_channel_id = self.get_logs_channel(message.guild.id)
+        async def on_message(message: ChatMessage, context: MessageContext):
+            logs_channel_id = await self.get_logs_channel(message.guild.id)
             premium_status = await self.get_user_premium_status(message.server.owner_id)
             if logs_channel_id and logs_channel_id != '' and premium_status is not 0:
                 for item in message.attachments:
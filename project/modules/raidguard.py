@@ -1,14 +1,30 @@
 from datetime import timedelta
 from project.modules.base import Module
 from project.helpers.embeds import *
-from project.helpers.Cache import ArrayCache
+from project.helpers.Cache import Cache
 from project import bot_config
 from project.helpers.translator import translate
 from Levenshtein import distance
-from guilded import MemberJoinEvent, ChatMessage
+from guilded import MemberJoinEvent, ChatMessage, Colour
+from collections import deque
 
+import numpy as np
 import random
 import re
+import time
+
+JOIN_WINDOW = 60 * 5 # How long a join counts towards a raid wave, in seconds
+MAX_TRACKED_JOINS = 150 # Most joins kept per guild, so memory stays bounded however large the raid is
+RAID_JOIN_COUNT = 10 # Joins within the window before a wave is considered at all
+RAID_SUSPECT_COUNT = 5 # Suspicious joins within the window that trigger a lockdown
+RAID_SCORE_THRESHOLD = 75
+LOCKDOWN_DURATION = 60 * 15
+
+AGE_UPPER_LIMIT = 60 * 60 * 24 * 2
+
+CHAR_BINS = 32 # Characters are counted modulo this for the similarity pre-filter
+SIMILARITY_BLOCK = 128 # Names compared against the rest at once by the pre-filter
+SIMILARITY_COLUMNS = 1024 # Most names each block is compared against at once, so the pre-filter's arrays stay a few MB
 
 class RaidUser:
     def __init__(self, id: str, name: str, avatar: str, created: datetime):
@@ -19,6 +35,16 @@ class RaidUser:
 
         self.raid_score = 0
 
+        # Only used by JoinWindow
+        self.joined = time.time()
+        self.stripped_name = None
+        self.similar_to = set() # Users in the window whose names are within this user's cutoff
+        self.counted_by = set() # Users whose similar_to includes this user
+
+    @property
+    def similar(self):
+        return len(self.similar_to)
+
 def split_name(name: str):
     nameWords = name.split()
     res = []
@@ -33,30 +59,141 @@ def count_nondecimal(name: str):
 def strip_numbers(name: str):
     return re.sub(r'\d+', '', name)
 
+def char_counts(names: list):
+    """ How often each character appears in each name, folded into CHAR_BINS bins """
+    counts = np.zeros((len(names), CHAR_BINS), dtype=np.int16)
+    for i, name in enumerate(names):
+        for char in name:
+            counts[i, ord(char) % CHAR_BINS] += 1
+    return counts
+
+def calc_similar_counts(names: list):
+    """ Count, for every stripped name, how many of the other names are within its edit distance cutoff """
+    groups: dict[str, int] = {}
+    for name in names:
+        groups[name] = groups.get(name, 0) + 1
+
+    # Identical names never need a distance call, and since the cutoff is half the
+    # name's length, two names can only be similar if the longer is at most twice
+    # as long as the shorter, so only that window of the length-sorted names is checked
+    unique = sorted(groups.keys(), key=len)
+    lengths = np.array([len(name) for name in unique])
+    cutoffs = lengths // 2
+    counts = char_counts(unique)
+    similar = {name: count - 1 for name, count in groups.items()}
+    for start in range(0, len(unique), SIMILARITY_BLOCK):
+        stop = min(start + SIMILARITY_BLOCK, len(unique))
+        end = np.searchsorted(lengths, lengths[stop - 1] * 2, side='right')
+
+        # An insertion or deletion moves one character count and the length by one, a
+        # substitution moves two counts, so half of the count and length differences is
+        # never more than the distance. Folding characters into bins only lowers that
+        # bound, and it still rules out nearly every pair before a distance call
+        for column in range(start, end, SIMILARITY_COLUMNS):
+            column_end = min(column + SIMILARITY_COLUMNS, end)
+            differing = counts[start:stop, None, :] - counts[None, column:column_end, :]
+            differing = np.abs(differing, out=differing).sum(axis=2)
+            bound = (differing + np.abs(lengths[start:stop, None] - lengths[None, column:column_end])) // 2
+            candidates = bound <= np.maximum(cutoffs[start:stop, None], cutoffs[None, column:column_end])
+            candidates &= np.arange(column, column_end)[None, :] > np.arange(start, stop)[:, None] # Each pair once
+            rows, columns = np.nonzero(candidates)
+
+            for i, j in zip((rows + start).tolist(), (columns + column).tolist()):
+                name, other = unique[i], unique[j]
+                dist = distance(name, other, score_cutoff=int(max(cutoffs[i], cutoffs[j])))
+                if dist <= cutoffs[i]:
+                    similar[name] += groups[other]
+                if dist <= cutoffs[j]:
+                    similar[other] += groups[name]
+    return similar
+
+def raid_score(similar, upper_user_limit: int, avatar_score, age):
+    """ Works on single values as well as NumPy arrays of them """
+    if upper_user_limit > 0:
+        similarity_score = (np.minimum(similar, upper_user_limit) / upper_user_limit) * 2
+    else:
+        similarity_score = similar * 0
+    age_score = 1 - (np.minimum(age, AGE_UPPER_LIMIT) / AGE_UPPER_LIMIT)
+    return ((similarity_score + avatar_score + age_score) / 4) * 100
+
 def calc_raid_scores(users: list):
+    if len(users) == 0:
+        return
     upper_user_limit = int(len(users) / 3)
-    age_upper_limit = 60 * 60 * 24 * 2
-    for user in users:
-        user: RaidUser
-        similar = 0
-        similar_dist = 0
-        for otherUser in users:
-            otherUser: RaidUser
-            if otherUser == user: continue
-            cutoff = int(count_nondecimal(user.name) / 2)
-            dist = distance(strip_numbers(user.name), strip_numbers(otherUser.name))
+
+    names = [strip_numbers(user.name) for user in users]
+    similar_counts = calc_similar_counts(names)
+    similar = np.array([similar_counts[name] for name in names], dtype=np.float64)
+
+    now = datetime.now().timestamp()
+    ages = np.array([now - user.created.timestamp() for user in users], dtype=np.float64)
+    avatar_scores = np.array([user.avatar == None and 1 or 0 for user in users], dtype=np.float64)
+
+    raid_scores = raid_score(similar, upper_user_limit, avatar_scores, ages)
+
+    for user, score in zip(users, raid_scores):
+        user.raid_score = float(score)
+
+class JoinWindow:
+    """ The recent joins of one guild, scored as each member joins.
+
+    A new join is only compared against the joins already in the window, so
+    each join costs at most MAX_TRACKED_JOINS distance calls instead of
+    rescoring the whole cohort. """
+    def __init__(self):
+        self.users: deque[RaidUser] = deque()
+
+    def __evict(self, now: float):
+        while len(self.users) > 0 and (len(self.users) >= MAX_TRACKED_JOINS or now - self.users[0].joined > JOIN_WINDOW):
+            old = self.users.popleft()
+            # Unlink both ways, otherwise the users still in the window keep every evicted join reachable
+            for user in old.counted_by:
+                user.similar_to.discard(old)
+            for user in old.similar_to:
+                user.counted_by.discard(old)
+            old.counted_by.clear()
+            old.similar_to.clear()
+
+    def add(self, user: RaidUser):
+        now = time.time()
+        self.__evict(now)
+
+        user.joined = now
+        user.stripped_name = strip_numbers(user.name)
+        cutoff = len(user.stripped_name) // 2
+        for other in self.users:
+            # Same length window as calc_similar_counts, a pair can't be similar outside of it
+            shorter, longer = sorted((len(user.stripped_name), len(other.stripped_name)))
+            if longer > shorter * 2:
+                continue
+            other_cutoff = len(other.stripped_name) // 2
+            dist = distance(user.stripped_name, other.stripped_name, score_cutoff=max(cutoff, other_cutoff))
             if dist <= cutoff:
-                similar += 1
-                similar_dist += 1
-            if similar == upper_user_limit:
-                break
-        age = (datetime.now() - user.created).total_seconds()
-        similarity_score = (min(similar, upper_user_limit) / upper_user_limit) * 2
-        avatar_score = user.avatar == None and 1 or 0
-        age_score = 1 - (min(age, age_upper_limit) / age_upper_limit)
-        user.raid_score = ((similarity_score + avatar_score + age_score) / 4) * 100
-
-        #print(f'{user.name} - {user.raid_score} ({similarity_score} <{similar_dist}> : {avatar_score} : {age_score})')
+                user.similar_to.add(other)
+                other.counted_by.add(user)
+            if dist <= other_cutoff:
+                other.similar_to.add(user)
+                user.counted_by.add(other)
+        self.users.append(user)
+
+        upper_user_limit = int(len(self.users) / 3)
+        for member in self.users:
+            member.raid_score = float(raid_score(
+                member.similar,
+                upper_user_limit,
+                member.avatar == None and 1 or 0,
+                now - member.created.timestamp()
+            ))
+        return user
+
+    def suspects(self):
+        return [user for user in self.users if user.raid_score >= RAID_SCORE_THRESHOLD]
+
+    def is_raid(self):
+        return len(self.users) >= RAID_JOIN_COUNT and len(self.suspects()) >= RAID_SUSPECT_COUNT
+
+join_windows = Cache(JOIN_WINDOW, max_size=1000, name='raid_join_windows')
+lockdowns = Cache(LOCKDOWN_DURATION, name='raid_lockdowns')
 
 def load_test_data():
     from project.helpers.raidguard_test_data import raidguard_test_data
@@ -72,4 +209,48 @@ class RaidGuardModule(Module):
     def initialize(self):
         bot = self.bot
 
-        # TODO: Implement
\ No newline at end of file
+        async def remove_suspect(event: MemberJoinEvent, user: RaidUser):
+            try:
+                await event.server.kick(await event.server.getch_member(user.id))
+            except Exception as e:
+                print(f'Failed to remove raid suspect "{user.id}" from "{event.server_id}": {e}')
+
+        async def on_member_join(event: MemberJoinEvent):
+            member = event.member
+            if member.bot:
+                return
+            guild_data: dict = await self.get_guild_data(event.server_id)
+            config = guild_data.get('config', {})
+            if config.get('raid_guard', 0) != 1:
+                return
+
+            window: JoinWindow = join_windows.get(event.server_id)
+            if window is None:
+                window = JoinWindow()
+            join_windows.set(event.server_id, window) # Also keeps an active window from expiring
+
+            user = window.add(RaidUser(
+                member.id,
+                member.name,
+                member.avatar is not None and member.avatar.aws_url or None,
+                member.created_at
+            ))
+
+            if lockdowns.get(event.server_id):
+                if user.raid_score >= RAID_SCORE_THRESHOLD:
+                    await remove_suspect(event, user)
+            elif window.is_raid():
+                lockdowns.set(event.server_id, True)
+                suspects = window.suspects()
+
+                logs_channel_id = config.get('traffic_logs_channel')
+                if logs_channel_id:
+                    channel = await bot.getch_channel(logs_channel_id)
+                    await channel.send(embed=EMBED_TIMESTAMP_NOW(
+                        title='Raid Detected',
+                        description=f'{len(window.users)} members joined recently, {len(suspects)} of them look like part of a raid. Suspicious joins will be removed for the next {int(LOCKDOWN_DURATION / 60)} minutes.',
+                        colour=Colour.red(),
+                    ))
+                for suspect in suspects:
+                    await remove_suspect(event, suspect)
+        bot.join_listeners.append(on_member_join)
\ No newline at end of file
@@ -1,16 +1,13 @@
 from datetime import datetime
 from json import JSONEncoder
-from guilded import Colour, ChatChannel, Embed, BanDeleteEvent, BanCreateEvent, MemberJoinEvent, MessageReactionAddEvent, BulkMemberRolesUpdateEvent, ChatMessage, Server, User, Emote
+from guilded import Colour, ChatChannel, Embed, BanDeleteEvent, BanCreateEvent, MemberJoinEvent, MessageReactionAddEvent, BulkMemberRolesUpdateEvent, ChatMessage, Server, User, Emote, http
 from guilded.ext import commands
 from project.helpers.translator import translate
-from project.modules.base import Module
-from project import bot_config
+from project.modules.base import Module, MessageContext
 
-from project.helpers import social_links, user_evaluator, verif_token
+from project.helpers import localapi, social_links, user_evaluator, verif_token
 from project.helpers.embeds import *
 
-import requests
-
 encoder = JSONEncoder()
 member = commands.MemberConverter()
 channel = commands.ChatChannelConverter()
@@ -23,16 +20,14 @@ class VerificationModule(Module):
     name = "Verification"
 
     async def send_welcome_embed(self, server: Server, user: User):
-        guild_data = self.get_guild_data(server.id)
+        guild_data = await self.get_guild_data(server.id)
         config = guild_data.get('config', {})
         welcome_message: str = config.get('welcome_message', 'Hello {mention} and welcome to {server_name}!\n\nRemember to read the rules before interacting in this server!')
         welcome_image = config.get('welcome_image')
         welcome_channel_id = config.get('welcome_channel', server.default_channel_id)
         welcomer_enabled = config.get('use_welcome', 0)
 
-        user_data_req = requests.get(f'http://localhost:5000/userinfo/{server.id}/{user.id}', headers={
-            'authorization': bot_config.SECRET_KEY
-        })
+        user_data_req = await localapi.get(f'/userinfo/{server.id}/{user.id}')
         user_info = user_data_req.json()
         curLang = user_info.get('language', 'en')
 
@@ -61,10 +56,8 @@ class VerificationModule(Module):
     
     async def initiate_verification(self, server: Server, member: Member, channel: ChatChannel):
         token = verif_token.generate_token(server.id, member.id, await social_links.get_connections(server.id, member.id))
-        link = requests.post('http://localhost:5000/verify/shorten', json={
+        link = await localapi.post('/verify/shorten', json={
             'token': token
-        }, headers={
-            'authorization': bot_config.SECRET_KEY
         }).json()['result']
 
         em = Embed(
@@ -103,9 +96,7 @@ class VerificationModule(Module):
             """Verify with the bot"""
             if ctx.author.bot:
                 return
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{ctx.server.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{ctx.server.id}')
             guild_data: dict = guild_data_req.json()
             unverified_role = guild_data.get('config').get('unverified_role')
             verified_role = guild_data.get('config').get('verified_role')
@@ -133,15 +124,11 @@ class VerificationModule(Module):
             user = await self.convert_member(ctx, target)
             if user.bot:
                 pass # We know bots aren't real users lol
-            result = requests.patch(f'http://localhost:5000/verify/bypass/{ctx.server.id}/{user.id}', json={
+            result = await localapi.patch(f'/verify/bypass/{ctx.server.id}/{user.id}', json={
                 'value': True
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -159,15 +146,11 @@ class VerificationModule(Module):
             user = await self.convert_member(ctx, target)
             if user.bot:
                 pass # We know bots aren't real users lol
-            result = requests.patch(f'http://localhost:5000/verify/bypass/{ctx.server.id}/{user.id}', json={
+            result = await localapi.patch(f'/verify/bypass/{ctx.server.id}/{user.id}', json={
                 'value': False
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
 
-            user_data_req = requests.get(f'http://localhost:5000/userinfo/{ctx.server.id}/{ctx.author.id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            user_data_req = await localapi.get(f'/userinfo/{ctx.server.id}/{ctx.author.id}')
             user_info = user_data_req.json()
             curLang = user_info.get('language', 'en')
 
@@ -181,26 +164,22 @@ class VerificationModule(Module):
         async def on_member_join(event: MemberJoinEvent):
             if event.member.bot:
                 return
-            guild_data_req = requests.get(f'http://localhost:5000/guilddata/{event.server_id}', headers={
-                'authorization': bot_config.SECRET_KEY
-            })
+            guild_data_req = await localapi.get(f'/guilddata/{event.server_id}')
             guild_data: dict = guild_data_req.json()
             unverified_role = guild_data.get('config').get('unverified_role')
             verification_channel = guild_data.get('config').get('verification_channel')
             
             if verification_channel and verification_channel.isspace() is False and verification_channel != '':
                 # Only trigger these if verification is enabled, indicated by whether or not verification_channel is specified
-                user_data_req = requests.get(f'http://localhost:5000/userinfo/{event.server.id}/{event.member.id}', headers={
-                    'authorization': bot_config.SECRET_KEY
-                })
+                user_data_req = await localapi.get(f'/userinfo/{event.server.id}/{event.member.id}')
                 user_info = user_data_req.json()
                 curLang = user_info.get('language', 'en')
 
                 if unverified_role:
-                    requests.put(f'https://www.guilded.gg/api/v1/servers/{event.server_id}/members/{event.member.id}/roles/{unverified_role}',
-                    headers={
-                        'Authorization': f'Bearer {bot_config.GUILDED_BOT_TOKEN}'
-                    })
+                    try:
+                        await self.bot_api.request(http.Route('PUT', f'/servers/{event.server_id}/members/{event.member.id}/roles/{unverified_role}'))
+                    except Exception as e:
+                        print(f'Failed to give the unverified role in {event.server_id}: {e}')
                 if verification_channel:
                     channel: ChatChannel = await event.server.getch_channel(verification_channel)
                     em = Embed(
@@ -229,7 +208,7 @@ class VerificationModule(Module):
                 message = await event.channel.fetch_message(event.message_id)
                 if message.author_id == bot.user_id and len(message.embeds) > 0 and message.embeds[0].title == 'Verification':
                     member = await event.server.getch_member(event.member.id)
-                    guild_data = self.get_guild_data(event.server_id)
+                    guild_data = await self.get_guild_data(event.server_id)
                     unverified_role = guild_data.get('config').get('unverified_role')
                     verified_role = guild_data.get('config').get('verified_role')
                     member_roles = await member.fetch_role_ids()
@@ -245,31 +224,27 @@ class VerificationModule(Module):
         async def on_ban_create(event: BanCreateEvent):
             if event.ban.user.bot:
                 return
-            guild_data_req = requests.patch(f'http://localhost:5000/verify/setbanned/{event.server_id}/{event.ban.user.id}', json={
+            guild_data_req = await localapi.patch(f'/verify/setbanned/{event.server_id}/{event.ban.user.id}', json={
                 'value': True
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
         bot.ban_create_listeners.append(on_ban_create)
         
         async def on_ban_delete(event: BanDeleteEvent):
             if event.ban.user.bot:
                 return
-            guild_data_req = requests.patch(f'http://localhost:5000/verify/setbanned/{event.server_id}/{event.ban.user.id}', json={
+            guild_data_req = await localapi.patch(f'/verify/setbanned/{event.server_id}/{event.ban.user.id}', json={
                 'value': False
-            }, headers={
-                'authorization': bot_config.SECRET_KEY
             })
         bot.ban_delete_listeners.append(on_ban_delete)
         
-        async def on_message(message: ChatMessage):
+        async def on_message(message: ChatMessage, context: MessageContext):
             if message.author.bot:
                 return
-            guild_data = self.get_guild_data(message.server_id)
+            guild_data = await self.get_guild_data(message.server_id, context)
             verification_channel = guild_data.get('config').get('verification_channel')
             if verification_channel and message.channel_id == verification_channel:
                 member = await message.guild.getch_member(message.author.id)
-                if (await self.is_moderator(member)) or await self.user_can_manage_server(member):
+                if (await self.is_moderator(member, context)) or await self.user_can_manage_server(member):
                     return
                 if not message.content.startswith('/verify'):
                     if message.content.lower().startswith('/verify'):
@@ -288,7 +263,7 @@ class VerificationModule(Module):
         self.bot.message_listeners.append(on_message)
 
         async def on_bulk_member_roles_update(event: BulkMemberRolesUpdateEvent):
-            guild_data = self.get_guild_data(event.server_id)
+            guild_data = await self.get_guild_data(event.server_id)
             config = guild_data.get('config', {})
             unverified_role = config.get('unverified_role')
             verified_role = config.get('verified_role')
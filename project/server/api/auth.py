@@ -15,8 +15,8 @@ from datetime import datetime
 from werkzeug.exceptions import Forbidden
 from flask import Blueprint, request, jsonify, make_response
 from flask.views import MethodView
-from project import app, db, get_shared_state, BotAPI
-from project.helpers.Cache import Cache
+from project import app, db, BotAPI
+from project.helpers.SharedCache import SharedCache
 from project.helpers.images import *
 from guilded import Colour, http
 
@@ -27,11 +27,9 @@ REFRESH_TOKEN_EXPIRY = 60 * 60 * 24 * 14 # Refresh tokens expire after two weeks
 
 auth_blueprint = Blueprint('auth', __name__)
 
-shared_dict, shared_lock = get_shared_state(port=35794, key=b"auth_code")
-code_cache = Cache(60*10, shared_dict) # Codes expire after 10 minutes
+code_cache = SharedCache(60*10, name='auth_code') # Codes expire after 10 minutes
 
-shared_dict2, shared_lock2 = get_shared_state(port=35795, key=b"config_cache")
-config_cache = Cache(60*10, shared_dict2) # Config check caches expire after 10 minutes
+config_cache = SharedCache(60*10, name='config_check') # Config check caches expire after 10 minutes
 
 geoip_reader = geoip.Reader(os.getenv('GEOIP_DB', '/usr/share/GeoIP/GeoLite2-City.mmdb'))
 
@@ -5,6 +5,7 @@ from project import app, db
 from sqlalchemy import func
 
 from project.server.api.auth import get_user_auth
+from project.helpers.process_stats import get_process_stats
 from project.server.models import BotData, AnalyticsItem, Guild, GuildUser, UserInfo
 
 import os
@@ -361,6 +362,19 @@ class ServerCountResource(MethodView):
                 .count()
         }), 200
 
+class ProcessStatsResource(MethodView):
+    """ Get one section of the runtime stats of this worker and of the bot """
+    def __init__(self, section: str):
+        self.section = section
+
+    async def get(self):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        return jsonify(get_process_stats(self.section)), 200
+
 class BotDataResource(MethodView):
     """ Bot Data Resource """
     async def get(self, key):
@@ -439,6 +453,8 @@ data_blueprint.add_url_rule('/analytics/servers/largest', view_func=LargestServe
 data_blueprint.add_url_rule('/analytics/servers/unindexed', view_func=NoneServersResource.as_view('none_servers'))
 data_blueprint.add_url_rule('/analytics/servers/active', view_func=ActiveServersResource.as_view('active_servers'))
 data_blueprint.add_url_rule('/analytics/servers/count', view_func=ServerCountResource.as_view('server_count'))
+for section in ('caches', 'webhooks', 'guilded', 'assets'):
+    data_blueprint.add_url_rule(f'/analytics/{section}', view_func=ProcessStatsResource.as_view(f'{section}_stats', section))
 
 data_blueprint.add_url_rule('/analytics/servers', view_func=ServerAnalyticsResource.as_view('server_analytics'))
 data_blueprint.add_url_rule('/analytics/servers/<year>', view_func=ServerAnalyticsResource.as_view('server_analytics_y'))
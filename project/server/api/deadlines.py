@@ -0,0 +1,83 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask.views import MethodView
+from project import BotAPI, app, db
+from project.server.api.giveaways import endGiveaway
+from project.server.api.moderation import expire_status
+from project.server.models import Giveaway, GuildUserStatus
+
+deadlines_blueprint = Blueprint('deadlines', __name__)
+
+class DeadlinesResource(MethodView):
+    """ Resource for getting the status and giveaway deadlines up to a point in time """
+    async def get(self):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        until = datetime.fromtimestamp(float(request.args.get('until', datetime.now().timestamp())))
+
+        statuses = db.session.query(GuildUserStatus.internal_id, GuildUserStatus.ends_at) \
+            .filter(GuildUserStatus.ends_at <= until) \
+            .all()
+        giveaways = db.session.query(Giveaway.internal_id, Giveaway.ends_at) \
+            .filter(Giveaway.ended == False) \
+            .filter(Giveaway.ends_at <= until) \
+            .all()
+
+        return jsonify({
+            'result': [{
+                'type': 'status',
+                'id': id,
+                'ends_at': ends_at.timestamp()
+            } for id, ends_at in statuses] + [{
+                'type': 'giveaway',
+                'id': id,
+                'ends_at': ends_at.timestamp()
+            } for id, ends_at in giveaways]
+        }), 200
+
+class ExpireDeadlinesResource(MethodView):
+    """ Resource for handling the statuses and giveaways whose deadline was reached """
+    async def post(self):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        post_data: dict = request.get_json()
+        status_ids = post_data.get('status', [])
+        giveaway_ids = post_data.get('giveaway', [])
+        now = datetime.now()
+
+        # Deadlines can be moved after the scheduler was told about them, so only rows that are actually due are handled
+        statuses: list[GuildUserStatus] = len(status_ids) > 0 and GuildUserStatus.query \
+            .filter(GuildUserStatus.internal_id.in_(status_ids)) \
+            .filter(GuildUserStatus.ends_at <= now) \
+            .all() or []
+        giveaways: list[Giveaway] = len(giveaway_ids) > 0 and Giveaway.query \
+            .filter(Giveaway.internal_id.in_(giveaway_ids)) \
+            .filter(Giveaway.ended == False) \
+            .filter(Giveaway.ends_at <= now) \
+            .all() or []
+
+        with BotAPI() as bot_api:
+            for status in statuses:
+                try:
+                    await expire_status(bot_api, status)
+                except Exception as e:
+                    print(f'Failed to expire status "{status.internal_id}": {e}')
+        for giveaway in giveaways:
+            await endGiveaway(giveaway, False)
+            db.session.add(giveaway)
+        if len(statuses) > 0 or len(giveaways) > 0:
+            db.session.commit()
+
+        return jsonify({
+            'statuses': len(statuses),
+            'giveaways': len(giveaways)
+        }), 200
+
+deadlines_blueprint.add_url_rule('/deadlines', view_func=DeadlinesResource.as_view('deadlines'))
+deadlines_blueprint.add_url_rule('/deadlines/expire', view_func=ExpireDeadlinesResource.as_view('expire_deadlines'))
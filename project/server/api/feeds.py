@@ -1,53 +1,64 @@
-from datetime import datetime, timedelta
+from datetime import datetime
 import re
 from time import mktime
 from flask import Blueprint, request, jsonify
 from flask.views import MethodView
 from project import BotAPI, app, db
 from project.server.api.auth import get_user_auth
-from project.server.models import FeedData, Guild, GuildChannelConfig, GuildUser
+from project.server.api.images import proxy_image
+from project.server.models import FeedData, FeedState, Guild, GuildChannelConfig, GuildUser
+from project.helpers.seen_entries import SeenEntries, hash_entry
 from project.helpers.webhooks import post_webhook
 from guilded import Embed, Colour
 from guilded.embed import EmptyEmbed
 from markdownify import markdownify
 from werkzeug.exceptions import BadRequest
 
+import aiohttp
+import asyncio
 import feedparser
-import requests
 import project.helpers.token as token
 
 feeds_blueprint = Blueprint('feeds', __name__)
 
-async def send_feed(server_id: str, channel_id: str, entry: dict):
-    try:
-        timestamp = entry.get('published_parsed', entry.get('created_parsed'))
-        em = Embed(
-            title=entry['title'],
-            url=entry['link'],
-            timestamp=datetime.fromtimestamp(mktime(timestamp)) if timestamp != None else None,
-            description=markdownify(entry.get('summary', 'No summary provided.')),
-            colour=Colour.gilded()
+FEED_CONCURRENCY = 32
+FEED_CONCURRENCY_PER_HOST = 4
+FEED_TIMEOUT = 30
+FEED_COMMIT_BATCH = 100
+FEED_KNOWN_LIMIT = 1000 # Entry hashes remembered per URL, must be more than a feed lists at once
+
+def build_feed_embed(entry: dict):
+    timestamp = entry.get('published_parsed', entry.get('created_parsed'))
+    em = Embed(
+        title=entry['title'],
+        url=entry['link'],
+        timestamp=datetime.fromtimestamp(mktime(timestamp)) if timestamp != None else None,
+        description=markdownify(entry.get('summary', 'No summary provided.')),
+        colour=Colour.gilded()
+    )
+    if entry.get('author'):
+        em = em.set_author(
+            name=entry.get('author'),
+            url=entry.get('author_detail', {}).get('href', EmptyEmbed)
+        )
+    if entry.get('image', {}).get('href'):
+        t = token.encodeToken({
+            'url': entry['image']['href']
+        })
+        em = em.set_image(
+            url=f'https://api.serverguard.xyz/proxy/{t}'
+        )
+    elif len(entry.get('media_thumbnail', [])) > 0:
+        t = token.encodeToken({
+            'url': entry['media_thumbnail'][0]['url']
+        })
+        em = em.set_image(
+            url=f'https://api.serverguard.xyz/proxy/{t}'
         )
-        if entry.get('author'):
-            em = em.set_author(
-                name=entry.get('author'),
-                url=entry.get('author_detail', {}).get('href', EmptyEmbed)
-            )
-        if entry.get('image', {}).get('href'):
-            t = token.encodeToken({
-                'url': entry['image']['href']
-            })
-            em = em.set_image(
-                url=f'https://api.serverguard.xyz/proxy/{t}'
-            )
-        elif len(entry.get('media_thumbnail', [])) > 0:
-            t = token.encodeToken({
-                'url': entry['media_thumbnail'][0]['url']
-            })
-            em = em.set_image(
-                url=f'https://api.serverguard.xyz/proxy/{t}'
-            )
+    return em
 
+async def send_feed(server_id: str, channel_id: str, em: Embed):
+    try:
         print(f'Sending feed update to {server_id}/{channel_id} with payload: {em.to_dict()}')
 
         return await post_webhook(server_id, channel_id, 
@@ -303,6 +314,38 @@ class FeedConfig(MethodView):
             else:
                 return "Not Found", 404
 
+async def fetch_feed(session: aiohttp.ClientSession, state: FeedState):
+    """ Fetch and parse a feed, sending the validators from its last fetch.
+
+    Returns None if the feed did not change or could not be fetched. """
+    headers = {
+        'User-Agent': 'Guilded Server Guard/1.0 (Feed Reader)'
+    }
+    if state.etag:
+        headers['If-None-Match'] = state.etag
+    if state.last_modified:
+        headers['If-Modified-Since'] = state.last_modified
+
+    try:
+        async with session.get(state.url, headers=headers) as response:
+            if response.status == 304:
+                return None
+            if response.status != 200:
+                print(f'Failed to fetch feed "{state.url}": status {response.status}')
+                return None
+            content = await response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        result: feedparser.FeedParserDict = await asyncio.to_thread(feedparser.parse, content)
+    except Exception as e:
+        print(f'Failed to fetch feed "{state.url}": {e}')
+        return None
+
+    # Only remember the validators once the feed was parsed, so a failed parse is retried in full
+    state.etag = etag and etag[:500]
+    state.last_modified = last_modified and last_modified[:500]
+    return result
+
 class CheckFeeds(MethodView):
     """ Resource for checking guild RSS feeds """
     async def post(self):
@@ -310,58 +353,88 @@ class CheckFeeds(MethodView):
 
         if auth != app.config.get('SECRET_KEY'):
             return 'Forbidden.', 403
-        
-        checked_feeds = {}
-
-        feeds = GuildChannelConfig.query.filter(
-            GuildChannelConfig.type == 'feed'
-        ) \
-            .paginate(per_page=50)
-        for _ in feeds.iter_pages():
-            contents = feeds.items
-            for feed in contents:
-                feed: GuildChannelConfig
-                result: feedparser.FeedParserDict
-                if feed.value.get('url'):
-                    # This item is a custom RSS feed from a more flexible feed item
-                    result = checked_feeds.get(feed.value['url'])
-                    if result == None:
-                        result = feedparser.parse(feed.value['url'], modified=datetime.fromtimestamp((datetime.now() - timedelta(minutes=30)).timestamp()))
-                        checked_feeds[feed.value['url']] = result
+
+        feeds: list[GuildChannelConfig] = GuildChannelConfig.query \
+            .filter(GuildChannelConfig.type == 'feed') \
+            .all()
+        feed_ids = set(feed.value['id'] for feed in feeds if not feed.value.get('url'))
+        feed_datas: dict[str, FeedData] = len(feed_ids) > 0 and {
+            data.id: data for data in FeedData.query.filter(FeedData.id.in_(feed_ids)).all()
+        } or {}
+
+        # Every URL is fetched once no matter how many channels subscribe to it
+        subscribers: dict[str, list[GuildChannelConfig]] = {}
+        for feed in feeds:
+            if feed.value.get('url'):
+                # This item is a custom RSS feed from a more flexible feed item
+                url = feed.value['url']
+            else:
+                # It's a normal feed item
+                feedData = feed_datas.get(feed.value['id'])
+                if feedData == None:
+                    continue
+                url = feedData.url
+            subscribers.setdefault(url, []).append(feed)
+
+        states: dict[str, FeedState] = len(subscribers) > 0 and {
+            state.url: state for state in FeedState.query.filter(FeedState.url.in_(list(subscribers.keys()))).all()
+        } or {}
+        for url in subscribers:
+            if url not in states:
+                states[url] = FeedState(url)
+
+        async with aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=FEED_CONCURRENCY, limit_per_host=FEED_CONCURRENCY_PER_HOST),
+            timeout=aiohttp.ClientTimeout(total=FEED_TIMEOUT)
+        ) as session:
+            results = await asyncio.gather(*[fetch_feed(session, states[url]) for url in subscribers])
+
+        now = datetime.now()
+        pending = 0
+        for url, result in zip(subscribers, results):
+            state = states[url]
+            state.checked_at = now
+            db.session.add(state)
+            pending += 1
+
+            if result != None:
+                if state.known == None:
+                    # Carry over what channels saw before entries were tracked per URL
+                    seen = SeenEntries(FEED_KNOWN_LIMIT, [hash_entry(id) for feed in subscribers[url] for id in feed.value.get('known', [])])
                 else:
-                    # It's a normal feed item
-                    result = checked_feeds.get(feed.value['id'])
-                    if result == None:
-                        feedData: FeedData = FeedData.query.filter(
-                            FeedData.id == feed.value['id']
-                        ).first()
-                        if feedData != None:
-                            result = feedparser.parse(feedData.url, modified=datetime.fromtimestamp((datetime.now() - timedelta(minutes=30)).timestamp()))
-                            checked_feeds[feed.value['id']] = result
-                if result != None:
-                    knownIDs = feed.value.get('known', [])
-                    newKnown = []
-                    for item in result['entries']:
-                        if not item['id'] in knownIDs:
-                            await send_feed(feed.guild_id, feed.channel_id, item)
-                        newKnown.append(item['id'])
-                    feed.value['known'] = newKnown
-                    db.session.add(feed)
-                    db.session.commit()
+                    seen = SeenEntries.from_bytes(FEED_KNOWN_LIMIT, state.known)
+
+                # Feeds list their newest entries first, add the oldest first so they are evicted first
+                new_entries = [item for item in reversed(result['entries']) if seen.add(item.get('id') or item.get('link', ''))]
+                state.known = seen.to_bytes()
+                embeds = []
+                for item in new_entries:
+                    try:
+                        embeds.append(build_feed_embed(item))
+                    except Exception as e:
+                        print(f'Failed to build feed update for "{url}": {str(e)}')
+
+                # Queued all at once so the dispatcher can merge each channel's updates into one message
+                await asyncio.gather(*[
+                    send_feed(feed.guild_id, feed.channel_id, em) for feed in subscribers[url] for em in embeds
+                ])
+                for feed in subscribers[url]:
+                    if 'known' in feed.value:
+                        del feed.value['known']
+                        db.session.add(feed)
+                        pending += 1
+
+            if pending >= FEED_COMMIT_BATCH:
+                db.session.commit()
+                pending = 0
+        db.session.commit()
         return 'Success', 200
 
 class Proxy(MethodView):
     async def get(self, proxy: str):
         try:
             result = token.decodeToken(proxy)
-            response = requests.get(result['url'], headers={
-                'User-Agent': 'Guilded Server Guard/1.0 (Image Proxy)'
-            }, stream=True)
-            try:
-                response.headers.pop('Transfer-Encoding')
-            except:
-                pass
-            return (response.raw.read(), response.status_code, response.headers.items())
+            return await proxy_image(result['url'])
         except:
             return 'Forbidden', 403
 
@@ -5,6 +5,7 @@ from flask.views import MethodView
 from project import BotAPI, app, db
 from guilded import Embed, Colour
 from project.server.api.auth import get_user_auth
+from project.helpers import deadlines
 
 from project.server.models import Giveaway, Guild, GuildUser
 
@@ -235,6 +236,7 @@ class GiveawayResource(MethodView):
         )
         db.session.add(giveaway)
         db.session.commit()
+        deadlines.notify('giveaway', giveaway.internal_id, giveaway.ends_at)
         return 'Success', 200
     async def patch(self, server_id: str, giveaway_id: str):
         auth = request.headers.get('authorization')
@@ -291,6 +293,7 @@ class GiveawayResource(MethodView):
                     )
                     db.session.add(giveaway)
                     db.session.commit()
+                    deadlines.notify('giveaway', giveaway.internal_id, giveaway.ends_at)
                 return 'Success', 200
         else:
             return 'Not Found', 404
@@ -1,121 +1,160 @@
-import binascii
-import io
+import asyncio
 import math
-import numpy as np
-import scipy
-import scipy.misc
-import scipy.cluster
-import scipy.stats
-import requests
 
 from datetime import datetime, timedelta
 from json import JSONDecoder, JSONEncoder
-from flask import Blueprint, request, jsonify, render_template
+from flask import Blueprint, Response, request, jsonify, render_template
 from flask.views import MethodView
 from project import app, BotAPI, db
 from project.server.models import Guild, GuildUser, UserInfo
 from project.helpers.premium import get_user_premium_status
+from project.helpers.image_assets import get_image_asset
+from project.helpers.rank_card import AVATAR_SIZE, CARD_SIZE, render_rank_card
+from project.server.api.images import DEFAULT_RESOURCES
 from guilded import SocialLinkType, http
 from humanfriendly import format_number
 from sqlalchemy import func
-from PIL import Image
 
 encoder = JSONEncoder()
 decoder = JSONDecoder()
 
 guilds_blueprint = Blueprint('guilds', __name__)
 
-def get_dominant_color(image: Image.Image):
-    """ Get the dominant color of the image """
-    image = image.resize((150, 150))
-    ar = np.asarray(image)
-    shape = ar.shape
-    ar = ar.reshape(scipy.product(shape[:2]), shape[2]).astype(float)
-    
-    codes, dist = scipy.cluster.vq.kmeans(ar, 5)
-    
-    vecs, dist = scipy.cluster.vq.vq(ar, codes)
-    counts, bins = np.histogram(vecs, len(codes))
-    
-    index_max = np.argmax(counts)
-    peak = codes[index_max]
-    colour = binascii.hexlify(bytearray(int(c) for c in peak)).decode('ascii')
-    return colour
+USER_INFO_MAX_AGE = timedelta(days=1)
+USER_INFO_STALE_LIMIT = timedelta(days=7) # Past this the request waits for a refresh instead of the batch job
+USER_INFO_BATCH_SIZE = 25
+USER_INFO_MAX_BATCH = 100
+USER_INFO_BATCH_SECONDS = 15 # Well under gunicorn's 30 second worker timeout, whatever the batch size
+USER_INFO_CONCURRENCY = 10
+
+async def get_social_links(bot_api: http.HTTPClient, guild_id: str, user_id: str):
+    connections = {}
+    try:
+        profile: dict = await bot_api.request(http.Route('GET', f'/users/{user_id}/profilev3', override_base=http.Route.USER_BASE))
+        for t in profile.get('socialLinks'):
+            connections[t['type']] = {
+                'handle': t['handle'],
+                'serviceId': t['serviceId']
+            }
+    except:
+        # Fallback to Bot API method if the other method don't work, probing every type at once
+        if guild_id is None:
+            return connections
+        types = list(dict.fromkeys(t.value for t in SocialLinkType)) # Skip any aliases
+        links = await asyncio.gather(*[bot_api.get_member_social_links(guild_id, user_id, t) for t in types], return_exceptions=True)
+        for t, link in zip(types, links):
+            if isinstance(link, Exception):
+                continue # Silently error
+            link: dict = link['socialLink']
+            connections[t] = {
+                'handle': link.get('handle'),
+                'serviceId': link.get('service_id', link.get('serviceId'))
+            }
+    return connections
+
+def get_managed_guilds(user_ids: list):
+    """ Get the active guilds each user can manage, with a single query for every user """
+    guilds = {user_id: [] for user_id in user_ids}
+    rows = db.session.query(GuildUser.user_id, Guild) \
+        .join(Guild, Guild.guild_id == GuildUser.guild_id) \
+        .filter(GuildUser.user_id.in_(user_ids)) \
+        .filter(GuildUser.permission_level > 2) \
+        .filter(Guild.active == True) \
+        .all()
+    for user_id, guild in rows:
+        guild: Guild
+        guilds[user_id].append({
+            'id': guild.guild_id,
+            'name': guild.name,
+            'profilePicture': guild.avatar,
+        })
+    return guilds
+
+async def refresh_user_info(bot_api: http.HTTPClient, guild_id: str, user_id: str, user: UserInfo=None, guilds: list=None):
+    """ Fetch a user's profile, social links and premium status into their UserInfo, without committing """
+    from project.server.api.verification import SOCIAL_KINDS, set_ban_fingerprints
+
+    connections, guild_user, premium = await asyncio.gather(
+        get_social_links(bot_api, guild_id, user_id),
+        bot_api.get_user(user_id),
+        get_user_premium_status(user_id)
+    )
+    guild_user: dict = guild_user.get('user')
+
+    socials = {}
+    if user is None:
+        user = UserInfo(user_id, guild_user, connections, guilds if guilds is not None else {}, premium)
+    else:
+        socials = {kind: getattr(user, kind) for kind in SOCIAL_KINDS}
+        user.last_updated = datetime.now()
+        UserInfo.update_user_data(user, guild_user)
+        UserInfo.update_connections(user, connections)
+        if guilds is not None:
+            UserInfo.update_guilds(user, guilds)
+        user.premium = str(premium)
+    db.session.add(user)
+
+    # Bans are matched on the accounts linked when they were stored, so they follow any change
+    if any(getattr(user, kind) != socials.get(kind) for kind in SOCIAL_KINDS):
+        for db_user in GuildUser.query.filter_by(user_id = user_id, is_banned = True).all():
+            set_ban_fingerprints(db_user, user)
+    return user
 
 async def get_user_info(guild_id: str, user_id: str):
     with BotAPI() as bot_api:
         user: UserInfo = UserInfo.query.filter(UserInfo.user_id == user_id).first()
-        update_user = False
-
-        if user is None:
-            update_user = True
-        else:
-            if datetime.now() > user.last_updated + timedelta(days=1):
-                update_user = True
-                user.last_updated = datetime.now()
-        
-        if update_user:
-            connections = {}
-
-            try:
-                profile: dict = await bot_api.request(http.Route('GET', f'/users/{user_id}/profilev3', override_base=http.Route.USER_BASE))
-                for t in profile.get('socialLinks'):
-                    connections[t['type']] = {
-                        'handle': t['handle'],
-                        'serviceId': t['serviceId']
-                    }
-            except:
-                # Fallback to Bot API method if the other method don't work
-                for t in SocialLinkType:
-                    if connections.get(t.value): # Skip any aliases that were already handled
-                        pass
-                    try:
-                        link: dict = (await bot_api.get_member_social_links(guild_id, user_id, t.value))['socialLink']
-                        connections[t.value] = {
-                            'handle': link.get('handle'),
-                            'serviceId': link.get('service_id', link.get('serviceId'))
-                        }
-                    except Exception as e:
-                        pass # Silently error
-            
-            guild_user: dict = (await bot_api.get_user(user_id)).get('user')
 
+        # Stale users are left to the refresh job, unless it has fallen far behind
+        if user is None or datetime.now() > user.last_updated + USER_INFO_STALE_LIMIT:
             try:
-                guild_members = GuildUser.query.filter_by(user_id = user_id).all()
-                guilds: list = []
-                for member in guild_members:
-                    member: GuildUser
-                    guild: Guild = Guild.query.filter(Guild.guild_id == member.guild_id).first()
-                    if guild and member.permission_level > 2 and guild.active:
-                        guilds.append({
-                            'id': guild.guild_id,
-                            'name': guild.name,
-                            'profilePicture': guild.avatar,
-                        })
-                # guilds: list = (await bot_api.request(http.Route('GET', f'/users/{user_id}/teams', override_base=http.Route.USER_BASE))).get('teams', [])
+                guilds = get_managed_guilds([user_id])[user_id]
             except Exception as e:
                 print(e)
                 print('Failed to get guilds')
-                # Fallback to an empty dict if not possible, or to None if we are updating
-                if user is None:
-                    guilds: list = {}
-                else:
-                    guilds = None
-
-            premium = await get_user_premium_status(user_id)
-
-            if user is None:
-                user = UserInfo(user_id, guild_user, connections, guilds, premium)
-            else:
-                UserInfo.update_user_data(user, guild_user)
-                UserInfo.update_connections(user, connections)
-                if guilds is not None:
-                    UserInfo.update_guilds(user, guilds)
-                user.premium = str(premium)
-            db.session.add(user)
+                guilds = None
+            user = await refresh_user_info(bot_api, guild_id, user_id, user, guilds)
             db.session.commit()
         return user
 
+async def refresh_stale_users(limit: int=USER_INFO_BATCH_SIZE):
+    """ Refresh the users whose info is the oldest, returns how many were refreshed """
+    users: list[UserInfo] = UserInfo.query \
+        .filter(UserInfo.last_updated < datetime.now() - USER_INFO_MAX_AGE) \
+        .order_by(UserInfo.last_updated.asc()) \
+        .limit(limit) \
+        .all()
+    if len(users) == 0:
+        return 0
+    user_ids = [user.user_id for user in users]
+
+    guilds = get_managed_guilds(user_ids)
+    # Any guild the user shares with the bot will do for the social link fallback
+    member_guilds = dict(
+        db.session.query(GuildUser.user_id, func.min(GuildUser.guild_id)) \
+            .filter(GuildUser.user_id.in_(user_ids)) \
+            .group_by(GuildUser.user_id) \
+            .all()
+    )
+
+    semaphore = asyncio.Semaphore(USER_INFO_CONCURRENCY)
+    async def refresh(user: UserInfo):
+        async with semaphore:
+            try:
+                await refresh_user_info(bot_api, member_guilds.get(user.user_id), user.user_id, user, guilds[user.user_id])
+            except Exception as e:
+                print(f'Failed to refresh the info of {user.user_id}: {e}')
+                user.last_updated = datetime.now() # Retried once the others had their turn
+
+    with BotAPI() as bot_api:
+        tasks = {asyncio.create_task(refresh(user)): user for user in users}
+        _, pending = await asyncio.wait(tasks, timeout=USER_INFO_BATCH_SECONDS)
+        for task in pending:
+            task.cancel()
+            tasks[task].last_updated = datetime.now() # Too slow this time, retried once the others had their turn
+        await asyncio.gather(*pending, return_exceptions=True)
+    db.session.commit()
+    return len(users)
+
 def human_format(num):
     num = float('{:.3g}'.format(num))
     magnitude = 0
@@ -130,30 +169,70 @@ def getLevel(xp: int):
 def getXP(level: int):
     return level < 0 and -math.pow(level - 1, 2) or math.pow(level - 1, 2)
 
+def get_guild_user_rank(guild_id: str, user_id: str):
+    """ Get a member's xp and their rank by xp within the guild, None if they have no row """
+    query = db.session.query(GuildUser,
+        func.rank() \
+            .over(
+                order_by=GuildUser.xp.desc(),
+                partition_by=GuildUser.guild_id
+            ) \
+            .label('rank')
+        ) \
+        .filter(GuildUser.guild_id == guild_id) \
+        .subquery()
+    return db.session.query(query) \
+        .filter(query.c.user_id == user_id) \
+        .first()
+
+async def get_rank_card(guild_id: str, user_id: str):
+    """ Get what a rank card shows, and the banner it is drawn on, both None if the user is not in the guild """
+    guild_user = get_guild_user_rank(guild_id, user_id)
+    if guild_user == None:
+        return None, None
+    user = await get_user_info(guild_id, user_id)
+    banner = f'https://api.serverguard.xyz/resources/user/{user_id}/banner'
+    background = await get_image_asset(banner, CARD_SIZE, DEFAULT_RESOURCES['banner'])
+    dominant_color = f'#{background.dominant_color}'
+    
+    status = '#747f8d'
+    
+    level = getLevel(guild_user.xp)
+    cur_level_xp = getXP(level)
+    next_level_xp = getXP(level + 1)
+    
+    formatted_exp, formatted_total_exp = human_format(int(guild_user.xp)), human_format(next_level_xp)
+    exp_percent = int(((guild_user.xp - cur_level_xp) / (next_level_xp - cur_level_xp)) * 100)
+    
+    return dict(username=user.name, profile_picture=user.avatar, rank=guild_user.rank, status=status, experience=formatted_exp, exp_to_level=formatted_total_exp, exp_percent=exp_percent, background=banner, level=level, exp=formatted_exp, dominant_color=dominant_color), background.image
+
 class RankCardAPI(MethodView):
     """ Rank Card Resource """
     
     async def get(self, guild_id: int, user_id: int):
-        user = await get_user_info(guild_id, user_id)
-        guild_user = requests.get(f'http://localhost:5000/getguilduser/{guild_id}/{user_id}/xp', headers={
-            'authorization': app.config.get('SECRET_KEY')
-        }).json()
-        banner = f'https://api.serverguard.xyz/resources/user/{user_id}/banner'
-        image = Image.open(
-            io.BytesIO( ( requests.get(banner, stream=True) ).content )
+        card, _ = await get_rank_card(guild_id, user_id)
+        if card == None:
+            return 'Not found', 404
+        return render_template('rank_card.html', levelup=request.args.get('levelup', 'hide'), **card)
+
+class RankCardImageAPI(MethodView):
+    """ Rank Card Image Resource, the rank card drawn with Pillow instead of a browser """
+
+    async def get(self, guild_id: str, user_id: str):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        card, background = await get_rank_card(guild_id, user_id)
+        if card == None:
+            return 'Not found', 404
+        avatar = await get_image_asset(card['profile_picture'] or DEFAULT_RESOURCES['avatar'], AVATAR_SIZE, DEFAULT_RESOURCES['avatar'])
+        image = await asyncio.to_thread(render_rank_card,
+            card['username'], avatar.image, background, card['rank'], card['level'], card['experience'], card['exp_to_level'],
+            card['exp_percent'], card['dominant_color'], request.args.get('levelup', 'hide') == 'show'
         )
-        dominant_color = f'#{get_dominant_color(image)}'
-        
-        status = '#747f8d'
-        
-        level = getLevel(guild_user['xp'])
-        cur_level_xp = getXP(level)
-        next_level_xp = getXP(level + 1)
-        
-        formatted_exp, formatted_total_exp = human_format(int(guild_user['xp'])), human_format(next_level_xp)
-        exp_percent = int(((guild_user['xp'] - cur_level_xp) / (next_level_xp - cur_level_xp)) * 100)
-        
-        return render_template('rank_card.html', username=user.name, levelup=request.args.get('levelup', 'hide'), profile_picture=user.avatar, rank=guild_user['rank'], status=status, experience=formatted_exp, exp_to_level=formatted_total_exp, exp_percent=exp_percent, background=banner, level=level, exp=formatted_exp, dominant_color=dominant_color)
+        return Response(image, mimetype='image/png')
 
 class UserInfoResource(MethodView):
     """ User Info Resource """
@@ -204,6 +283,21 @@ class UserInfoResource(MethodView):
             
             return 'Success', 200
 
+class UserInfoRefreshResource(MethodView):
+    """ Refresh a batch of the users whose info is the most out of date """
+    async def post(self):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        limit = min(max(request.args.get('limit', USER_INFO_BATCH_SIZE, type=int), 1), USER_INFO_MAX_BATCH)
+        refreshed = await refresh_stale_users(limit)
+        return jsonify({
+            'refreshed': refreshed,
+            'more': refreshed >= limit # A full batch means there might be more waiting
+        }), 200
+
 class GetGuildUser(MethodView):
     def get(self, guild_id, user_id):
         auth = request.headers.get('authorization')
@@ -268,19 +362,7 @@ class UpdateGuildUserXP(MethodView):
         if auth != app.config.get('SECRET_KEY'):
             return 'Forbidden.', 403
         
-        query = db.session.query(GuildUser,
-            func.rank() \
-                .over(
-                    order_by=GuildUser.xp.desc(),
-                    partition_by=GuildUser.guild_id
-                ) \
-                .label('rank')
-            ) \
-            .filter(GuildUser.guild_id == guild_id) \
-            .subquery()
-        db_user = db.session.query(query) \
-            .filter(query.c.user_id == user_id) \
-            .first()
+        db_user = get_guild_user_rank(guild_id, user_id)
         
         if db_user == None:
             return 'Not found', 404
@@ -289,6 +371,33 @@ class UpdateGuildUserXP(MethodView):
             'xp': db_user.xp,
             'rank': db_user.rank
         }), 200
+
+class UpdateGuildUsersXP(MethodView):
+    def patch(self):
+        auth = request.headers.get('authorization')
+
+        if auth != app.config.get('SECRET_KEY'):
+            return 'Forbidden.', 403
+
+        post_data: dict = request.get_json()
+        xp = {f'{item["guild_id"]}/{item["user_id"]}': (item['guild_id'], item['user_id'], int(item['xp'])) for item in post_data.get('users', [])}
+        if len(xp) == 0:
+            return jsonify({'previous': {}}), 200
+
+        db_users: list[GuildUser] = GuildUser.query.filter(GuildUser.internal_id.in_(list(xp.keys()))).all()
+        previous = {}
+        for db_user in db_users:
+            previous[db_user.internal_id] = db_user.xp
+            db_user.xp = xp[db_user.internal_id][2]
+        for internal_id, (guild_id, user_id, value) in xp.items():
+            if internal_id not in previous:
+                db_user = GuildUser(guild_id, user_id)
+                db_user.xp = value
+                db.session.add(db_user)
+        db.session.commit()
+        return jsonify({
+            'previous': previous
+        }), 200
         
 
 class GuildData(MethodView):
@@ -304,7 +413,8 @@ class GuildData(MethodView):
             return jsonify({
                 'guild_id': guild.guild_id,
                 'premium': guild.premium,
-                'config': guild.config
+                'config': guild.config,
+                'config_version': guild.config_version or 0
             }), 200
         else:
             guild = Guild(guild_id)
@@ -315,7 +425,8 @@ class GuildData(MethodView):
             return jsonify({
                 'guild_id': guild.guild_id,
                 'premium': guild.premium,
-                'config': guild.config
+                'config': guild.config,
+                'config_version': guild.config_version or 0
             }), 201
     def patch(self, guild_id):
         auth = request.headers.get('authorization')
@@ -342,7 +453,8 @@ class GuildData(MethodView):
         return jsonify({
             'guild_id': guild.guild_id,
             'premium': guild.premium,
-            'config': guild.config
+            'config': guild.config,
+            'config_version': guild.config_version or 0
         }), 200
     def delete(self, guild_id):
         auth = request.headers.get('authorization')
@@ -483,8 +595,10 @@ class GuildConfig(MethodView):
         return jsonify({'message': 'Success'}), 200
 
 guilds_blueprint.add_url_rule('/userinfo/<guild_id>/<user_id>', view_func=UserInfoResource.as_view('userinfo_guildscope'))
+guilds_blueprint.add_url_rule('/userinfo/refresh', view_func=UserInfoRefreshResource.as_view('userinfo_refresh'))
 guilds_blueprint.add_url_rule('/getguilduser/<guild_id>/<user_id>', view_func=GetGuildUser.as_view('getguilduser'))
 guilds_blueprint.add_url_rule('/getguilduser/<guild_id>/<user_id>/xp', view_func=UpdateGuildUserXP.as_view('updateguilduserxp'))
+guilds_blueprint.add_url_rule('/guildusers/xp', view_func=UpdateGuildUsersXP.as_view('updateguildusersxp'))
 guilds_blueprint.add_url_rule('/guilddata/<guild_id>', view_func=GuildData.as_view('guilddata'))
 guilds_blueprint.add_url_rule('/guilddata/<guild_id>/cfg/<item>', view_func=GuildConfig.as_view('guildconfig'))
 guilds_blueprint.add_url_rule('/rankcard/<guild_id>/<user_id>', view_func=RankCardAPI.as_view('rankcard'))
\ No newline at end of file
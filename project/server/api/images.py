@@ -11,29 +11,41 @@ USER_RESOURCE_MAP = {
     'banner': 'profileBannerLg',
 }
 
-import io
-import random
-import string
-import requests
+import hashlib
 
-from flask import Blueprint, request, send_file, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask.views import MethodView
-from project import BotAPI, app, get_shared_state
+from project import BotAPI, app
 from werkzeug.exceptions import Forbidden, NotFound
-from project.helpers.Cache import Cache
+from project.helpers.SharedCache import SharedCache
+from project.helpers.guilded_client import get_session
+from project.helpers.io_loop import on_io_loop
 
 images_blueprint = Blueprint('images', __name__)
 
-shared_serving, shared_serving_lock = get_shared_state(port=35796, key=b"serving")
-serving_cache = Cache(60 * 5, shared_serving) # Cache images to be served to guilded for 5 minutes
+SERVE_EXPIRY = 60 * 5
+serving_cache = SharedCache(SERVE_EXPIRY, name='serving') # Cache images to be served to guilded for 5 minutes
 
-def serve_file(file: str):
-    # generate an ID
-    id = "".join(random.choices(string.ascii_letters, k=15))
+def serve_file(file: bytes):
+    # Images are addressed by their content, so the id doubles as the ETag and
+    # serving the same image twice reuses the entry
+    id = hashlib.sha256(file).hexdigest()[:32]
 
     serving_cache.set(id, file)
     return id
 
+# The body is already decompressed and its length is set again by Flask
+PROXY_SKIPPED_HEADERS = ('transfer-encoding', 'content-encoding', 'content-length', 'connection')
+
+@on_io_loop
+async def proxy_image(url: str):
+    async with get_session().get(url, headers={
+        'User-Agent': 'Guilded Server Guard/1.0 (Image Proxy)'
+    }) as response:
+        body = await response.read()
+        headers = [(key, value) for key, value in response.headers.items() if key.lower() not in PROXY_SKIPPED_HEADERS]
+        return (body, response.status, headers)
+
 class ProxyServerImage(MethodView):
     """ Resource for proxying Guilded server-related image resources """
     async def get(self, server_id: str, resource: str):
@@ -58,14 +70,7 @@ class ProxyServerImage(MethodView):
                         url = url.replace('-Hero.png', '-SmallBlurred.jpg')
                         # Only banners to my knowledge have blurred versions so ignore other resources
 
-                response = requests.get(url, headers={
-                'User-Agent': 'Guilded Server Guard/1.0 (Image Proxy)'
-                }, stream=True)
-                try:
-                    response.headers.pop('Transfer-Encoding')
-                except:
-                    pass
-                return (response.raw.read(), response.status_code, response.headers.items())
+                return await proxy_image(url)
             except:
                 raise NotFound('Server not found or bot not in server')
 
@@ -99,14 +104,7 @@ class ProxyUserImage(MethodView):
                         url = url.replace('-Hero.png', '-SmallBlurred.jpg')
                         # Only banners to my knowledge have blurred versions so ignore other resources
 
-                response = requests.get(url, headers={
-                'User-Agent': 'Guilded Server Guard/1.0 (Image Proxy)'
-                }, stream=True)
-                try:
-                    response.headers.pop('Transfer-Encoding')
-                except:
-                    pass
-                return (response.raw.read(), response.status_code, response.headers.items())
+                return await proxy_image(url)
             except NotFound:
                 raise NotFound('User not found or bot not in server')
             except Exception as e:
@@ -115,12 +113,15 @@ class ProxyUserImage(MethodView):
 class ServeImage(MethodView):
     """ Resource for serving images from the cache """
     async def get(self, image_id: str):
-        cache_item: str = serving_cache.get(image_id)
+        cache_item: bytes = serving_cache.get(image_id)
         if cache_item is not None:
-            cache_item = bytes.fromhex(cache_item)
-            mem = io.BytesIO(cache_item)
-            mem.seek(0)
-            return send_file(mem, mimetype='image/png', as_attachment=True, download_name=f'{image_id}.png')
+            response = Response(cache_item, mimetype='image/png')
+            response.headers['Content-Disposition'] = f'attachment; filename={image_id}.png'
+            response.set_etag(image_id)
+            response.cache_control.public = True
+            response.cache_control.max_age = SERVE_EXPIRY
+            response.cache_control.immutable = True
+            return response.make_conditional(request)
         else:
             raise NotFound('Image not found')
     async def post(self):
@@ -128,7 +129,11 @@ class ServeImage(MethodView):
 
         if auth != app.config.get('SECRET_KEY'):
             return 'Forbidden.', 403
-        id = serve_file(request.get_json()['file'])
+        if request.is_json:
+            file = bytes.fromhex(request.get_json()['file']) # Older callers still send hex encoded JSON
+        else:
+            file = request.get_data()
+        id = serve_file(file)
         print(f'Serving image with ID {id}')
         return jsonify({'id': id}), 200
 
@@ -3,10 +3,10 @@ from flask import Blueprint, request, jsonify
 from flask.views import MethodView
 from project import BotAPI, app, db
 from project.server.models import Guild, GuildUserStatus
+from project.helpers import deadlines
 from guilded import Embed, Colour
 
 import re
-import requests
 
 WARNING_ID_REGEX = '^%s/%s/warning/' + r'([a-zA-Z]+)'
 REMINDER_ID_REGEX = '^%s/%s/reminder/' + r'([a-zA-Z]+)'
@@ -122,6 +122,7 @@ class UserWarnings(MethodView):
 
             db.session.add(warning)
             db.session.commit()
+            deadlines.notify('status', warning.internal_id, warning.ends_at)
 
             return jsonify({
                 'warn_id': warn_id
@@ -154,6 +155,7 @@ class UserTempBans(MethodView):
 
                 db.session.add(ban)
                 db.session.commit()
+                deadlines.notify('status', ban.internal_id, ban.ends_at)
 
                 return 'Success', 201
         else:
@@ -249,6 +251,7 @@ class UserMutes(MethodView):
 
                 db.session.add(mute)
                 db.session.commit()
+                deadlines.notify('status', mute.internal_id, mute.ends_at)
 
                 return 'Success', 201
         else:
@@ -313,6 +316,69 @@ class UserMutes(MethodView):
         else:
             return 'Not found', 404
 
+async def expire_status(bot_api, status: GuildUserStatus):
+    """ Undo a status whose end time has been reached and remove it """
+    guild: Guild = Guild.query.filter_by(guild_id = status.guild_id).first()
+    logs_channel = guild.config.get('action_logs_channel', guild.config.get('logs_channel'))
+    if status.type == 'ban':
+        try:
+            await bot_api.unban_server_member(status.guild_id, status.user_id)
+        except Exception as e:
+            print(f'Failed to unban user "{status.user_id}" from guild "{status.guild_id}"')
+        if guild.config.get('logs_channel'):
+            em = Embed(
+                title = 'Ban ended',
+                colour = Colour.blue(),
+                timestamp = datetime.now()
+            )
+            em.add_field(name='User', value=f'<@{status.user_id}>')
+            em.add_field(name='Ban Reason', value=status.value['reason'])
+            await bot_api.create_channel_message(logs_channel, payload={
+                'embeds': [em.to_dict()]
+            })
+    elif status.type == 'mute':
+        if guild.config.get('mute_role'):
+            try:
+                await bot_api.remove_role_from_member(status.guild_id, status.user_id, guild.config['mute_role'])
+            except Exception as e:
+                print(f'Failed to unmute user "{status.user_id}" from guild "{status.guild_id}"')
+        if guild.config.get('logs_channel'):
+            em = Embed(
+                title = 'Mute ended',
+                colour = Colour.blue(),
+                timestamp = datetime.now()
+            )
+            em.add_field(name='User', value=f'<@{status.user_id}>')
+            em.add_field(name='Mute Reason', value=status.value['reason'])
+            await bot_api.create_channel_message(logs_channel, payload={
+                'embeds': [em.to_dict()]
+            })
+    elif status.type == 'warning':
+        if guild.config.get('logs_channel'):
+            em = Embed(
+                title = 'Warning ended',
+                colour = Colour.blue(),
+                timestamp = datetime.now()
+            )
+            em.add_field(name='User', value=f'<@{status.user_id}>')
+            em.add_field(name='Warning Reason', value=status.value['reason'])
+            await bot_api.create_channel_message(logs_channel, payload={
+                'embeds': [em.to_dict()]
+            })
+    elif status.type == 'reminder':
+        em = Embed(
+            title = 'Reminder ended',
+            colour = Colour.blue(),
+            timestamp = datetime.now(),
+            description = f'<@{status.user_id}>'
+        )
+        em.add_field(name='Reminder', value=status.value['description'], inline=False)
+        await bot_api.create_channel_message(status.value['channel'], payload={
+            'embeds': [em.to_dict()],
+            'isPrivate': True
+        })
+    db.session.delete(status)
+
 class ExpiredStatuses(MethodView):
     """ Resource for getting expired user statuses and handling them """
     async def post(self):
@@ -322,85 +388,13 @@ class ExpiredStatuses(MethodView):
             return 'Forbidden.', 403
 
         with BotAPI() as bot_api:
-            statuses = GuildUserStatus.query.filter(datetime.now() >= GuildUserStatus.ends_at).paginate(per_page=50)
-            for _ in statuses.iter_pages():
-                contents = statuses.items
-                for status in contents:
-                    status: GuildUserStatus = status
-                    guild: Guild = Guild.query.filter_by(guild_id = status.guild_id).first()
-                    logs_channel = guild.config.get('action_logs_channel', guild.config.get('logs_channel'))
-                    user = (await bot_api.get_user(status.user_id))['user']
-                    if status.type == 'ban':
-                        try:
-                            await bot_api.unban_server_member(status.guild_id, status.user_id)
-                        except Exception as e:
-                            print(f'Failed to unban user "{status.user_id}" from guild "{status.guild_id}"')
-                        if guild.config.get('logs_channel'):
-                            em = Embed(
-                                title = 'Ban ended',
-                                colour = Colour.blue(),
-                                timestamp = datetime.now()
-                            )
-                            em.add_field(name='User', value=f'<@{status.user_id}>')
-                            em.add_field(name='Ban Reason', value=status.value['reason'])
-                            await bot_api.create_channel_message(logs_channel, payload={
-                                'embeds': [em.to_dict()]
-                            })
-                        requests.delete(f'http://localhost:5000/moderation/{status.guild_id}/{status.user_id}/ban', headers={
-                            'authorization': app.config.get('SECRET_KEY')
-                        })
-                    elif status.type == 'mute':
-                        if guild.config.get('mute_role'):
-                            try:
-                                await bot_api.remove_role_from_member(status.guild_id, status.user_id, guild.config['mute_role'])
-                            except Exception as e:
-                                print(f'Failed to unmute user "{status.user_id}" from guild "{status.guild_id}"')
-                        if guild.config.get('logs_channel'):
-                            em = Embed(
-                                title = 'Mute ended',
-                                colour = Colour.blue(),
-                                timestamp = datetime.now()
-                            )
-                            em.add_field(name='User', value=f'<@{status.user_id}>')
-                            em.add_field(name='Mute Reason', value=status.value['reason'])
-                            await bot_api.create_channel_message(logs_channel, payload={
-                                'embeds': [em.to_dict()]
-                            })
-                        requests.delete(f'http://localhost:5000/moderation/{status.guild_id}/{status.user_id}/mute', headers={
-                            'authorization': app.config.get('SECRET_KEY')
-                        })
-                    elif status.type == 'warning':
-                        if guild.config.get('logs_channel'):
-                            em = Embed(
-                                title = 'Warning ended',
-                                colour = Colour.blue(),
-                                timestamp = datetime.now()
-                            )
-                            em.add_field(name='User', value=f'<@{status.user_id}>')
-                            em.add_field(name='Warning Reason', value=status.value['reason'])
-                            await bot_api.create_channel_message(logs_channel, payload={
-                                'embeds': [em.to_dict()]
-                            })
-                        requests.delete(f'http://localhost:5000/moderation/{status.guild_id}/{status.user_id}/warnings/{get_warning_id(status.guild_id, status.user_id, status.internal_id)}', headers={
-                            'authorization': app.config.get('SECRET_KEY')
-                        })
-                    elif status.type == 'reminder':
-                        em = Embed(
-                            title = 'Reminder ended',
-                            colour = Colour.blue(),
-                            timestamp = datetime.now(),
-                            description = f'<@{status.user_id}>'
-                        )
-                        em.add_field(name='Reminder', value=status.value['description'], inline=False)
-                        await bot_api.create_channel_message(status.value['channel'], payload={
-                            'embeds': [em.to_dict()],
-                            'isPrivate': True
-                        })
-                        requests.delete(f'http://localhost:5000/reminders/{status.guild_id}/{status.user_id}/{get_reminder_id(status.guild_id, status.user_id, status.internal_id)}', headers={
-                            'authorization': app.config.get('SECRET_KEY')
-                        })
-                        
-                statuses.next()
+            statuses: list[GuildUserStatus] = GuildUserStatus.query.filter(GuildUserStatus.ends_at <= datetime.now()).all()
+            for status in statuses:
+                try:
+                    await expire_status(bot_api, status)
+                except Exception as e:
+                    print(f'Failed to expire status "{status.internal_id}": {e}')
+            db.session.commit()
 
             return 'Success', 200
 
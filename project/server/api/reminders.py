@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from flask.views import MethodView
 from project import BotAPI, app, db
 from project.server.models import Guild, GuildUserStatus
+from project.helpers import deadlines
 
 import re
 
@@ -81,6 +82,7 @@ class UserReminders(MethodView):
 
         db.session.add(reminder)
         db.session.commit()
+        deadlines.notify('status', reminder.internal_id, reminder.ends_at)
 
         return jsonify({
             'reminder_id': get_reminder_id(guild_id, user_id, reminder.internal_id)
@@ -4,50 +4,112 @@ import string
 from typing import Optional
 import jwt
 import requests
+import aiohttp
 import base64
+import os
 
-from datetime import datetime
 from json import JSONDecoder, JSONEncoder
 from flask import Blueprint, request, jsonify
 from flask.views import MethodView
-from project import app, BotAPI, db, get_shared_state
+from project import app, BotAPI, db
 from project.helpers import user_evaluator, verif_token
-from project.helpers.Cache import Cache
+from project.helpers.SharedCache import SharedCache
+from project.helpers.guilded_client import get_session
+from project.helpers.io_loop import on_io_loop
+from project.helpers.ip_reputation import IpList
 from project.helpers.images import *
 from project.helpers.premium import get_user_premium_status
 from project.helpers.verify_browseragent import verify_browseragent
-from project.server.models import Guild, GuildUser, UserInfo
+from project.server.models import BanFingerprint, Guild, GuildUser, UserInfo
 from project.server.api.guilds import get_user_info
 from Crypto.Cipher import AES
 from Crypto.Util.Padding import unpad
+from sqlalchemy import and_, or_
 
 from guilded import Embed
 
-shared_dict, shared_lock = get_shared_state(port=35792, key=b"verification")
-shared_ip_cache, shared_ip_lock = get_shared_state(port=35793, key=b"verification_ip")
-
 encoder = JSONEncoder()
 verification_blueprint = Blueprint('verification', __name__)
 
 decoder = JSONDecoder()
 
-verify_cache = Cache(60 * 10, shared_dict)
-ip_cache = Cache(300, shared_ip_cache)
+verify_cache = SharedCache(60 * 10, name='verify')
+ip_cache = SharedCache(300, name='verify_ip') # 'guild_id/hashed IP' -> attempts, the IP itself is never written to disk
 
-tor_exit_nodes = []
-last_tor_node_get = 0
+tor_exit_nodes = IpList('tor_exits', 'https://www.dan.me.uk/torlist/?exit', 60 * 30)
+if not os.getenv('MIGRATING_DB', '0') == '1':
+    tor_exit_nodes.start() # Loaded before gunicorn forks, so workers start out with the list
+proxycheck_cache = SharedCache(60 * 60 * 6, name='proxycheck') # Hashed IP -> proxycheck.io verdict
 
 def get_tor_exit_nodes():
-    global last_tor_node_get
-    if abs(last_tor_node_get - datetime.now().timestamp()) > 60 * 30:
-        last_tor_node_get = datetime.now().timestamp()
-        req = requests.get('https://www.dan.me.uk/torlist/?exit')
-        list = req.content
-        tor_exit_nodes.clear()
-        for line in list.splitlines():
-            tor_exit_nodes.append(str(line))
     return tor_exit_nodes
 
+@on_io_loop
+async def fetch_proxycheck(ip: str):
+    async with get_session().get(f'https://proxycheck.io/v2/{ip}?key={app.config.get("PROXYCHECK_KEY")}&vpn=1&risk=1',
+        timeout=aiohttp.ClientTimeout(total=10)) as response:
+        if response.status != 200:
+            return None
+        return (await response.json(content_type=None)).get(ip, {
+            'proxy': 'no',
+            'risk': 0
+        })
+
+async def check_proxy(ip: str, hashed_ip: str):
+    """ Get the proxycheck.io verdict for an IP, cached under its hash so the IP itself is never stored """
+    data = proxycheck_cache.get(hashed_ip)
+    if data is None:
+        data = await fetch_proxycheck(ip)
+        if data is None:
+            return None
+        proxycheck_cache.set(hashed_ip, data)
+    return data
+
+SOCIAL_KINDS = ['roblox', 'steam', 'youtube', 'twitter']
+
+def get_fingerprints(hashed_ip: str, browser_id: str, user_info: UserInfo):
+    """ Get the (kind, value) pairs a user can be recognised by """
+    fingerprints = [('ip', hashed_ip), ('browser', browser_id)]
+    if user_info is not None:
+        fingerprints += [(kind, getattr(user_info, kind)) for kind in SOCIAL_KINDS]
+    return [(kind, value) for kind, value in fingerprints if value]
+
+def set_ban_fingerprints(db_user: GuildUser, user_info: UserInfo=None):
+    """ Store or drop the fingerprints of a guild user when they are banned or unbanned, the caller commits """
+    BanFingerprint.query \
+        .filter(BanFingerprint.guild_id == db_user.guild_id) \
+        .filter(BanFingerprint.user_id == db_user.user_id) \
+        .delete()
+    if db_user.is_banned:
+        if user_info is None:
+            user_info = UserInfo.query.filter_by(user_id = db_user.user_id).first()
+        for kind, value in get_fingerprints(db_user.hashed_ip, db_user.browser_id, user_info):
+            db.session.add(BanFingerprint(db_user.guild_id, db_user.user_id, kind, value))
+
+def find_ban_match(guild_id: str, user_id: str, fingerprints: list):
+    """ Compare a user's fingerprints against the banned users of a guild other than themselves.
+
+    Returns 'Account Check' when every social the user linked belongs to one
+    banned user, 'IP Check' when a banned user shares their IP or browser id,
+    or None. """
+    # Each pair is its own kind and value equality, a (kind, value) IN list is not looked up through the index
+    matches = len(fingerprints) > 0 and db.session.query(BanFingerprint.user_id, BanFingerprint.kind) \
+        .filter(BanFingerprint.guild_id == guild_id) \
+        .filter(BanFingerprint.user_id != user_id) \
+        .filter(or_(*[and_(BanFingerprint.kind == kind, BanFingerprint.value == value) for kind, value in fingerprints])) \
+        .all() or []
+    matched_kinds: dict[str, set] = {}
+    for banned_user_id, kind in matches:
+        matched_kinds.setdefault(banned_user_id, set()).add(kind)
+
+    # Socials only count as a match when every one of them is linked to the same banned user
+    social_kinds = set(kind for kind, _ in fingerprints if kind in SOCIAL_KINDS)
+    if len(social_kinds) > 0 and any(social_kinds <= kinds for kinds in matched_kinds.values()):
+        return 'Account Check'
+    if any('ip' in kinds or 'browser' in kinds for kinds in matched_kinds.values()):
+        return 'IP Check'
+    return None
+
 async def send_embed(channel_id, embed: Embed):
     with BotAPI() as bot_api:
         return await bot_api.create_channel_message(channel_id, payload={
@@ -134,6 +196,7 @@ class VerifyUser(MethodView):
                 hashed_ip = hashlib.sha512(user_ip.encode('utf-8')).hexdigest()
 
                 user_info: UserInfo = await get_user_info(token.guild_id, token.user_id)
+                evaluation = user_evaluator.Evaluation(token.guild_id, token.user_id, user_info.connections)
 
                 db_guild: dict = (await bot_api.get_server(token.guild_id)).get('server')
                 guild: Guild = Guild.query.filter_by(guild_id = token.guild_id).first()
@@ -179,7 +242,7 @@ class VerifyUser(MethodView):
                         # Failed cloudflare turnstile, reject and log it
                         if logs_channel is not None:
                             await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                                await evaluation.get(),
                                 False,
                                 "Turnstile Challenge Failed"
                             ))
@@ -191,7 +254,7 @@ class VerifyUser(MethodView):
                         # Missing cloudflare turnstile response, reject and log it
                         if logs_channel is not None:
                             await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                                await evaluation.get(),
                                 False,
                                 "Missing Turnstile Response"
                             ))
@@ -203,7 +266,7 @@ class VerifyUser(MethodView):
                     # Bot-related process
                     if logs_channel is not None:
                         await send_embed(logs_channel, user_evaluator.generate_embed(
-                            await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                            await evaluation.get(),
                             True
                         ))
                     if verified_role is not None:
@@ -226,7 +289,7 @@ class VerifyUser(MethodView):
                     # Possibly not a browser, reject it
                     if logs_channel is not None:
                         await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                            await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                            await evaluation.get(),
                             False,
                             "None-Browser Attempt"
                         ))
@@ -235,10 +298,10 @@ class VerifyUser(MethodView):
                     }), 403
 
                 ip = request.headers.get('cf-connecting-ip', request.environ.get('HTTP_X_REAL_IP', request.remote_addr))
-                cached_ip = ip_cache.get(f'{token.guild_id}/{ip}')
+                cached_ip = ip_cache.get(f'{token.guild_id}/{hashed_ip}')
                 if cached_ip is None:
                     cached_ip = 1
-                ip_cache.set(f'{token.guild_id}/{ip}', cached_ip + 1)
+                ip_cache.set(f'{token.guild_id}/{hashed_ip}', cached_ip + 1)
 
                 if block_tor is 1:
                     exit_nodes = get_tor_exit_nodes()
@@ -246,7 +309,7 @@ class VerifyUser(MethodView):
                         # Reject due to tor detected
                         if logs_channel is not None:
                             await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                                await evaluation.get(),
                                 False,
                                 "Tor Block"
                             ))
@@ -259,7 +322,7 @@ class VerifyUser(MethodView):
                     # Reject due to too many verification requests
                     if logs_channel is not None:
                         await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                            await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                            await evaluation.get(),
                             False,
                             "Rate Limited"
                         ))
@@ -269,19 +332,15 @@ class VerifyUser(MethodView):
 
                 if premium_status > 0:
                     # Do an advanced proxy check
-                    proxy_request = requests.get(f'https://proxycheck.io/v2/{ip}?key={app.config.get("PROXYCHECK_KEY")}&vpn=1&risk=1')
-                    if proxy_request.status_code == 200:
-                        data = proxy_request.json().get(ip, {
-                            'proxy': 'no',
-                            'risk': 0
-                        })
+                    data = await check_proxy(ip, hashed_ip)
+                    if data is not None:
                         using_vpn = data.get('proxy') == 'yes'
                         risk = data.get('risk') or 0
                         if risk >= 75:
                             # Block the verification
                             if logs_channel is not None:
                                 await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                    await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                                    await evaluation.get(),
                                     False,
                                     "[APC] Dangerous IP"
                                 ))
@@ -289,50 +348,24 @@ class VerifyUser(MethodView):
                                 'message': 'Dangerous IP address identified by Advanced Proxy Check'
                             }), 403
                 
-                # Compare their socials against database of banned users in this guild that aren't the user being verified
-                socials = decoder.decode(user_info.connections)
-                if socials.get('roblox') or socials.get('twitter') or socials.get('youtube') or socials.get('steam'):
-                    banned_users = db.session.query(GuildUser.user_id) \
-                        .filter(GuildUser.guild_id == token.guild_id) \
-                        .filter(GuildUser.user_id != token.user_id) \
-                        .filter(GuildUser.is_banned == True)
-
-                    matching_socials = db.session.query(UserInfo)
-                    
-                    if user_info.roblox != None:
-                        matching_socials = matching_socials.filter(UserInfo.roblox == user_info.roblox)
-                    if user_info.steam != None:
-                        matching_socials = matching_socials.filter(UserInfo.steam == user_info.steam)
-                    if user_info.twitter != None:
-                        matching_socials = matching_socials.filter(UserInfo.twitter == user_info.twitter)
-                    if user_info.youtube != None:
-                        matching_socials = matching_socials.filter(UserInfo.youtube == user_info.youtube)
-
-                    matching_socials = matching_socials.filter(UserInfo.user_id.in_(banned_users))
-
-                    if len(matching_socials.all()) > 0:
-                        if logs_channel is not None:
-                            await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
-                                False,
-                                "Account Check"
-                            ))
-                        return jsonify({
-                            'message': 'Your account is linked to a previously banned member of this server'
-                        }), 403
-
-                # Compare IP hash against database of banned users in this guild that aren't the user being verified
-                matching_hashes = db.session.query(GuildUser).filter(
-                    GuildUser.hashed_ip == hashed_ip,
-                    GuildUser.guild_id == token.guild_id,
-                    GuildUser.user_id != token.user_id,
-                    GuildUser.is_banned == True
-                ).all()
+                # Compare their IP hash, browser id and socials against the banned users in this guild
+                ban_match = find_ban_match(token.guild_id, token.user_id, get_fingerprints(hashed_ip, browser_id, user_info))
+                if ban_match == 'Account Check':
+                    if logs_channel is not None:
+                        await send_embed(logs_channel, embed=user_evaluator.generate_embed(
+                            await evaluation.get(),
+                            False,
+                            "Account Check"
+                        ))
+                    return jsonify({
+                        'message': 'Your account is linked to a previously banned member of this server'
+                    }), 403
 
-                if len(matching_hashes) > 0: # We found another user who was banned with a matching IP, reject them
+                if ban_match == 'IP Check':
+                    # We found another user who was banned with a matching IP or browser id, reject them
                     if logs_channel is not None:
-                        await send_embed(logs_channel, user_evaluator.generate_embed(
-                            await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                        await send_embed(logs_channel, embed=user_evaluator.generate_embed(
+                            await evaluation.get(),
                             False,
                             "IP Check"
                         ))
@@ -340,31 +373,10 @@ class VerifyUser(MethodView):
                         'message': 'Your IP is linked to a previously banned member of this server'
                     }), 403
 
-                # Compare browser id against database of banned users in this guild that aren't the user being verified
-                # If the browser id is not empty
-                if browser_id != '' and browser_id != None:
-                    matching_bids = db.session.query(GuildUser).filter(
-                        GuildUser.browser_id == browser_id,
-                        GuildUser.guild_id == token.guild_id,
-                        GuildUser.user_id != token.user_id,
-                        GuildUser.is_banned == True
-                    ).all()
-
-                    if len(matching_bids) > 0: # We found another user who was banned with a matching browser id, reject them
-                        if logs_channel is not None:
-                            await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                                await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
-                                False,
-                                "IP Check"
-                            ))
-                        return jsonify({
-                            'message': 'Your IP is linked to a previously banned member of this server'
-                        }), 403
-
                 # Bot-related process
                 if logs_channel is not None:
                     await send_embed(logs_channel, embed=user_evaluator.generate_embed(
-                        await user_evaluator.evaluate_user(token.guild_id, token.user_id, user_info.connections),
+                        await evaluation.get(),
                         True
                     ))
                 if verified_role is not None:
@@ -443,6 +455,7 @@ class VerifySetUserBanned(MethodView):
             db_user = GuildUser(guild_id, user_id)
 
         db_user.is_banned = value is True
+        set_ban_fingerprints(db_user)
 
         db.session.add(db_user)
         db.session.commit()
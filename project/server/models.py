@@ -5,7 +5,10 @@ import string
 from project import db
 from project.helpers.images import *
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 from sqlalchemy_json import NestedMutableJson
+from project.helpers.config_bus import config_bus
 
 class FFlag(db.Model):
     """ FFlag model for storing feature flags """
@@ -85,6 +88,7 @@ class Guild(db.Model):
     bio = db.Column(db.String(500), nullable=True)
     avatar = db.Column(db.String(500), nullable=True)
     members = db.Column(db.Integer, nullable=False, server_default="0")
+    config_version = db.Column(db.Integer, nullable=False, server_default="0")
 
     def __init__(self, guild_id: str):
         self.guild_id = guild_id
@@ -93,6 +97,31 @@ class Guild(db.Model):
     def __repr__(self):
         return f'<Guild {self.guild_id}>'
 
+@event.listens_for(Guild, 'before_update')
+def bump_config_version(mapper, connection, guild: Guild):
+    state = db.inspect(guild)
+    if state.attrs.config.history.has_changes() or state.attrs.premium.history.has_changes():
+        # Incremented by the UPDATE itself, so concurrent writers each get their own version
+        guild.config_version = Guild.config_version + 1
+        state.session.info.setdefault('config_bumped', set()).add(guild)
+
+@event.listens_for(Session, 'after_flush_postexec')
+def read_config_versions(session: Session, flush_context):
+    # The row is still locked by the UPDATE, so this reads the version it wrote.
+    # Published once the change is committed, see publish_config_versions
+    for guild in session.info.pop('config_bumped', ()):
+        session.info.setdefault('config_versions', {})[guild.guild_id] = guild.config_version
+
+@event.listens_for(Session, 'after_commit')
+def publish_config_versions(session: Session):
+    for guild_id, version in session.info.pop('config_versions', {}).items():
+        config_bus.publish(guild_id, version)
+
+@event.listens_for(Session, 'after_rollback')
+def drop_config_versions(session: Session):
+    session.info.pop('config_bumped', None)
+    session.info.pop('config_versions', None)
+
 class GuildActivity(db.Model):
     """ Guild Activity model for storing guild activity logs """
     __tablename__ = 'guildactivity'
@@ -119,6 +148,12 @@ class GuildActivity(db.Model):
 class GuildUser(db.Model):
     """ Guild User model for storing guild user-related data """
     __tablename__ = 'guildusers'
+    __table_args__ = (
+        # String columns are indexed on a prefix to stay under MySQL's key length limit
+        db.Index('ix_guildusers_guild_user', 'guild_id', 'user_id', mysql_length={'guild_id': 191, 'user_id': 191}),
+        db.Index('ix_guildusers_guild_banned_ip', 'guild_id', 'is_banned', 'hashed_ip', mysql_length={'guild_id': 191, 'hashed_ip': 191}),
+        db.Index('ix_guildusers_guild_banned_browser', 'guild_id', 'is_banned', 'browser_id', mysql_length={'guild_id': 191, 'browser_id': 191}),
+    )
 
     internal_id = db.Column(db.String(500), primary_key=True)
     guild_id = db.Column(db.String(500), nullable=False)
@@ -148,9 +183,38 @@ class GuildUser(db.Model):
     def __repr__(self):
         return f'<GuildUser {self.internal_id}>'
 
+class BanFingerprint(db.Model):
+    """ Ban Fingerprint model for storing the identifiers of banned guild users, so verification can match against them """
+    __tablename__ = 'banfingerprints'
+    __table_args__ = (
+        db.Index('ix_banfingerprints_guild_kind_value', 'guild_id', 'kind', 'value', mysql_length={'guild_id': 191, 'value': 191}),
+        db.Index('ix_banfingerprints_guild_user', 'guild_id', 'user_id', mysql_length={'guild_id': 191, 'user_id': 191}),
+    )
+
+    internal_id = db.Column(db.String(500), primary_key=True)
+    guild_id = db.Column(db.String(500), nullable=False)
+    user_id = db.Column(db.String(500), nullable=False)
+
+    kind = db.Column(db.String(20), nullable=False) # One of ip, browser, roblox, steam, youtube or twitter
+    value = db.Column(db.String(500), nullable=False)
+
+    def __init__(self, guild_id: str, user_id: str, kind: str, value: str):
+        self.internal_id = f'{guild_id}/{user_id}/{kind}'
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.kind = kind
+        self.value = value
+    
+    def __repr__(self):
+        return f'<BanFingerprint {self.internal_id}>'
+
 class GuildUserStatus(db.Model):
     """ Guild User Status model for storing guild user statuses """
     __tablename__ = 'guilduserstatuses'
+    __table_args__ = (
+        db.Index('ix_guilduserstatuses_guild_user_type', 'guild_id', 'user_id', 'type', mysql_length={'guild_id': 191, 'user_id': 191, 'type': 191}),
+        db.Index('ix_guilduserstatuses_ends_at', 'ends_at'),
+    )
 
     internal_id = db.Column(db.String(500), primary_key=True)
     guild_id = db.Column(db.String(500), nullable=False)
@@ -176,6 +240,9 @@ class GuildUserStatus(db.Model):
 class GuildChannelConfig(db.Model):
     """ Guild Channel Config model for storing guild channel configurations """
     __tablename__ = 'guildchannelconfigs'
+    __table_args__ = (
+        db.Index('ix_guildchannelconfigs_type', 'type', mysql_length={'type': 191}),
+    )
     internal_id = db.Column(db.String(500), primary_key=True)
     unique_id = db.Column(db.String(500), nullable=False)
     guild_id = db.Column(db.String(500), nullable=False)
@@ -232,9 +299,27 @@ class FeedData(db.Model):
     def __repr__(self):
         return f'<FeedData {self.id}>'
 
+class FeedState(db.Model):
+    """ Feed State model for storing what was last fetched from a feed URL """
+    __tablename__ = 'feedstates'
+    url = db.Column(db.String(500), primary_key=True)
+    etag = db.Column(db.String(500), nullable=True)
+    last_modified = db.Column(db.String(500), nullable=True)
+    checked_at = db.Column(db.DateTime, nullable=True)
+    known = db.Column(db.LargeBinary, nullable=True)
+
+    def __init__(self, url: str):
+        self.url = url
+    
+    def __repr__(self):
+        return f'<FeedState {self.url}>'
+
 class Giveaway(db.Model):
     """ Giveaway model for storing a giveaway in a guild """
     __tablename__ = 'giveaways'
+    __table_args__ = (
+        db.Index('ix_giveaways_ended_ends_at', 'ended', 'ends_at'),
+    )
     internal_id = db.Column(db.String(500), primary_key=True)
     id = db.Column(db.String(100), nullable=False)
     guild_id = db.Column(db.String(500), nullable=False)
@@ -270,6 +355,9 @@ class Giveaway(db.Model):
 class UserInfo(db.Model):
     """ User Info model for storing user information to be shared across guilds """
     __tablename__ = 'userinfo'
+    __table_args__ = (
+        db.Index('ix_userinfo_last_updated', 'last_updated'),
+    )
 
     user_id = db.Column(db.String(500), nullable=False, primary_key=True)
     name = db.Column(db.String(500), nullable=False)
@@ -0,0 +1,18 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+# Import the project the way migrations do, so the bot, the NSFW model and the
+# URL feed are not started, and log next to the repository
+os.environ.setdefault('MIGRATING_DB', '1')
+os.environ.setdefault('CURR_ENV', 'TestingConfig')
+os.environ.setdefault('PROJECT_ROOT', os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Keep the shared cache of a test run apart from the one a local bot or worker uses
+shared_cache_dir = tempfile.mkdtemp(prefix='serverguard-tests-')
+atexit.register(shutil.rmtree, shared_cache_dir, ignore_errors=True)
+os.environ['SHARED_CACHE_PATH'] = os.path.join(shared_cache_dir, 'cache.sqlite3')
+
+sys.path.insert(0, os.environ['PROJECT_ROOT'])
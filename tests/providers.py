@@ -0,0 +1,73 @@
+from aiohttp import web
+from project.helpers.io_loop import io_loop
+
+import asyncio
+
+CREATED = '2015-06-01T12:00:00Z'
+
+class StandInProviders:
+    """ A local server that answers like the Roblox, Steam, YouTube and Twitter
+    APIs user_evaluator uses, so evaluations can run without the internet.
+
+    An id of 'missing' answers like an account that does not exist and
+    'limited' with a 429. Every request waits delay seconds and is counted. """
+    def __init__(self, delay: float=0):
+        self.delay = delay
+        self.hits: dict[str, int] = {}
+        self.base = None
+        self.__runner = None
+
+        self.app = web.Application()
+        self.app.add_routes([
+            web.get('/v1/users/{id}', self.roblox),
+            web.get('/IPlayerService/GetSteamLevel/v1/', self.steam),
+            web.get('/youtube/v3/channels', self.youtube),
+            web.get('/2/users/by/username/{id}', self.twitter),
+        ])
+
+    async def answer(self, provider: str, id: str):
+        self.hits[f'{provider}/{id}'] = self.hits.get(f'{provider}/{id}', 0) + 1
+        await asyncio.sleep(self.delay)
+        if id == 'limited':
+            raise web.HTTPTooManyRequests()
+
+    async def roblox(self, request: web.Request):
+        id = request.match_info['id']
+        await self.answer('roblox', id)
+        if id == 'missing':
+            raise web.HTTPNotFound()
+        return web.json_response({'id': id, 'isBanned': False, 'hasVerifiedBadge': False, 'created': CREATED})
+
+    async def steam(self, request: web.Request):
+        id = request.query['steamid']
+        await self.answer('steam', id)
+        return web.json_response({'response': {} if id == 'missing' else {'player_level': 4}})
+
+    async def youtube(self, request: web.Request):
+        id = request.query['id']
+        await self.answer('youtube', id)
+        if id == 'missing':
+            return web.json_response({'pageInfo': {'totalResults': 0}})
+        return web.json_response({'items': [{'id': id, 'snippet': {'publishedAt': CREATED}}]})
+
+    async def twitter(self, request: web.Request):
+        id = request.match_info['id']
+        await self.answer('twitter', id)
+        if id == 'missing':
+            return web.json_response({'errors': [{'title': 'Not Found Error'}]})
+        return web.json_response({'data': {'username': id, 'verified': False, 'created_at': CREATED, 'public_metrics': {'tweet_count': 40}}})
+
+    async def __start(self):
+        self.__runner = web.AppRunner(self.app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, '127.0.0.1', 0)
+        await site.start()
+        return self.__runner.addresses[0][1]
+
+    def start(self):
+        # Served from the IO loop, which keeps running while the tests block on it
+        self.base = f'http://127.0.0.1:{io_loop.run_sync(self.__start())}'
+        return self
+
+    def stop(self):
+        io_loop.run_sync(self.__runner.cleanup())
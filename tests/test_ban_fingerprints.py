@@ -0,0 +1,100 @@
+from project import app, db
+from project.server.api import guilds
+from project.server.api.verification import find_ban_match, get_fingerprints, set_ban_fingerprints
+from project.server.models import BanFingerprint, GuildUser, UserInfo
+
+import asyncio
+import pytest
+
+TABLES = [GuildUser.__table__, UserInfo.__table__, BanFingerprint.__table__]
+
+@pytest.fixture
+def database():
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=TABLES)
+        yield
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=TABLES)
+
+class StandInClient:
+    async def get_user(self, user_id: str):
+        return {'user': {'id': user_id, 'name': 'Someone'}}
+
+def refresh(monkeypatch, user_id: str, connections: dict):
+    async def get_social_links(bot_api, guild_id: str, user_id: str):
+        return connections
+    async def get_user_premium_status(user_id: str):
+        return 0
+    monkeypatch.setattr(guilds, 'get_social_links', get_social_links)
+    monkeypatch.setattr(guilds, 'get_user_premium_status', get_user_premium_status)
+
+    user = UserInfo.query.filter_by(user_id = user_id).first()
+    asyncio.run(guilds.refresh_user_info(StandInClient(), 'guild', user_id, user))
+    db.session.commit()
+
+def fingerprints(guild_id: str, user_id: str):
+    return {row.kind: row.value for row in BanFingerprint.query.filter_by(guild_id = guild_id, user_id = user_id)}
+
+def test_refresh_follows_a_banned_users_new_socials(database, monkeypatch):
+    db.session.add(UserInfo('banned', {}, {'roblox': {'serviceId': 'old'}}))
+    banned = GuildUser('guild', 'banned', hashed_ip='hash')
+    banned.is_banned = True
+    db.session.add(banned)
+    set_ban_fingerprints(banned)
+    db.session.commit()
+    assert fingerprints('guild', 'banned') == {'ip': 'hash', 'roblox': 'old'}
+
+    refresh(monkeypatch, 'banned', {'roblox': {'serviceId': 'new'}, 'steam': {'serviceId': 'steam'}})
+
+    assert fingerprints('guild', 'banned') == {'ip': 'hash', 'roblox': 'new', 'steam': 'steam'}
+
+def test_refresh_leaves_users_that_are_not_banned_alone(database, monkeypatch):
+    db.session.add(UserInfo('member', {}, {}))
+    db.session.add(GuildUser('guild', 'member', hashed_ip='hash'))
+    db.session.commit()
+
+    refresh(monkeypatch, 'member', {'roblox': {'serviceId': 'new'}})
+
+    assert fingerprints('guild', 'member') == {}
+
+def ban(user_id: str, hashed_ip: str=None, browser_id: str=None, **socials):
+    user_info = UserInfo(user_id, {}, {kind: {'serviceId': value} for kind, value in socials.items()})
+    db.session.add(user_info)
+    banned = GuildUser('guild', user_id, hashed_ip=hashed_ip, browser_id=browser_id)
+    banned.is_banned = True
+    db.session.add(banned)
+    set_ban_fingerprints(banned, user_info)
+    db.session.commit()
+
+def verify(user_id: str, hashed_ip: str=None, browser_id: str=None, **socials):
+    user_info = UserInfo(user_id, {}, {kind: {'serviceId': value} for kind, value in socials.items()})
+    return find_ban_match('guild', user_id, get_fingerprints(hashed_ip, browser_id, user_info))
+
+def test_socials_all_linked_to_one_banned_user_are_rejected(database):
+    ban('banned', 'banned ip', roblox='roblox', steam='steam')
+
+    assert verify('new', 'new ip', roblox='roblox', steam='steam') == 'Account Check'
+    assert verify('new', 'new ip', roblox='roblox') == 'Account Check'
+
+def test_socials_split_across_banned_users_are_allowed(database):
+    ban('first', 'first ip', roblox='roblox')
+    ban('second', 'second ip', steam='steam')
+
+    assert verify('new', 'new ip', roblox='roblox', steam='steam') is None
+    assert verify('new', 'new ip', roblox='roblox', steam='other') is None
+
+def test_a_banned_ip_alone_is_rejected(database):
+    ban('banned', 'shared ip', 'banned browser', roblox='roblox')
+
+    assert verify('new', 'shared ip', 'new browser', steam='steam') == 'IP Check'
+
+def test_a_banned_browser_alone_is_rejected(database):
+    ban('banned', 'banned ip', 'shared browser')
+
+    assert verify('new', 'new ip', 'shared browser') == 'IP Check'
+
+def test_a_users_own_ban_is_not_a_match(database):
+    ban('rejoining', 'ip', 'browser', roblox='roblox')
+
+    assert verify('rejoining', 'ip', 'browser', roblox='roblox') is None
+    assert verify('new', 'ip', 'browser', roblox='roblox') == 'Account Check'
@@ -0,0 +1,55 @@
+from forking import run_in_child
+from project.helpers.Cache import Cache, scheduler
+from threading import Event, Thread
+
+import time
+
+def test_setting_a_key_again_keeps_one_deadline():
+    cache = Cache(60)
+    before = scheduler.pending()
+    for i in range(1000):
+        cache.set('key', i)
+
+    assert scheduler.pending() - before == 1
+    assert cache.get('key') == 999
+
+def test_entries_set_again_expire_at_their_latest_deadline():
+    cache = Cache(0.2)
+    cache.set('key', 1)
+    time.sleep(0.1)
+    cache.set('key', 2)
+    time.sleep(0.15) # Past the first deadline, not the second
+
+    assert cache.get('key') == 2
+    time.sleep(0.2)
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['expirations'] == 1
+
+def test_keys_set_before_a_fork_expire_in_the_child():
+    cache = Cache(0.2)
+    cache.set('key', 1)
+
+    def check():
+        time.sleep(0.5)
+        return cache.stats()['size'] == 0 and cache.stats()['expirations'] == 1
+    assert run_in_child(check)
+
+def test_a_lock_held_at_fork_is_free_in_the_child():
+    cache = Cache(60)
+    held, release = Event(), Event()
+    def hold():
+        with cache._Cache__lock:
+            held.set()
+            release.wait()
+    thread = Thread(target=hold)
+    thread.start()
+    held.wait()
+
+    try:
+        def check():
+            cache.set('key', 1)
+            return cache.get('key') == 1
+        assert run_in_child(check)
+    finally:
+        release.set()
+        thread.join()
@@ -0,0 +1,39 @@
+from PIL import Image
+from project.helpers import image_assets
+from project.helpers.image_assets import content_cache, get_image_asset
+from project.helpers.rank_card import AVATAR_SIZE, CARD_SIZE
+
+import asyncio
+import io
+
+def png(size: tuple[int, int], colour: tuple):
+    output = io.BytesIO()
+    Image.new('RGB', size, colour).save(output, format='PNG')
+    return output.getvalue()
+
+def test_assets_are_kept_at_the_size_they_are_drawn():
+    content_cache.set('test://large', png((3000, 2000), (200, 30, 30)))
+    asset = asyncio.run(get_image_asset('test://large', CARD_SIZE))
+
+    assert asset.image.size == CARD_SIZE
+    assert asset.nbytes == CARD_SIZE[0] * CARD_SIZE[1] * 4
+    assert asset.dominant_color == 'c81e1e'
+
+def test_broken_images_use_the_fallback():
+    content_cache.set('test://broken', b'not an image')
+    content_cache.set('test://fallback', png((64, 64), (0, 0, 255)))
+    asset = asyncio.run(get_image_asset('test://broken', AVATAR_SIZE, 'test://fallback'))
+
+    assert asset.url == 'test://fallback'
+    assert asset.image.size == AVATAR_SIZE
+    assert asyncio.run(get_image_asset('test://broken', AVATAR_SIZE, 'test://fallback')) is asset
+
+def test_the_memory_cache_is_bounded_by_bytes(monkeypatch):
+    cache = image_assets.Cache(60, max_size=AVATAR_SIZE[0] * AVATAR_SIZE[1] * 4 * 3, size_of=lambda asset: asset.nbytes)
+    monkeypatch.setattr(image_assets, 'asset_cache', cache)
+    for i in range(10):
+        content_cache.set(f'test://avatar{i}', png((32, 32), (i, i, i)))
+        asyncio.run(get_image_asset(f'test://avatar{i}', AVATAR_SIZE))
+
+    assert cache.stats()['size'] == 3
+    assert cache.stats()['measured_size'] <= AVATAR_SIZE[0] * AVATAR_SIZE[1] * 4 * 3
@@ -0,0 +1,47 @@
+from project.helpers.ip_reputation import IpSet
+
+def test_single_addresses_match_exactly():
+    ips = IpSet(['192.0.2.10', '2001:db8::1'])
+
+    assert '192.0.2.10' in ips
+    assert '192.0.2.11' not in ips
+    assert '2001:db8::1' in ips
+    assert '2001:db8::2' not in ips
+
+def test_networks_match_every_address_in_them():
+    ips = IpSet(['198.51.100.0/24', '10.0.0.0/8', '2001:db8:1::/48'])
+
+    assert '198.51.100.0' in ips
+    assert '198.51.100.255' in ips
+    assert '198.51.101.0' not in ips
+    assert '10.200.3.4' in ips
+    assert '11.0.0.0' not in ips
+    assert '2001:db8:1:ffff::1' in ips
+    assert '2001:db8:2::1' not in ips
+
+def test_networks_of_one_prefix_length_share_a_bucket():
+    ips = IpSet(['198.51.100.0/24', '203.0.113.0/24', '192.0.2.7/24']) # Host bits are masked off
+
+    assert len(ips) == 3
+    assert '203.0.113.99' in ips
+    assert '192.0.2.200' in ips
+    assert '198.51.99.1' not in ips
+
+def test_versions_do_not_match_each_other():
+    ips = IpSet(['0.0.0.0/8', '2001:db8::/32', '192.0.2.1'])
+
+    assert '0.1.2.3' in ips
+    assert '2001:db8::1' in ips
+    assert '::1' not in ips # Inside 0.0.0.0/8 as an integer, but IPv6
+    assert '::c000:201' not in ips # 192.0.2.1 as an integer, but IPv6
+    assert '255.0.0.0' not in ips
+    assert '1.0.0.0' not in ips
+
+def test_invalid_entries_and_lookups_are_ignored():
+    ips = IpSet(['not an ip', '', '# comment', '300.1.1.1', ' 192.0.2.1 \r', '198.51.100.0/33'])
+
+    assert len(ips) == 1
+    assert '192.0.2.1' in ips
+    assert 'not an ip' not in ips
+    assert '' not in ips
+    assert '192.0.2.1/32' not in ips
@@ -0,0 +1,21 @@
+from forking import run_in_child
+from project.helpers.per_process import PerProcess
+from threading import Thread
+
+import os
+
+def test_setup_runs_once_per_process():
+    pids = []
+    def setup():
+        pids.append(os.getpid())
+        return os.getpid()
+    per_process = PerProcess(setup)
+    threads = [Thread(target=per_process.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert pids == [os.getpid()]
+    assert per_process.get() == os.getpid()
+    assert run_in_child(lambda: per_process.get() == os.getpid() and len(pids) == 2)
@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from Levenshtein import distance
+from project.modules.raidguard import (
+    JoinWindow, RaidGuardModule, RaidUser, MAX_TRACKED_JOINS, RAID_JOIN_COUNT, RAID_SCORE_THRESHOLD, RAID_SUSPECT_COUNT, join_windows, lockdowns
+)
+
+import asyncio
+import gc
+import pytest
+import random
+
+def live_raid_users():
+    gc.collect()
+    return sum(1 for item in gc.get_objects() if type(item) is RaidUser)
+
+def test_join_window_memory_is_bounded():
+    before = live_raid_users()
+    window = JoinWindow()
+    created = datetime.now() - timedelta(hours=1)
+    for i in range(3000):
+        window.add(RaidUser(str(i), f'raider{i}', None, created))
+
+    assert len(window.users) <= MAX_TRACKED_JOINS
+    assert live_raid_users() - before <= MAX_TRACKED_JOINS
+
+def test_evicted_joins_stop_counting():
+    window = JoinWindow()
+    created = datetime.now() - timedelta(hours=1)
+    names = ['raider', 'raider', 'raidr', 'someone else', 'another name', 'raiders', 'r a i d e r']
+    for i in range(MAX_TRACKED_JOINS * 2):
+        window.add(RaidUser(str(i), names[i % len(names)] + str(i), None, created))
+
+    # The incremental counts must match a recount of the pairs still in the window
+    for user in window.users:
+        cutoff = len(user.stripped_name) // 2
+        expected = sum(1 for other in window.users if other is not user and distance(user.stripped_name, other.stripped_name) <= cutoff)
+        assert user.similar == expected
+        assert all(other in window.users for other in user.similar_to)
+        assert all(other in window.users for other in user.counted_by)
+
+class StandInMember:
+    def __init__(self, id: str, name: str, created_at: datetime, avatar=None):
+        self.id = id
+        self.name = name
+        self.created_at = created_at
+        self.avatar = avatar
+        self.bot = False
+
+class StandInAvatar:
+    aws_url = 'https://img.example.com/avatar.png'
+
+class StandInServer:
+    def __init__(self):
+        self.kicked = []
+
+    async def getch_member(self, user_id: str):
+        return user_id
+
+    async def kick(self, member_id: str):
+        self.kicked.append(member_id)
+
+class StandInEvent:
+    def __init__(self, server: StandInServer, server_id: str, member: StandInMember):
+        self.server = server
+        self.server_id = server_id
+        self.member = member
+
+class StandInBot:
+    def __init__(self):
+        self.join_listeners = []
+
+def join_listener(monkeypatch, config: dict):
+    """ RaidGuard's member join listener, reading config as the guild's config """
+    bot = StandInBot()
+    module = RaidGuardModule(bot)
+    async def get_guild_data(guild_id: str):
+        return {'config': config}
+    monkeypatch.setattr(module, 'get_guild_data', get_guild_data)
+    module.initialize()
+    return bot.join_listeners[0]
+
+def raider(i: int):
+    return StandInMember(f'raider{i}', f'raider{i}', datetime.now())
+
+def regular(i: int):
+    return StandInMember(f'regular{i}', f'{"abcdefghijklmnopqrstuvwxyz"[i]} regular member {i}', datetime.now() - timedelta(days=400), StandInAvatar())
+
+@pytest.fixture
+def server_id():
+    server_id = f'guild{random.getrandbits(64):x}'
+    yield server_id
+    join_windows.remove(server_id)
+    lockdowns.remove(server_id)
+
+def test_joins_are_ignored_when_raid_guard_is_off(monkeypatch, server_id):
+    on_member_join = join_listener(monkeypatch, {'raid_guard': 0})
+    server = StandInServer()
+    for i in range(RAID_JOIN_COUNT * 2):
+        asyncio.run(on_member_join(StandInEvent(server, server_id, raider(i))))
+
+    assert join_windows.get(server_id) is None
+    assert lockdowns.get(server_id) is None
+    assert server.kicked == []
+
+def test_lockdown_only_starts_once_the_window_is_a_raid(monkeypatch, server_id):
+    raid = False
+    monkeypatch.setattr(JoinWindow, 'is_raid', lambda window: raid)
+    on_member_join = join_listener(monkeypatch, {'raid_guard': 1})
+    server = StandInServer()
+    for i in range(RAID_JOIN_COUNT):
+        asyncio.run(on_member_join(StandInEvent(server, server_id, raider(i))))
+
+    assert lockdowns.get(server_id) is None
+    assert server.kicked == []
+
+    raid = True
+    asyncio.run(on_member_join(StandInEvent(server, server_id, raider(RAID_JOIN_COUNT))))
+
+    assert lockdowns.get(server_id) is True
+    assert len(server.kicked) > 0
+
+def test_only_suspects_are_removed(monkeypatch, server_id):
+    on_member_join = join_listener(monkeypatch, {'raid_guard': 1})
+    server = StandInServer()
+    for i in range(RAID_JOIN_COUNT):
+        asyncio.run(on_member_join(StandInEvent(server, server_id, regular(i))))
+        asyncio.run(on_member_join(StandInEvent(server, server_id, raider(i))))
+        if lockdowns.get(server_id):
+            break
+
+    window: JoinWindow = join_windows.get(server_id)
+    assert lockdowns.get(server_id) is True
+    assert len(server.kicked) >= RAID_SUSPECT_COUNT
+    assert set(server.kicked) == set(user.id for user in window.users if user.raid_score >= RAID_SCORE_THRESHOLD)
+    assert not any(user_id.startswith('regular') for user_id in server.kicked)
+
+    # During the lockdown each join is judged on its own
+    kicked = len(server.kicked)
+    asyncio.run(on_member_join(StandInEvent(server, server_id, regular(RAID_JOIN_COUNT + 1))))
+    assert len(server.kicked) == kicked
+    asyncio.run(on_member_join(StandInEvent(server, server_id, raider(RAID_JOIN_COUNT + 1))))
+    assert server.kicked[kicked:] == [f'raider{RAID_JOIN_COUNT + 1}']
@@ -0,0 +1,52 @@
+from PIL import Image, ImageChops
+from project import app, db
+from project.helpers.rank_card import CARD_SIZE, get_font, render_rank_card
+from project.server.api.guilds import get_guild_user_rank
+from project.server.models import GuildUser
+
+import io
+import pytest
+
+TABLES = [GuildUser.__table__]
+
+@pytest.fixture
+def database():
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=TABLES)
+        yield
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=TABLES)
+
+def render(levelup: bool):
+    background = Image.new('RGB', (1600, 900), (40, 90, 160))
+    avatar = Image.new('RGB', (256, 256), (230, 230, 230))
+    return Image.open(io.BytesIO(render_rank_card('Someone', avatar, background, 3, 12, '1.2K', '1.4K', 42, '#285aa0', levelup)))
+
+def test_renders_a_card():
+    card = render(False)
+
+    assert card.format == 'PNG'
+    assert card.size == CARD_SIZE
+    assert card.mode == 'RGBA'
+    assert card.getpixel((0, 0))[3] == 0 # Rounded corners are transparent
+
+def test_level_up_adds_its_label():
+    difference = ImageChops.difference(render(True).convert('RGB'), render(False).convert('RGB')).getbbox()
+
+    assert difference is not None
+    assert difference[1] >= 140 and difference[3] <= 185 # Only the line above the experience changes
+
+def test_fonts_are_loaded_once():
+    assert get_font('bold', 32) is get_font('bold', 32)
+
+def test_ranks_members_by_xp_within_their_guild(database):
+    for guild_id, user_id, xp in (('guild', 'first', 900), ('guild', 'second', 400), ('guild', 'third', 400), ('other', 'top', 5000)):
+        member = GuildUser(guild_id, user_id)
+        member.xp = xp
+        db.session.add(member)
+    db.session.commit()
+
+    assert (get_guild_user_rank('guild', 'first').xp, get_guild_user_rank('guild', 'first').rank) == (900, 1)
+    assert get_guild_user_rank('guild', 'second').rank == 2
+    assert get_guild_user_rank('guild', 'third').rank == 2 # Ties share a rank
+    assert get_guild_user_rank('guild', 'top') is None
@@ -0,0 +1,35 @@
+from project.helpers import translator
+from project.helpers.translator import LocaleStore, Template
+
+import asyncio
+import time
+
+class SlowStore(LocaleStore):
+    def __init__(self, delay: float):
+        super().__init__()
+        self.delay = delay
+
+    def load(self):
+        time.sleep(self.delay)
+        self.locales = {'en': {'greeting': Template('Hello {name}')}}
+
+def test_waiters_wake_when_the_first_load_is_done():
+    store = SlowStore(0.2)
+    started = time.monotonic()
+
+    assert asyncio.run(store.wait_ready()) is True
+    assert time.monotonic() - started < 1
+    assert store.locales['en']['greeting'].render({'name': 'there'}) == 'Hello there'
+
+def test_waiting_gives_up_after_the_timeout(monkeypatch):
+    monkeypatch.setattr(translator, 'READY_TIMEOUT', 0.1)
+    store = SlowStore(5)
+
+    assert asyncio.run(store.wait_ready()) is False
+
+def test_translate_falls_back_to_the_key(monkeypatch):
+    store = SlowStore(5)
+    monkeypatch.setattr(translator, 'READY_TIMEOUT', 0.1)
+    monkeypatch.setattr(translator, 'store', store)
+
+    assert asyncio.run(translator.translate('en', 'greeting')) == 'greeting'
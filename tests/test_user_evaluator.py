@@ -0,0 +1,55 @@
+from project.helpers import user_evaluator
+from providers import StandInProviders
+
+import asyncio
+import pytest
+import time
+
+@pytest.fixture
+def providers(monkeypatch):
+    server = StandInProviders().start()
+    for name in ('ROBLOX_API', 'STEAM_API', 'YOUTUBE_API', 'TWITTER_API'):
+        monkeypatch.setattr(user_evaluator, name, server.base)
+    yield server
+    server.stop()
+
+class StandInClient:
+    async def get_member(self, guild_id: str, user_id: str):
+        return {'member': {'user': {'id': user_id, 'name': 'Someone', 'avatar': None, 'createdAt': '2020-01-01T00:00:00Z'}}}
+
+def test_lookups_run_concurrently(providers: StandInProviders, monkeypatch):
+    monkeypatch.setattr(user_evaluator, 'get_client', StandInClient)
+    monkeypatch.setattr(user_evaluator, 'get_using_vpn', lambda guild_id, user_id: False)
+    providers.delay = 0.5
+    connections = '{"roblox": {"serviceId": "c1"}, "steam": {"serviceId": "c1"}, "youtube": {"handle": "c1"}, "twitter": {"handle": "c1"}}'
+
+    started = time.monotonic()
+    evaluation = asyncio.run(user_evaluator.evaluate_user('guild', 'user', connections))
+
+    assert time.monotonic() - started < 1.5 # One at a time would take at least 2 seconds
+    assert all(score is not None for score in evaluation['Connection_Scores'].values())
+    assert evaluation['VPN'] is False
+
+def test_scores_are_cached(providers: StandInProviders):
+    first = asyncio.run(user_evaluator.eval_roblox('cached'))
+    second = asyncio.run(user_evaluator.eval_roblox('cached'))
+
+    assert first == second == 0
+    assert providers.hits['roblox/cached'] == 1
+
+@pytest.mark.parametrize('provider', ['roblox', 'steam', 'youtube', 'twitter'])
+def test_missing_accounts_are_cached(providers: StandInProviders, provider: str):
+    evaluate = getattr(user_evaluator, f'eval_{provider}')
+    if provider == 'steam':
+        assert asyncio.run(evaluate('missing')) == 100 # Steam answers for private profiles like level 0
+    else:
+        assert asyncio.run(evaluate('missing')) is None
+    asyncio.run(evaluate('missing'))
+
+    assert providers.hits[f'{provider}/missing'] == 1
+
+def test_rate_limits_are_not_cached(providers: StandInProviders):
+    assert asyncio.run(user_evaluator.eval_roblox('limited')) is None
+    assert asyncio.run(user_evaluator.eval_roblox('limited')) is None
+
+    assert providers.hits['roblox/limited'] == 2
@@ -0,0 +1,46 @@
+from project import app, db
+from project.helpers import webhooks
+from project.helpers.webhooks import post_webhook, webhook_cache
+from project.server.models import Guild
+
+import asyncio
+import pytest
+
+TABLES = [Guild.__table__]
+
+@pytest.fixture
+def database():
+    with app.app_context():
+        db.metadata.create_all(db.engine, tables=TABLES)
+        yield
+        db.session.remove()
+        db.metadata.drop_all(db.engine, tables=TABLES)
+
+class StandInClient:
+    def __init__(self):
+        self.created = 0
+
+    async def create_webhook(self, server_id: str, name: str, channel_id: str):
+        self.created += 1
+        await asyncio.sleep(0.05) # Long enough for every sender to miss the cache
+        return {'webhook': {'id': f'webhook{self.created}', 'token': 'token', 'channelId': channel_id}}
+
+def test_concurrent_sends_share_one_new_webhook(database, monkeypatch):
+    client = StandInClient()
+    sent = []
+    async def dispatch(webhook: dict, channel_id: str, args: tuple, kwargs: dict):
+        sent.append(webhook['id'])
+    monkeypatch.setattr(webhooks, 'get_client', lambda: client)
+    monkeypatch.setattr(webhooks, 'dispatch', dispatch)
+    db.session.add(Guild('guild'))
+    db.session.commit()
+    webhook_cache.remove('channel')
+
+    async def send_all():
+        await asyncio.gather(*[post_webhook('guild', 'channel', content=str(i)) for i in range(5)])
+    asyncio.run(send_all())
+    db.session.commit()
+
+    assert client.created == 1
+    assert sent == ['webhook1'] * 5
+    assert Guild.query.filter_by(guild_id = 'guild').first().config['__webhooks']['channel']['id'] == 'webhook1'